@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# benchmark_suite.py ---
+#
+# Filename: benchmark_suite.py
+# Created: Mon Oct 19 16:25:08 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""Runs the benchmark suites with a fixed time limit, records the results
+of every benchmark (status, wall and CPU time, peak RSS, solution size, DT
+size, CEGIS rounds) into a JSON results file, and compares results against
+a baseline, flagging per benchmark regressions.
+
+Usage (from the scripts directory):
+  benchmark_suite.py run [--suites icfp max ...] [--timeout T] [--output F] [--baseline B]
+  benchmark_suite.py compare <baseline> <results>
+
+Baselines are results files written by 'run', or the LaTeX-like tables of
+experimental_data (e.g. icfp_one_shot/results_one_shot_table)."""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+eusolver_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+source_directory = os.path.join(eusolver_root, 'src')
+benchmarks_directory = os.path.join(eusolver_root, 'benchmarks')
+default_suites = ['icfp', 'max', 'icfp_generated', 'one_off']
+environment_paths = [os.path.join(eusolver_root, 'thirdparty/libeusolver/build'),
+                     os.path.join(eusolver_root, 'thirdparty/z3/build')]
+
+solved_status = 'solved'
+failed_status = 'fail'
+timeout_status = 'timeout'
+error_status = 'error'
+
+def get_git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=eusolver_root, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def get_benchmark_files(suites):
+    retval = []
+    for suite in suites:
+        files = sorted(glob.glob(os.path.join(benchmarks_directory, suite, '*.sl')))
+        if len(files) == 0:
+            raise ValueError('No benchmarks in suite %s' % suite)
+        retval.extend((suite, f) for f in files)
+    return retval
+
+def run_benchmark(benchmark_file, timeout, extra_args):
+    """Runs the solver on one benchmark in a fresh process, and returns the
+    record of the run. The peak RSS and CPU time are those of the solver
+    process alone (os.wait4)."""
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        environment_paths + [p for p in [os.environ.get('PYTHONPATH')] if p])
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        metrics_file = os.path.join(temp_directory, 'metrics.json')
+        stdout_file = os.path.join(temp_directory, 'stdout')
+        command = ([sys.executable, 'benchmarks.py', '--metrics-file', metrics_file] +
+                   extra_args + [benchmark_file])
+        with open(stdout_file, 'w') as out, open(os.devnull, 'w') as err:
+            start_time = time.perf_counter()
+            # In a session of its own, so that its worker processes (verifier
+            # and subproblem pools, Z3) are killed along with it
+            process = subprocess.Popen(command, cwd=source_directory, env=environment,
+                                       stdout=out, stderr=err, start_new_session=True)
+            timed_out = threading.Event()
+            def kill():
+                timed_out.set()
+                try:
+                    os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+            try:
+                (_, status, rusage) = os.wait4(process.pid, 0)
+            finally:
+                timer.cancel()
+            # The process has been reaped by wait4
+            process.returncode = os.waitstatus_to_exitcode(status)
+            wall_time = time.perf_counter() - start_time
+
+        with open(stdout_file, 'r') as f:
+            output = f.read()
+        metrics = {}
+        if os.path.exists(metrics_file):
+            with open(metrics_file, 'r') as f:
+                metrics = json.load(f)
+
+    if timed_out.is_set():
+        result_status = timeout_status
+    elif process.returncode != 0:
+        result_status = error_status
+    elif '(define-fun' in output:
+        result_status = solved_status
+    else:
+        result_status = failed_status
+
+    values = metrics.get('values', {})
+    return {
+            'status': result_status,
+            'wall_time': wall_time,
+            'cpu_time': rusage.ru_utime + rusage.ru_stime,
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_kb': rusage.ru_maxrss,
+            'solution_size': values.get('solution_size'),
+            'dt_size': values.get('dt_size'),
+            'rounds': metrics.get('counters', {}).get('rounds', 0),
+            'solver': values.get('solver'),
+            'phases': { name: phase['cpu_time'] for name, phase in metrics.get('phases', {}).items() }
+            }
+
+def run_suites(suites, timeout, extra_args, output_file):
+    results = {
+            'config': {
+                'revision': get_git_revision(),
+                'timeout': timeout,
+                'suites': suites,
+                'extra_args': extra_args,
+                'python': platform.python_version(),
+                'host': platform.node(),
+                'date': time.strftime('%Y-%m-%d %H:%M:%S')
+                },
+            'benchmarks': {}
+            }
+    for suite, benchmark_file in get_benchmark_files(suites):
+        name = '%s/%s' % (suite, os.path.basename(benchmark_file)[:-len('.sl')])
+        record = run_benchmark(benchmark_file, timeout, extra_args)
+        results['benchmarks'][name] = record
+        print('%-40s %-8s %8.2fs %8d KB  size %s' % (name, record['status'], record['wall_time'],
+                                                    record['peak_rss_kb'], record['solution_size']),
+              flush=True)
+        # Written after every benchmark, so that partial runs are kept
+        write_results(results, output_file)
+    return results
+
+def write_results(results, output_file):
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    os.replace(temp_file, output_file)
+
+def load_table(file_name):
+    """Loads a results table of experimental_data ('&' separated columns,
+    with a header line naming them). Benchmarks missing from the table timed
+    out."""
+    column_names = {
+            'Solution Size': 'solution_size',
+            'First Size': 'solution_size',
+            'Solution Time from start (s)': 'cpu_time',
+            'First Time': 'cpu_time',
+            'DT Size': 'dt_size',
+            'First DT Size': 'dt_size'
+            }
+    benchmarks = {}
+    with open(file_name, 'r') as f:
+        lines = [ l.strip().rstrip('\\').strip() for l in f if l.strip() != '' ]
+    header = [ c.strip() for c in lines[0].split('&') ]
+    # icfp_103_10 -> icfp/icfp_103_10, max10 -> max/max10
+    suite = re.match('[a-z]*', os.path.basename(os.path.dirname(os.path.abspath(file_name)))).group(0)
+    for line in lines[1:]:
+        columns = [ c.strip() for c in line.split('&') ]
+        record = { 'status': solved_status }
+        for column_name, value in zip(header[1:], columns[1:]):
+            key = column_names.get(column_name)
+            if key is None or key in record:
+                continue
+            if value in ['--', 'TO', '']:
+                record['status'] = timeout_status
+                continue
+            record[key] = float(value) if key == 'cpu_time' else int(value)
+        benchmarks['%s/%s' % (suite, columns[0])] = record
+    return { 'config': { 'revision': os.path.relpath(file_name) }, 'benchmarks': benchmarks }
+
+def load_results(file_name):
+    with open(file_name, 'r') as f:
+        data = f.read()
+    try:
+        return json.loads(data)
+    except ValueError:
+        return load_table(file_name)
+
+def compare_results(baseline, results, time_threshold, min_time_delta, size_threshold):
+    """Returns the list of (benchmark, message) regressions of :results:
+    with respect to :baseline:, for the benchmarks in both. Times are
+    compared on CPU time (the time reported by the baseline tables)."""
+    regressions = []
+    baseline_benchmarks = baseline['benchmarks']
+    for name, record in sorted(results['benchmarks'].items()):
+        base_record = baseline_benchmarks.get(name)
+        if base_record is None:
+            continue
+        if base_record['status'] == solved_status:
+            if record['status'] != solved_status:
+                regressions.append((name, 'was solved, now %s' % record['status']))
+                continue
+            base_time = base_record.get('cpu_time')
+            new_time = record.get('cpu_time')
+            if (base_time is not None and new_time is not None and
+                new_time > base_time * (1 + time_threshold) and
+                new_time - base_time > min_time_delta):
+                regressions.append((name, 'time %.2fs -> %.2fs (%+.0f%%)' %
+                                    (base_time, new_time, 100 * (new_time - base_time) / base_time)))
+            base_size = base_record.get('solution_size')
+            new_size = record.get('solution_size')
+            if (base_size is not None and new_size is not None and
+                new_size > base_size * (1 + size_threshold)):
+                regressions.append((name, 'solution size %d -> %d' % (base_size, new_size)))
+        # Benchmarks that failed in the baseline are only reported when fixed
+    return regressions
+
+def report_comparison(baseline, results, args):
+    regressions = compare_results(baseline, results, args.time_threshold,
+                                  args.min_time_delta, args.size_threshold)
+    common = set(baseline['benchmarks']) & set(results['benchmarks'])
+    newly_solved = [ name for name in sorted(common)
+                     if baseline['benchmarks'][name]['status'] != solved_status and
+                     results['benchmarks'][name]['status'] == solved_status ]
+    print('Compared %d benchmarks against baseline %s' %
+          (len(common), baseline['config'].get('revision')))
+    for name in newly_solved:
+        print('  improved   %-40s now solved' % name)
+    for name, message in regressions:
+        print('  REGRESSION %-40s %s' % (name, message))
+    return len(regressions) == 0
+
+def add_comparison_arguments(argparser):
+    argparser.add_argument('--time-threshold', type=float, default=0.25,
+            help='Relative CPU time increase flagged as a regression')
+    argparser.add_argument('--min-time-delta', type=float, default=1.0,
+            help='Absolute CPU time increase (s) below which times are not compared')
+    argparser.add_argument('--size-threshold', type=float, default=0.0,
+            help='Relative solution size increase flagged as a regression')
+
+def main():
+    argparser = argparse.ArgumentParser(description='EUSolver benchmark suite runner')
+    subparsers = argparser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help='Run benchmark suites')
+    run_parser.add_argument('--suites', nargs='+', default=default_suites)
+    run_parser.add_argument('--timeout', type=float, default=60,
+            help='Time limit per benchmark, in seconds')
+    run_parser.add_argument('--output', default=None,
+            help='Results file (default: results_<revision>.json)')
+    run_parser.add_argument('--baseline', default=None,
+            help='Results file or table to compare against')
+    run_parser.add_argument('--solver-args', default='',
+            help='Extra arguments for benchmarks.py, e.g. "--cex-per-round 4"')
+    add_comparison_arguments(run_parser)
+
+    compare_parser = subparsers.add_parser('compare', help='Compare results against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('results')
+    add_comparison_arguments(compare_parser)
+
+    args = argparser.parse_args()
+    if args.command == 'run':
+        output_file = args.output or 'results_%s.json' % get_git_revision()
+        results = run_suites(args.suites, args.timeout, args.solver_args.split(), output_file)
+        if args.baseline is None:
+            return 0
+        baseline = load_results(args.baseline)
+    else:
+        baseline = load_results(args.baseline)
+        results = load_results(args.results)
+    return 0 if report_comparison(baseline, results, args) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+#
+# benchmark_suite.py ends here
@@ -1,78 +1,218 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
-import os, subprocess, shlex, shutil, sys, time
-from multiprocessing import Queue, Process, Manager, JoinableQueue
+import argparse, ast, json, os, resource, shutil, signal, subprocess, sys, time
 
 # A job list entry is a tuple consisting of the following
 # 1. A list of strings that can be passed to subprocess.Popen for the executable and args
 # 2. A string denoting the name of the log file
 # 3. Another string denoting a header to print at the top of the log file
+#
+# The job list file is a python expression evaluating to a list of such
+# entries (list comprehensions over range() and str() are allowed).
+#
+# Every finished job is appended as a line of JSON to <log_directory>/results.jsonl,
+# with its exit status, wall time, CPU time and peak RSS. Jobs already in the
+# results file are skipped when the scheduler is restarted on the same log
+# directory, and the recorded wall times are used to start the longest jobs
+# first, so that the stragglers do not run at the end of a sweep.
 
-job_list = []
 environment_variables = {'PYTHONPATH' : '../thirdparty/libeusolver/build/:../thirdparty/z3/build/'}
-
-def print_usage():
-    print('Usage: %s <job_list_filename> <log_directory_name> <num_concurrent_processes>' % sys.argv[0])
-
-def process_entry_point(global_job_queue):
-    while True:
-        try:
-            job = global_job_queue.get(True, 10)
-        except:
-            break
-
-        with open(job[1] + '.stdout', 'w') as job_out_file, open (job[1] + '.stderr', 'w') as job_err_file:
-            job_out_file.write('@@@@@@@%s@@@@@@@\n\n' % job[2]);
-            job_err_file.write('@@@@@@@%s@@@@@@@\n\n' % job[2]);
-            job_out_file.write('$*$*$*$*/%s$*$*$*$' % ' '.join(job[0]))
-            job_out_file.flush();
-            job_err_file.flush();
-            job_process = subprocess.Popen(job[0], stdout=job_out_file, stderr=job_err_file)
-            (outdata, errdata) = job_process.communicate()
-
-# I expect the following arguments:
-# 1. A file name, which I can open and eval to get my job list, with a variable called environment_variables for the environment variables
-# 2. A log directory name where I write all logs
-# 3. Number of concurrent processes to run
-
-if len(sys.argv) < 4:
-    print_usage()
-    sys.exit(1)
-
-with open(sys.argv[1], 'r') as job_file:
-    job_list = eval(job_file.read())
-
-log_directory_name = sys.argv[2]
-num_concurrent_processes = int(sys.argv[3])
-
-try:
-    shutil.rmtree(log_directory_name)
-except OSError as exc:
-    if exc.errno != 2:
-        raise exc
-
-os.mkdir(log_directory_name)
-
-
-# make a queue and push all jobs into it
-mp_manager = Manager()
-job_queue = mp_manager.Queue()
-
-for job in job_list:
-    job_queue.put((job[0], '%s/%s' % (log_directory_name, job[1]), job[2]))
-
-# start the worker processes
-worker_processes = []
-for process_id in range(num_concurrent_processes):
-    worker_processes.append(Process(target=process_entry_point, args=(job_queue,)))
-
-print('Starting %d worker processes, with %d jobs to run' % (num_concurrent_processes, len(job_list)))
-sys.stdout.flush()
-begin_time = time.process_time()
-for worker_process in worker_processes:
-    worker_process.start()
-
-for worker_process in worker_processes:
-    worker_process.join()
-end_time = time.process_time()
-print('Completed %d jobs in %f seconds, with %d worker processes' % (len(job_list), end_time - begin_time, num_concurrent_processes))
+results_file_name = 'results.jsonl'
+poll_interval = 0.1
+
+def read_job_list(job_list_filename):
+    with open(job_list_filename, 'r') as job_file:
+        text = job_file.read()
+    try:
+        return ast.literal_eval(text)
+    except ValueError:
+        return eval(text, {'__builtins__' : {'range' : range, 'str' : str, 'len' : len}})
+
+def read_results(results_filename):
+    """Returns the records of the jobs recorded in :results_filename:, by job
+    name. A line truncated by a crash of the scheduler is ignored."""
+    results = {}
+    if not os.path.exists(results_filename):
+        return results
+    with open(results_filename, 'r') as results_file:
+        for line in results_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            results[record['name']] = record
+    return results
+
+def expected_cost(job_name, history):
+    # Jobs that never ran come first: they may be the longest ones
+    record = history.get(job_name)
+    if record is None:
+        return float('inf')
+    return record['wall_time']
+
+def make_limit_setter(cpu_limit, memory_limit):
+    def set_limits():
+        if cpu_limit is not None:
+            # SIGXCPU at the soft limit, SIGKILL at the hard one
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 5))
+        if memory_limit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        # Kill the job, not the scheduler, on ^C
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    return set_limits
+
+def make_environment(memory_limit):
+    environment = dict(os.environ)
+    for name, value in environment_variables.items():
+        if name in environment:
+            value = value + os.pathsep + environment[name]
+        environment[name] = value
+    if memory_limit is not None:
+        # Lets the solver shed caches before the hard limit is hit
+        environment['EUSOLVER_MEMORY_LIMIT'] = str(memory_limit)
+    return environment
+
+class RunningJob(object):
+    def __init__(self, name, command, log_prefix, header, set_limits, environment):
+        self.name = name
+        self.command = command
+        self.out_file = open(log_prefix + '.stdout', 'w')
+        self.err_file = open(log_prefix + '.stderr', 'w')
+        self.out_file.write('@@@@@@@%s@@@@@@@\n\n' % header)
+        self.err_file.write('@@@@@@@%s@@@@@@@\n\n' % header)
+        self.out_file.write('$*$*$*$*/%s$*$*$*$' % ' '.join(command))
+        self.out_file.flush()
+        self.err_file.flush()
+        self.start_time = time.perf_counter()
+        self.killed_for_time = False
+        self.process = subprocess.Popen(command, stdout=self.out_file, stderr=self.err_file,
+                                        preexec_fn=set_limits, env=environment)
+
+    def finish(self, status, rusage):
+        self.out_file.close()
+        self.err_file.close()
+        record = {
+            'name' : self.name,
+            'command' : self.command,
+            'wall_time' : time.perf_counter() - self.start_time,
+            'cpu_time' : rusage.ru_utime + rusage.ru_stime,
+            'max_rss_kb' : rusage.ru_maxrss,
+            'exit_status' : None,
+            'signal' : None,
+            'timed_out' : self.killed_for_time,
+            'finished_at' : time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if os.WIFSIGNALED(status):
+            record['signal'] = os.WTERMSIG(status)
+            if record['signal'] == signal.SIGXCPU:
+                record['timed_out'] = True
+        else:
+            record['exit_status'] = os.WEXITSTATUS(status)
+        return record
+
+def run_jobs(jobs, log_directory_name, num_concurrent_processes, cpu_limit, wall_limit, memory_limit):
+    results_filename = os.path.join(log_directory_name, results_file_name)
+    set_limits = make_limit_setter(cpu_limit, memory_limit)
+    environment = make_environment(memory_limit)
+    pending = list(reversed(jobs))
+    running = {}
+    num_failed = 0
+    total_cpu_time = 0.0
+
+    with open(results_filename, 'a') as results_file:
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < num_concurrent_processes:
+                (command, name, header) = pending.pop()
+                job = RunningJob(name, command, os.path.join(log_directory_name, name),
+                                 header, set_limits, environment)
+                running[job.process.pid] = job
+
+            if wall_limit is not None:
+                now = time.perf_counter()
+                for job in running.values():
+                    if not job.killed_for_time and now - job.start_time > wall_limit:
+                        job.killed_for_time = True
+                        job.process.kill()
+
+            (pid, status, rusage) = os.wait4(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(poll_interval)
+                continue
+
+            job = running.pop(pid)
+            # Reaped by wait4, do not let Popen wait for it again
+            job.process.returncode = status
+            record = job.finish(status, rusage)
+            results_file.write(json.dumps(record) + '\n')
+            results_file.flush()
+            total_cpu_time += record['cpu_time']
+            if record['exit_status'] != 0:
+                num_failed += 1
+            print('[%s] %s: %s in %.2fs (%.2fs CPU, %d KB)' %
+                  (record['finished_at'], record['name'], describe_status(record),
+                   record['wall_time'], record['cpu_time'], record['max_rss_kb']))
+            sys.stdout.flush()
+
+    return (num_failed, total_cpu_time)
+
+def describe_status(record):
+    if record['timed_out']:
+        return 'timed out'
+    elif record['signal'] is not None:
+        return 'killed by signal %d' % record['signal']
+    return 'exit status %d' % record['exit_status']
+
+def main():
+    argparser = argparse.ArgumentParser(description='Runs a job list with a pool of worker processes')
+    argparser.add_argument('job_list_filename')
+    argparser.add_argument('log_directory_name')
+    argparser.add_argument('num_concurrent_processes', type=int)
+    argparser.add_argument('--cpu-limit', type=int, default=None,
+                           help='CPU time limit of each job in seconds (RLIMIT_CPU)')
+    argparser.add_argument('--wall-limit', type=float, default=None,
+                           help='Wall clock time limit of each job in seconds')
+    argparser.add_argument('--memory-limit', type=int, default=None,
+                           help='Address space limit of each job in MB (RLIMIT_AS)')
+    argparser.add_argument('--history', nargs='*', default=[],
+                           help='Results files of earlier runs, used to order the jobs by expected cost')
+    argparser.add_argument('--rerun-failed', action='store_true',
+                           help='Run again the jobs which did not exit with status 0')
+    argparser.add_argument('--fresh', action='store_true',
+                           help='Remove the log directory and the recorded results first')
+    args = argparser.parse_args()
+
+    job_list = read_job_list(args.job_list_filename)
+    log_directory_name = args.log_directory_name
+    memory_limit = None if args.memory_limit is None else args.memory_limit * 1024 * 1024
+
+    if args.fresh:
+        shutil.rmtree(log_directory_name, ignore_errors=True)
+    os.makedirs(log_directory_name, exist_ok=True)
+
+    completed = read_results(os.path.join(log_directory_name, results_file_name))
+    history = {}
+    for history_filename in args.history:
+        history.update(read_results(history_filename))
+    history.update(completed)
+
+    jobs = []
+    for job in job_list:
+        record = completed.get(job[1])
+        if record is not None and (record['exit_status'] == 0 or not args.rerun_failed):
+            continue
+        jobs.append(tuple(job))
+    # Longest processing time first
+    jobs.sort(key=lambda job: expected_cost(job[1], history), reverse=True)
+
+    print('Starting %d worker processes, with %d jobs to run (%d already completed)' %
+          (args.num_concurrent_processes, len(jobs), len(job_list) - len(jobs)))
+    sys.stdout.flush()
+    begin_time = time.perf_counter()
+    (num_failed, total_cpu_time) = run_jobs(jobs, log_directory_name, args.num_concurrent_processes,
+                                            args.cpu_limit, args.wall_limit, memory_limit)
+    end_time = time.perf_counter()
+    print('Completed %d jobs (%d failed) in %f seconds (%f seconds of CPU time), with %d worker processes' %
+          (len(jobs), num_failed, end_time - begin_time, total_cpu_time, args.num_concurrent_processes))
+
+if __name__ == '__main__':
+    main()
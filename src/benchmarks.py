@@ -38,17 +38,26 @@
 
 # Code:
 
+import functools
+import multiprocessing
+
 from parsers import parser
+from parsers import benchmark_cache
 from exprs import expr_transforms
 from verifiers import verifiers
 from termsolvers import termsolvers
 from utils import lia_massager
 from utils import utils
+from utils.metrics import metrics
+from utils.memory_governor import governor
+from utils.deadline import Deadline
+from utils import basetypes
 from termsolvers import termsolvers_lia
 from core import specifications
 from unifiers import unifiers
 from unifiers import unifiers_lia
 from core import solvers
+from core import solution_store
 from exprs import exprs
 from enumerators import enumerators
 from exprs import exprtypes
@@ -74,23 +83,28 @@ def get_pbe_valuations(constraints, synth_fun):
         valuations.append((arg_func.children, arg_other))
     return valuations
 
-def massage_constraints(syn_ctx, macro_instantiator, uf_instantiator, theory, constraints):
+def massage_constraints(syn_ctx, macro_instantiator, uf_instantiator, theory, constraints,
+                        deadline):
     # Instantiate all macro functions
-    constraints = [ macro_instantiator.instantiate_all(c)
-            for c in constraints ]
+    instantiated_constraints = []
+    for c in constraints:
+        deadline.check()
+        instantiated_constraints.append(macro_instantiator.instantiate_all(c))
+    constraints = instantiated_constraints
 
     # for c in constraints:
     #     print(exprs.expression_to_string(c))
     # print('Ackermann Reduction')
-    constraints = expr_transforms.AckermannReduction.apply(constraints, uf_instantiator, syn_ctx)
+    constraints = expr_transforms.AckermannReduction.apply(constraints, uf_instantiator, syn_ctx,
+                                                           deadline)
     # for c in constraints:
     #     print(exprs.expression_to_string(c))
     # print('let flattener')
-    constraints = expr_transforms.LetFlattener.apply(constraints, syn_ctx)
+    constraints = expr_transforms.LetFlattener.apply(constraints, syn_ctx, deadline)
     # for c in constraints:
     #     print(exprs.expression_to_string(c))
     # print('Rewrite ite')
-    constraints = expr_transforms.RewriteITE.apply(constraints, syn_ctx)
+    constraints = expr_transforms.RewriteITE.apply(constraints, syn_ctx, deadline)
     # for c in constraints:
     #     print(exprs.expression_to_string(c))
     # constraints, full_constraint_expr = expr_transforms.to_cnf(constraints, theory, syn_ctx)
@@ -134,6 +148,48 @@ def rewrite_solution(synth_funs, solution, reverse_mapping):
 
     return rewritten_solutions
 
+def _match_template(expr_template, expr):
+    # exprs.match, with functions compared by name: the functions of a
+    # reparsed solution need not be the objects of the grammar
+    if exprs.is_variable_expression(expr_template):
+        return { expr_template : expr }
+    elif exprs.is_function_expression(expr_template):
+        if (not exprs.is_function_expression(expr) or
+                expr_template.function_info.function_name != expr.function_info.function_name or
+                len(expr_template.children) != len(expr.children)):
+            return None
+        retval = {}
+        for template_child, child in zip(expr_template.children, expr.children):
+            child_mapping = _match_template(template_child, child)
+            if child_mapping is None:
+                return None
+            for v, e in child_mapping.items():
+                if v in retval:
+                    return None
+                retval[v] = e
+        return retval
+    elif exprs.equals(expr_template, expr):
+        return {}
+    return None
+
+def split_solution(solution, reverse_mapping):
+    """Splits a solution of the (undecomposed) grammar into the terms and
+    the predicates of the decomposed grammar: the reverse of
+    rewrite_solution. Returns the pair (terms, preds)."""
+    for function_info, cond, orig_expr_template, expr_template in reverse_mapping:
+        mapping = _match_template(orig_expr_template, solution)
+        if mapping is None:
+            continue
+        [thent, elset] = expr_template.children[1:]
+        if thent not in mapping or elset not in mapping:
+            continue
+        pred = exprs.FunctionExpression(function_info,
+                                        (exprs.substitute_all(cond, list(mapping.items())),))
+        (then_terms, then_preds) = split_solution(mapping[thent], reverse_mapping)
+        (else_terms, else_preds) = split_solution(mapping[elset], reverse_mapping)
+        return (then_terms + else_terms, [ pred ] + then_preds + else_preds)
+    return ([ solution ], [])
+
 def _merge_grammars(sf_grammar_list):
     start = "MergedStart"
     nts = [start]
@@ -154,8 +210,14 @@ def _merge_grammars(sf_grammar_list):
 
     return merged_grammar
 
-def make_specification(synth_funs, theory, syn_ctx, constraints):
-    if not expr_transforms.is_single_invocation(constraints, theory, syn_ctx):
+def make_specification(synth_funs, theory, syn_ctx, constraints, examples=None):
+    if examples is not None:
+        # The whole specification is the table of examples
+        specification = specifications.PBESpec(None, synth_funs[0], theory,
+                                               examples.get_valuations())
+        syn_ctx.set_synth_funs(synth_funs)
+        verifier = verifiers.PBEVerifier(syn_ctx, specification)
+    elif not expr_transforms.is_single_invocation(constraints, theory, syn_ctx):
         specification = specifications.MultiPointSpec(syn_ctx.make_function_expr('and', *constraints),
                 syn_ctx, synth_funs)
         syn_ctx.set_synth_funs(synth_funs)
@@ -198,7 +260,7 @@ class UnsuitableSolverException(Exception):
     def __str__(self):
         return "[ERROR]: UnsuitableSolverException %s" % self.message
 
-def lia_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier):
+def lia_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier, deadline=None):
     if theory != 'LIA':
         raise UnsuitableSolverException('LIA Unification Solver: Not LIA theory')
     if any([sf.range_type != exprtypes.IntType() for sf in synth_funs ]):
@@ -210,7 +272,12 @@ def lia_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specificati
     if not okay:
         raise UnsuitableSolverException('LIA Unification Solver: Could not get LIA full grammar')
 
-    term_solver = termsolvers_lia.SpecAwareLIATermSolver(specification.term_signature, specification)
+    try:
+        term_solver = termsolvers_lia.SpecAwareLIATermSolver(specification.term_signature, specification)
+    except NotImplementedError:
+        # A clause that is not a disjunction of linear inequalities, e.g., a
+        # disjunction left undistributed by the CNF conversion
+        raise UnsuitableSolverException('LIA Unification Solver: Spec clauses are not linear inequalities')
     unifier = unifiers_lia.SpecAwareLIAUnifier(None, term_solver, synth_funs, syn_ctx, specification)
     solver = solvers.Solver(syn_ctx)
     solutions = solver.solve(
@@ -218,16 +285,39 @@ def lia_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specificati
             term_solver,
             unifier,
             verifier,
-            verify_term_solve=False
+            verify_term_solve=False,
+            deadline=deadline
             )
     solution = next(solutions)
     final_solution = rewrite_solution(synth_funs, solution, reverse_mapping=None)
-    final_solution = lia_massager.massage_full_lia_solution(syn_ctx, synth_funs, final_solution, massaging)
+    final_solution = lia_massager.massage_full_lia_solution(syn_ctx, synth_funs, final_solution, massaging,
+                                                            deadline)
     if final_solution is None:
         raise UnsuitableSolverException('LIA Unification Solver: Could not massage back solution')  
     return final_solution
 
-def std_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier):
+def stored_solution_solver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier,
+                           deadline=None, stored_solutions=()):
+    """Checks the solutions of the solution store (see make_solver), over
+    the formal parameters of the synth functions, against the specification."""
+    verifier.deadline = deadline
+    for solutions in stored_solutions:
+        if deadline is not None:
+            deadline.check()
+        if len(synth_funs) == 1:
+            solution = solutions[0]
+        else:
+            comma_function = semantics_core.CommaFunction([ sf.range_type for sf in synth_funs ])
+            solution = exprs.FunctionExpression(comma_function, tuple(solutions))
+        if exprs.is_expression(verifier.verify(("TERM", solution))):
+            metrics.incr('solution_store_hits')
+            metrics.record('solution_size', exprs.get_expression_size(solution))
+            return rewrite_solution(synth_funs, solution, reverse_mapping=None)
+        metrics.incr('solution_store_misses')
+    raise UnsuitableSolverException('Solution Store: No stored solution holds')
+
+def std_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier,
+                           deadline=None, anytime=False, seed_solutions=()):
     if len(synth_funs) > 1:
         raise UnsuitableSolverException("DT Unification Solver: Multi-function unification not supported")
     if specification.is_multipoint:
@@ -247,19 +337,42 @@ def std_unification_solver(theory, syn_ctx, synth_funs, grammar_map, specificati
     solver = solvers.Solver(syn_ctx)
     term_solver = termsolvers.PointDistinctTermSolver(specification.term_signature, term_generator)
     unifier = unifiers.PointDistinctDTUnifier(pred_generator, term_solver, synth_fun, syn_ctx)
+    # Warm start from the leaves and guards of the stored solutions
+    for solutions in seed_solutions:
+        (seed_terms, seed_preds) = split_solution(solutions[0], reverse_mapping)
+        term_solver.add_seed_terms(seed_terms)
+        unifier.pred_solver.add_seed_terms(seed_preds)
     solver = solvers.Solver(syn_ctx)
+    solver.anytime = anytime
+    solver.report_additional_info = anytime
     solutions = solver.solve(
             generator_factory,
             term_solver,
             unifier,
             verifier,
-            verify_term_solve=True
+            verify_term_solve=True,
+            deadline=deadline
             )
-    solution = next(solutions)
-    final_solution = rewrite_solution([synth_fun], solution, reverse_mapping)
+    if not anytime:
+        solution = next(solutions)
+        final_solution = rewrite_solution([synth_fun], solution, reverse_mapping)
+        return final_solution
+
+    final_solution = None
+    try:
+        for solution_info in solutions:
+            final_solution = rewrite_solution([synth_fun], solution_info[0], reverse_mapping)
+            print_anytime_solution_info(final_solution, solution_info)
+    except basetypes.DeadlineExceededError:
+        # Out of time: the smallest solution found so far is the answer
+        if final_solution is None:
+            raise
+    if final_solution is None:
+        return "NO SOLUTION"
     return final_solution
 
-def classic_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier):
+def classic_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier, deadline=None,
+                    seed_solutions=()):
     if len(synth_funs) != 1:
         raise UnsuitableSolverException("Classic esolver for multi-function disable due to bugs")
     assert len(synth_funs) == 1
@@ -274,6 +387,7 @@ def classic_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, ver
 
     term_solver = TermSolver(specification.term_signature, term_generator)
     term_solver.stopping_condition = termsolvers.StoppingCondition.one_term_sufficiency
+    term_solver.add_seed_terms([ solutions[0] for solutions in seed_solutions ])
     unifier = unifiers.NullUnifier(None, term_solver, synth_funs, syn_ctx, specification)
 
     solver = solvers.Solver(syn_ctx)
@@ -282,7 +396,8 @@ def classic_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, ver
             term_solver,
             unifier,
             verifier,
-            verify_term_solve=False
+            verify_term_solve=False,
+            deadline=deadline
             )
     try:
         solution = next(solutions)
@@ -291,7 +406,7 @@ def classic_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, ver
     rewritten_solutions = rewrite_solution(synth_funs, solution, reverse_mapping=None)
     return rewritten_solutions
 
-def memoryless_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier):
+def memoryless_esolver(theory, syn_ctx, synth_funs, grammar_map, specification, verifier, deadline=None):
     generator_factory = enumerators.RecursiveGeneratorFactory()
     TermSolver = termsolvers.PointlessTermSolver
 
@@ -314,13 +429,17 @@ def memoryless_esolver(theory, syn_ctx, synth_funs, grammar_map, specification,
             term_solver,
             unifier,
             verifier,
-            verify_term_solve=False
+            verify_term_solve=False,
+            deadline=deadline
             )
     solution = next(solutions)
     rewritten_solutions = rewrite_solution(synth_funs, solution, reverse_mapping=None)
     return rewritten_solutions
 
-def make_solver(file_sexp):
+def preprocess_benchmark(file_sexp, deadline=None):
+    """Extracts the benchmark and massages its constraints. Returns the
+    benchmark tuple of parser.extract_benchmark, with the massaged constraints
+    in place of the constraints, and whether the massaging completed."""
     benchmark_tuple = parser.extract_benchmark(file_sexp)
     (
             theories,
@@ -330,34 +449,72 @@ def make_solver(file_sexp):
             uf_instantiator,
             constraints,
             grammar_map,
-            forall_vars_map
+            forall_vars_map,
+            examples
             ) = benchmark_tuple
 
     assert len(theories) == 1
     theory = theories[0]
 
-    solvers = [
-            ("LIA Unification", lia_unification_solver),
-            ("STD Unification", std_unification_solver),
-            ("Classic Esolver", classic_esolver),
-            ("Memoryless Esolver", memoryless_esolver)
-            ]
-    rewritten_constraints = utils.timeout(
-            massage_constraints,
-            (syn_ctx, macro_instantiator, uf_instantiator, theory, constraints),
-            {},
-            timeout_duration=120,
-            default=None
-            )
-    if rewritten_constraints is not None:
-        constraints = rewritten_constraints
+    if deadline is None:
+        deadline = Deadline()
+    massage_deadline = deadline.child(120)
+    try:
+        rewritten_constraints = massage_constraints(syn_ctx, macro_instantiator, uf_instantiator,
+                                                    theory, constraints, massage_deadline)
+        if examples is None:
+            # Fills the CNF cache of syn_ctx for make_specification
+            expr_transforms.is_single_invocation(rewritten_constraints, theory, syn_ctx,
+                                                 massage_deadline)
+    except basetypes.DeadlineExceededError:
+        return (benchmark_tuple, False)
+    benchmark_tuple = benchmark_tuple[:5] + (rewritten_constraints,) + benchmark_tuple[6:]
+    return (benchmark_tuple, True)
+
+class _SolverDeadlineExceeded(Exception):
+    # The deadline expired while solving a (sub)problem, with the name of the
+    # solver was known
+    def __init__(self, solver_name):
+        self.solver_name = solver_name
+
+def solve_problem(theory, syn_ctx, synth_funs, grammar_map, constraints, examples, massaged,
+                  anytime=False, cex_per_round=1, verifier_workers=0, deadline=None, store=None):
+    """Solves the problem of the synth functions under the constraints (or
+    the PBE examples) with the first suitable solver. Returns the name of
+    the solver and the solutions (None, None if no solver is suitable).
+    With a solution store (core.solution_store.SolutionStore), the stored
+    solutions of the same synth functions are checked first, then seed the
+    enumerations, and the solution found is stored.
+    Raises _SolverDeadlineExceeded if the deadline expires."""
+    stored_solutions = []
+    if store is not None:
+        store_keys = store.get_keys(theory, synth_funs, grammar_map, constraints, examples)
+        for solution_strings in store.lookup(store_keys):
+            solutions = solution_store.parse_solutions(solution_strings, synth_funs, syn_ctx)
+            if solutions is not None:
+                stored_solutions.append(solutions)
+
+    if massaged:
+        solvers = [
+                ("LIA Unification", lia_unification_solver),
+                ("STD Unification", functools.partial(std_unification_solver, anytime=anytime,
+                                                      seed_solutions=stored_solutions)),
+                ("Classic Esolver", functools.partial(classic_esolver,
+                                                      seed_solutions=stored_solutions)),
+                ("Memoryless Esolver", memoryless_esolver)
+                ]
     else:
         solvers = [
             ("Memoryless Esolver", memoryless_esolver)
             ]
-
-    synth_funs = list(synth_instantiator.get_functions().values())
-    specification, verifier = make_specification(synth_funs, theory, syn_ctx, constraints)
+    if len(stored_solutions) > 0:
+        solvers.insert(0, ("Solution Store", functools.partial(stored_solution_solver,
+                                                               stored_solutions=stored_solutions)))
+    specification, verifier = make_specification(synth_funs, theory, syn_ctx, constraints, examples)
+    if isinstance(verifier, (verifiers.StdVerifier, verifiers.MultiPointVerifier)):
+        verifier.max_cex_per_round = cex_per_round
+    if isinstance(verifier, verifiers.StdVerifier):
+        verifier.num_branch_workers = verifier_workers
 
 
     solver_args = (
@@ -366,24 +523,207 @@ def make_solver(file_sexp):
             synth_funs,
             grammar_map,
             specification,
-            verifier
+            verifier,
+            deadline
             )
 
-    for solver_name, solver in solvers:
+    try:
+        for solver_name, solver in solvers:
+            try:
+                # print("Trying solver:", solver_name)
+                final_solutions = solver(*solver_args)
+            except UnsuitableSolverException as exception:
+                # print(exception)
+                continue
+            except basetypes.DeadlineExceededError:
+                raise _SolverDeadlineExceeded(solver_name)
+            if store is not None and final_solutions != "NO SOLUTION":
+                store.add(store_keys, final_solutions)
+            return (solver_name, final_solutions)
+        # print("Unable to solve!")
+        return (None, None)
+    finally:
+        if isinstance(verifier, verifiers.StdVerifier):
+            verifier.close_branch_workers()
+
+# State of the worker processes solving subproblems, inherited on fork
+_subproblem_worker_state = None
+
+def _init_subproblem_worker(state):
+    global _subproblem_worker_state
+    _subproblem_worker_state = state
+
+def _solve_subproblem_in_worker(index):
+    # Solutions are sent back as strings, the expressions refer to the
+    # functions of the synthesis context of the worker
+    (problem_args, groups, solve_args) = _subproblem_worker_state
+    (group_synth_funs, group_constraints) = groups[index]
+    (theory, syn_ctx, grammar_map, examples, massaged) = problem_args
+    syn_ctx.clear_synth_funs()
+    try:
+        (solver_name, final_solutions) = solve_problem(theory, syn_ctx, group_synth_funs,
+                grammar_map, group_constraints, examples, massaged, *solve_args)
+    except _SolverDeadlineExceeded as exception:
+        return (exception.solver_name, None, True)
+    if final_solutions is not None and final_solutions != "NO SOLUTION":
+        final_solutions = [ exprs.expression_to_string(sol) for sol in final_solutions ]
+    return (solver_name, final_solutions, False)
+
+def _parse_subproblem_solutions(solution_strings, synth_funs, syn_ctx):
+    # Back to expressions over the named arguments of the synth functions
+    solutions = solution_store.parse_solutions(solution_strings, synth_funs, syn_ctx)
+    return [ rewrite_solution([sf], sol, reverse_mapping=None)[0]
+             for sf, sol in zip(synth_funs, solutions) ]
+
+def solve_independent_problems(theory, syn_ctx, groups, grammar_map, massaged, anytime=False,
+                               cex_per_round=1, verifier_workers=0, deadline=None, store=None,
+                               subproblem_workers=0):
+    """Solves the independent subproblems, (synth functions, constraints)
+    pairs given by expr_transforms.get_independent_problems, each one with
+    its own choice of solver. With more than one subproblem worker, the
+    subproblems are solved in parallel by a pool of forked processes, but
+    not with :anytime: (the solutions found along the way would be printed
+    by the workers). With :anytime:, the subproblems are solved one after
+    the other, each one improving its solution for an equal share of the
+    time left. Returns the names of the solvers, the solutions of the
+    subproblems, and whether the deadline expired."""
+    try:
+        mp_ctx = multiprocessing.get_context('fork')
+    except ValueError:
+        mp_ctx = None
+    if subproblem_workers <= 1 or mp_ctx is None or anytime:
+        solver_names = []
+        solutions = []
+        for index, (group_synth_funs, group_constraints) in enumerate(groups):
+            group_deadline = deadline
+            if anytime and deadline is not None and deadline.remaining() is not None:
+                group_deadline = deadline.child(deadline.remaining() / (len(groups) - index))
+            syn_ctx.clear_synth_funs()
+            try:
+                (solver_name, final_solutions) = solve_problem(theory, syn_ctx, group_synth_funs,
+                        grammar_map, group_constraints, None, massaged, anytime, cex_per_round,
+                        verifier_workers, group_deadline, store)
+            except _SolverDeadlineExceeded as exception:
+                solver_names.append(exception.solver_name)
+                return (solver_names, solutions, True)
+            solver_names.append(solver_name)
+            solutions.append(final_solutions)
+        return (solver_names, solutions, False)
+
+    # Worker processes cannot have branch verification workers of their own
+    solve_args = (False, cex_per_round, 0, deadline, store)
+    state = ((theory, syn_ctx, grammar_map, None, massaged), groups, solve_args)
+    worker_pool = mp_ctx.Pool(min(subproblem_workers, len(groups)),
+                              _init_subproblem_worker, (state,))
+    try:
+        async_results = worker_pool.map_async(_solve_subproblem_in_worker,
+                                              range(len(groups)), chunksize=1)
         try:
-            # print("Trying solver:", solver_name)
-            final_solutions = solver(*solver_args)
-            if final_solutions == "NO SOLUTION":
-                print("(fail)")
-            else:
-                print_solutions(synth_funs, final_solutions)
-            break
-        except UnsuitableSolverException as exception:
-            # print(exception)
-            pass
+            results = async_results.get(None if deadline is None else deadline.remaining())
+        except multiprocessing.TimeoutError:
+            return ([], [], True)
+    finally:
+        worker_pool.terminate()
+        worker_pool.join()
+
+    solver_names = []
+    solutions = []
+    deadline_exceeded = False
+    for (group_synth_funs, _), (solver_name, final_solutions, timed_out) in zip(groups, results):
+        solver_names.append(solver_name)
+        deadline_exceeded = deadline_exceeded or timed_out
+        if final_solutions is not None and final_solutions != "NO SOLUTION":
+            final_solutions = _parse_subproblem_solutions(final_solutions, group_synth_funs, syn_ctx)
+        solutions.append(final_solutions)
+    return (solver_names, solutions, deadline_exceeded)
+
+def make_solver(file_sexp, anytime=False, cex_per_round=1, verifier_workers=0, deadline=None,
+                preprocessed=None, store=None, subproblem_workers=0):
+    """Solves the benchmark, given as an sexp, or as the result of
+    preprocess_benchmark (preprocessed). Synth functions constrained
+    independently of each other are solved as separate subproblems (see
+    solve_independent_problems)."""
+    if deadline is None:
+        deadline = Deadline()
+    if preprocessed is None:
+        preprocessed = preprocess_benchmark(file_sexp, deadline)
+    (benchmark_tuple, massaged) = preprocessed
+    (
+            theories,
+            syn_ctx,
+            synth_instantiator,
+            macro_instantiator,
+            uf_instantiator,
+            constraints,
+            grammar_map,
+            forall_vars_map,
+            examples
+            ) = benchmark_tuple
+    theory = theories[0]
+    synth_funs = list(synth_instantiator.get_functions().values())
+
+    groups = [ (synth_funs, constraints) ]
+    if examples is None and len(synth_funs) > 1:
+        groups = expr_transforms.get_independent_problems(constraints, synth_funs)
+
+    if len(groups) == 1:
+        try:
+            (solver_name, final_solutions) = solve_problem(theory, syn_ctx, synth_funs,
+                    grammar_map, constraints, examples, massaged, anytime, cex_per_round,
+                    verifier_workers, deadline, store)
+        except _SolverDeadlineExceeded as exception:
+            metrics.record('solver', exception.solver_name)
+            metrics.record('deadline_exceeded', True)
+            print("(fail)")
+            return
+        if solver_name is None:
+            # print("Unable to solve!")
+            return
+        metrics.record('solver', solver_name)
     else:
-        # print("Unable to solve!")
-        pass
+        metrics.record('subproblems', len(groups))
+        (solver_names, group_solutions, deadline_exceeded) = solve_independent_problems(
+                theory, syn_ctx, groups, grammar_map, massaged, anytime, cex_per_round,
+                verifier_workers, deadline, store, subproblem_workers)
+        for solver_name in solver_names:
+            metrics.append('subproblem_solvers', solver_name)
+        metrics.record('solver', 'Independent Subproblems')
+        if deadline_exceeded:
+            metrics.record('deadline_exceeded', True)
+            print("(fail)")
+            return
+        if any([ sols is None for sols in group_solutions ]):
+            # print("Unable to solve!")
+            return
+        if any([ sols == "NO SOLUTION" for sols in group_solutions ]):
+            final_solutions = "NO SOLUTION"
+        else:
+            # Back in the order of the synth functions
+            solution_map = {}
+            for (group_synth_funs, _), sols in zip(groups, group_solutions):
+                solution_map.update(zip(group_synth_funs, sols))
+            final_solutions = [ solution_map[sf] for sf in synth_funs ]
+
+    if final_solutions == "NO SOLUTION":
+        print("(fail)")
+    else:
+        metrics.record('solved', True)
+        print_solutions(synth_funs, final_solutions)
+
+def print_anytime_solution_info(final_solution, solution_info):
+    (solution, dt_size, num_terms, num_preds, max_term_size, max_pred_size,
+            num_points, solution_time) = solution_info
+    print('----------------------------------------------')
+    print('Solution Size                : %d' % exprs.get_expression_size(solution))
+    print('Solution Time from start (s) : %f' % solution_time)
+    print('DT Size                      : %d' % dt_size)
+    print('Num Dist. Terms Enumerated   : %d' % num_terms)
+    print('Num Dist. Preds Enumerated   : %d' % num_preds)
+    print('Max Term Size Enumerated     : %d' % max_term_size)
+    print('Max Pred Size Enumerated     : %d' % max_pred_size)
+    print('Num Points                   : %d' % num_points)
+    print('Solution                     : %s' % exprs.expression_to_string(final_solution[0]))
+    print('----------------------------------------------', flush=True)
 
 def print_solutions(synth_funs, final_solutions):
     for sf, sol in zip(synth_funs, final_solutions):
@@ -405,20 +745,27 @@ def print_solutions(synth_funs, final_solutions):
 
 # Tests:
 
-def test_make_solver(benchmark_files):
+def test_make_solver(benchmark_files, anytime=False, cex_per_round=1, verifier_workers=0,
+                     time_limit=None, cache_dir=None, solution_store_dir=None, subproblem_workers=0):
+    cache = None if cache_dir is None else benchmark_cache.BenchmarkCache(cache_dir)
+    store = None if solution_store_dir is None else solution_store.SolutionStore(solution_store_dir)
     for benchmark_file in benchmark_files:
         # print(benchmark_file)
-        file_sexp = parser.sexpFromFile(benchmark_file)
-
-        # import cProfile, pstats
-        # pr = cProfile.Profile()
-        # pr.enable()
-        make_solver(file_sexp)
-        # pr.disable()
-        # sortby = 'time'
-        # ps = pstats.Stats(pr).sort_stats(sortby)
-        # ps.print_stats()
-        # print(s.getvalue())
+        deadline = Deadline(time_limit)
+        preprocessed = None
+        if cache is not None:
+            cache_key = cache.get_key(benchmark_file)
+            preprocessed = cache.load(cache_key)
+        if preprocessed is None:
+            file_sexp = parser.sexpFromFile(benchmark_file)
+            preprocessed = preprocess_benchmark(file_sexp, deadline)
+            (benchmark_tuple, massaged) = preprocessed
+            # A massaging cut short by the deadline is not cached
+            if cache is not None and massaged:
+                syn_ctx = benchmark_tuple[1]
+                cache.store(cache_key, syn_ctx, preprocessed)
+        make_solver(None, anytime, cex_per_round, verifier_workers, deadline, preprocessed, store,
+                    subproblem_workers)
 
 def find_grammar_anamolies():
     import os
@@ -436,7 +783,52 @@ def find_grammar_anamolies():
 
 
 if __name__ == "__main__":
-    import sys
-    benchmark_files = sys.argv[1:]
-    test_make_solver(benchmark_files)
+    import argparse
+    argparser = argparse.ArgumentParser(description='EUSolver')
+    argparser.add_argument('--anytime', action='store_true',
+            help='Keep searching for smaller solutions after the first one is found')
+    argparser.add_argument('--cex-per-round', type=int, default=1,
+            help='Maximum number of counterexamples added per verification round')
+    argparser.add_argument('--verifier-workers', type=int, default=0,
+            help='Number of worker processes verifying decision tree branches in parallel')
+    argparser.add_argument('--time-limit', type=float, default=None,
+            help='Give up (or, with --anytime, stop improving) after this many seconds per benchmark')
+    argparser.add_argument('--metrics-file', default=None,
+            help='Write timing and counter metrics as JSON to this file (- for stderr) '
+            'on exit and on SIGUSR1')
+    argparser.add_argument('--profile', choices=['cprofile', 'sample'], default=None,
+            help='Profile the run with cProfile, or with a sampling profiler '
+            'producing collapsed stacks for flame graphs. The timed phases show up as '
+            '_phase_<name> functions, and as [name] frames in collapsed stacks')
+    argparser.add_argument('--profile-output', default=None,
+            help='File to write the profile to (default: stderr)')
+    argparser.add_argument('--profile-interval', type=float, default=0.005,
+            help='Seconds of CPU time between two samples of the sampling profiler')
+    argparser.add_argument('--cache-dir', default=None,
+            help='Directory of preprocessed benchmarks, reused by later runs on the same files')
+    argparser.add_argument('--subproblem-workers', type=int, default=0,
+            help='Number of worker processes solving independent synth functions in parallel '
+                 '(ignored with --anytime, the subproblems are then solved one after the other)')
+    argparser.add_argument('--solution-store', default=None,
+            help='Directory of the solutions found, tried first on benchmarks with the same synth functions')
+    argparser.add_argument('benchmark_files', nargs='*')
+    args = argparser.parse_args()
+    governor.configure(solvers.EUSOLVER_MEMORY_LIMIT)
+    if args.profile is not None:
+        import atexit
+        import signal
+        import sys
+        from utils.profiling import Profiler
+        profiler = Profiler(args.profile, args.profile_output, args.profile_interval)
+        atexit.register(profiler.stop)
+        # Write the profile of runs killed by a time limit as well
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+        profiler.start()
+    if args.metrics_file is not None:
+        import atexit
+        metrics.install_signal_handler(args.metrics_file)
+        atexit.register(metrics.dump, args.metrics_file)
+    test_make_solver(args.benchmark_files, args.anytime, args.cex_per_round,
+            args.verifier_workers, args.time_limit, args.cache_dir, args.solution_store,
+            args.subproblem_workers)
     # find_grammar_anamolies()
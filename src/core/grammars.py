@@ -44,6 +44,7 @@ from semantics import semantics_types
 import random
 from exprs import exprs
 from enumerators import enumerators
+from utils.metrics import metrics
 
 
 def _nt_to_generator_name(nt):
@@ -151,11 +152,15 @@ class FunctionRewrite(RewriteBase):
         for child in self.children:
             child.substitute_expr(old, new)
 
-    def to_generator(self, place_holders):
+    def to_generator(self, place_holders, size_bounds=None):
         ph_vars, nts, expr_template = self.to_template_expr()
         if len(ph_vars) == 0:
             return enumerators.LeafGenerator([expr_template])
         sub_gens = [ place_holders[_nt_to_generator_name(nt)] for nt in nts ]
+        if size_bounds is not None:
+            sub_size_bounds = [ size_bounds.get(nt, _unknown_size_bounds) for nt in nts ]
+        else:
+            sub_size_bounds = None
         
         # Try some pruning rules
         if (len(self.children) == 2 and
@@ -164,7 +169,8 @@ class FunctionRewrite(RewriteBase):
             good_size_tuple = enumerators.commutative_good_size_tuple
         else:
             good_size_tuple = enumerators.default_good_size_tuple
-        return enumerators.ExpressionTemplateGenerator(expr_template, ph_vars, sub_gens, good_size_tuple=good_size_tuple)
+        return enumerators.ExpressionTemplateGenerator(expr_template, ph_vars, sub_gens,
+                good_size_tuple=good_size_tuple, sub_size_bounds=sub_size_bounds)
 
     def rename_nt(self, old_name, new_name):
         new_children = [ child.rename_nt(old_name, new_name) 
@@ -416,6 +422,44 @@ def identify_lia_grammars(synth_fun, grammar):
 
 
 
+# Sizes of the expressions derivable from a non-terminal defined elsewhere
+# (e.g., the term start non-terminal in the predicate grammar of decompose())
+_unknown_size_bounds = (1, None)
+
+def _get_rewrite_nts(rewrite):
+    # The non-terminals of a rewrite, in the order of to_template_expr()
+    if type(rewrite) == NTRewrite:
+        return [ rewrite.non_terminal ]
+    elif type(rewrite) == FunctionRewrite:
+        return [ nt for child in rewrite.children for nt in _get_rewrite_nts(child) ]
+    return []
+
+def _get_rewrite_size_bound(rewrite, nt_bounds, combine):
+    # The size bound of the expressions of a rewrite, as counted by the
+    # enumerators: 1 for a leaf, the size of the non-terminal for a unit
+    # production, and 1 + the sizes of the non-terminals for a template
+    nts = _get_rewrite_nts(rewrite)
+    if len(nts) == 0:
+        return 1
+    bounds = [ nt_bounds(nt) for nt in nts ]
+    if type(rewrite) == NTRewrite:
+        return bounds[0]
+    return combine(bounds)
+
+def _dedup_rewrites(rewrites):
+    # Leaves (e.g., the constants of PBE examples) are compared by hashing
+    retval = []
+    leaf_exprs = set()
+    for rewrite in rewrites:
+        if type(rewrite) == ExpressionRewrite:
+            if rewrite.expr in leaf_exprs:
+                continue
+            leaf_exprs.add(rewrite.expr)
+        elif any(rewrite == r for r in retval):
+            continue
+        retval.append(rewrite)
+    return retval
+
 class Grammar(object):
     def __init__(self, non_terminals, nt_type, rules, start='Start'):
         self.non_terminals = non_terminals
@@ -434,6 +478,134 @@ class Grammar(object):
                 self.rules[nt] = [ const_rewrite ]
             else:
                 self.rules[nt].append(const_rewrite)
+        for nt in set('Constant' + str(r.type) for r in constant_rewrites):
+            self.rules[nt] = _dedup_rewrites(self.rules[nt])
+
+    def _get_reachable_nts(self, rules):
+        # The non-terminals reachable from the start through the rules, in
+        # the order of the grammar
+        reachable = set([ self.start ])
+        stack = [ self.start ]
+        while len(stack) > 0:
+            for rewrite in rules[stack.pop()]:
+                for nt in _get_rewrite_nts(rewrite):
+                    if nt in rules and nt not in reachable:
+                        reachable.add(nt)
+                        stack.append(nt)
+        return [ nt for nt in self.non_terminals if nt in reachable ]
+
+    def _get_productive_nts(self):
+        # Non-terminals deriving at least one (finite) expression
+        productive = set()
+        changed = True
+        while changed:
+            changed = False
+            for nt in self.non_terminals:
+                if nt in productive:
+                    continue
+                for rewrite in self.rules[nt]:
+                    if all(n in productive or n not in self.rules for n in _get_rewrite_nts(rewrite)):
+                        productive.add(nt)
+                        changed = True
+                        break
+        return productive
+
+    def _expand_unit_productions(self, nt, rules, visiting):
+        # The rules of nt, with the rules of the non-terminals of its unit
+        # productions in their place. Unit cycles derive nothing new.
+        retval = []
+        for rewrite in rules[nt]:
+            if type(rewrite) != NTRewrite or rewrite.non_terminal not in rules:
+                retval.append(rewrite)
+            elif rewrite.non_terminal not in visiting:
+                retval.extend(self._expand_unit_productions(rewrite.non_terminal, rules,
+                                                            visiting | set([rewrite.non_terminal])))
+        return retval
+
+    def optimize(self):
+        """Returns an equivalent grammar for enumeration: rewrites that cannot
+        type-check or use non-productive non-terminals are removed, unit
+        productions are replaced by the rules of their non-terminals,
+        duplicate rewrites are removed, and so are the non-terminals not
+        reachable from the start. The grammar is not modified.
+        The bounds of the sizes of the expressions derivable from each
+        non-terminal are in the size_bounds attribute of the result (see
+        compute_size_bounds())."""
+        # Unreachable non-terminals (e.g., the constants of the examples added
+        # to a grammar not using them) are left out first
+        non_terminals = self._get_reachable_nts(self.rules)
+        rules = {}
+        for nt in non_terminals:
+            nt_type = self.nt_type[nt]
+            rules[nt] = [ r for r in self.rules[nt]
+                          if nt_type is None or r.type is None or r.type == nt_type ]
+        typed_grammar = Grammar(non_terminals, self.nt_type, rules, self.start)
+
+        productive = typed_grammar._get_productive_nts()
+        for nt in non_terminals:
+            rules[nt] = [ r for r in rules[nt]
+                          if all(n in productive or n not in self.rules for n in _get_rewrite_nts(r)) ]
+        rules = { nt : self._expand_unit_productions(nt, rules, set([nt]))
+                  for nt in non_terminals }
+
+        non_terminals = typed_grammar._get_reachable_nts(rules)
+        rules = { nt : _dedup_rewrites(rules[nt]) for nt in non_terminals }
+        retval = Grammar(non_terminals,
+                         { nt : self.nt_type[nt] for nt in non_terminals },
+                         rules,
+                         self.start)
+        retval.from_default = self.from_default
+        retval.size_bounds = retval.compute_size_bounds()
+        metrics.incr('grammar_nts_pruned', len(self.non_terminals) - len(non_terminals))
+        metrics.incr('grammar_rewrites_pruned',
+                     sum(len(self.rules[nt]) for nt in self.non_terminals) -
+                     sum(len(rules[nt]) for nt in non_terminals))
+        return retval
+
+    def compute_size_bounds(self):
+        """Returns a map from each non-terminal to the pair of the smallest
+        and the largest sizes (None if unbounded) of the expressions it
+        derives, as counted by the enumerators. The bounds of a non-productive
+        non-terminal are (None, 0)."""
+        infinity = float('inf')
+        min_sizes = { nt : infinity for nt in self.non_terminals }
+        def min_bound(nt):
+            return min_sizes[nt] if nt in min_sizes else _unknown_size_bounds[0]
+        changed = True
+        while changed:
+            changed = False
+            for nt in self.non_terminals:
+                for rewrite in self.rules[nt]:
+                    size = _get_rewrite_size_bound(rewrite, min_bound, lambda bs: 1 + sum(bs))
+                    if size < min_sizes[nt]:
+                        min_sizes[nt] = size
+                        changed = True
+
+        # Non-terminals on (or reaching) a cycle are unbounded
+        max_sizes = {}
+        in_progress = set()
+        def max_bound(nt):
+            if nt not in self.rules or nt in in_progress:
+                return None
+            if nt not in max_sizes:
+                in_progress.add(nt)
+                max_size = 0
+                for rewrite in self.rules[nt]:
+                    size = _get_rewrite_size_bound(rewrite, max_bound,
+                            lambda bs: None if None in bs else 1 + sum(bs))
+                    if size is None:
+                        max_size = None
+                        break
+                    max_size = max(max_size, size)
+                in_progress.remove(nt)
+                max_sizes[nt] = max_size
+            return max_sizes[nt]
+
+        retval = {}
+        for nt in self.non_terminals:
+            min_size = None if min_sizes[nt] == infinity else min_sizes[nt]
+            retval[nt] = (min_size, max_bound(nt))
+        return retval
 
     def __str__(self):
         return self.str()
@@ -465,30 +637,33 @@ class Grammar(object):
         return Grammar(new_nts, new_nt_type, new_rules, new_start)
 
     def to_generator(self, generator_factory=None):
+        """Returns the generator of the start non-terminal of the optimized
+        grammar (see optimize())."""
         if generator_factory == None:
             generator_factory = enumerators.RecursiveGeneratorFactory()
-        for nt in self.non_terminals:
+        grammar = self.optimize()
+        for nt in grammar.non_terminals:
             if not generator_factory.has_placeholder(_nt_to_generator_name(nt)):
                 generator_factory.make_placeholder(_nt_to_generator_name(nt))
         place_holders = generator_factory.generator_map
         ret = None
-        for nt in self.non_terminals:
+        for nt in grammar.non_terminals:
             generators = []
             leaves = []
-            for rewrite in self.rules[nt]:
+            for rewrite in grammar.rules[nt]:
                 if type(rewrite) == ExpressionRewrite:
                     leaves.append(rewrite.expr)
                 elif type(rewrite) == NTRewrite:
                     generators.append(place_holders[_nt_to_generator_name(rewrite.non_terminal)])
                 elif type(rewrite) == FunctionRewrite:
-                    generators.append(rewrite.to_generator(place_holders))
+                    generators.append(rewrite.to_generator(place_holders, grammar.size_bounds))
                 else:
                     raise Exception('Unknown rewrite type: %s' % str(type(rewrite)))
             leaf_generator = enumerators.LeafGenerator(leaves)
             nt_generator = generator_factory.make_generator(_nt_to_generator_name(nt),
                     enumerators.AlternativesGenerator,
                             ([ leaf_generator ] + generators ,))
-            if nt == self.start:
+            if nt == grammar.start:
                 ret = nt_generator
         return ret
 
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# point_store.py ---
+#
+# Filename: point_store.py
+# Created: Mon Oct 19 09:12:40 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+from utils import basetypes
+from exprs import evaluation
+
+class PointStore(object):
+    """Holds the points (tuples of exprs.Value objects) of a synthesis problem,
+    in the order in which they were added: the row id of a point is its
+    position. Besides the list of points, the store maintains one column of
+    raw values per variable position (unboxed, as in column-wise evaluation),
+    with the type of the column, and an index from points to row ids.
+    The solver and its components share one store: the components subscribe
+    to it, and are notified with the new points and the row id of the first
+    one, after the points are added."""
+
+    def __init__(self):
+        self.points = []
+        self.row_ids = {}
+        self.columns = []
+        self.column_types = []
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __getitem__(self, row_id):
+        return self.points[row_id]
+
+    def __contains__(self, point):
+        return point in self.row_ids
+
+    def index(self, point):
+        """Returns the row id of (the first occurrence of) the point."""
+        return self.row_ids[point]
+
+    def get_points(self):
+        return self.points
+
+    def get_columns(self):
+        return self.columns
+
+    def get_column_types(self):
+        return self.column_types
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def add_points(self, new_points):
+        new_points = list(new_points)
+        if len(new_points) == 0:
+            return
+        start_index = len(self.points)
+        if start_index == 0:
+            self.column_types = [ v.value_type for v in new_points[0] ]
+            self.columns = [ [] for v in new_points[0] ]
+        row_ids = self.row_ids
+        columns = self.columns
+        unbox = evaluation.unbox_raw_value
+        for row_id, point in enumerate(new_points, start_index):
+            if len(point) != len(columns):
+                raise basetypes.ArgumentError('Point of unexpected size %d' % len(point))
+            row_ids.setdefault(point, row_id)
+            for column, v in zip(columns, point):
+                column.append(unbox(v.value_object))
+        self.points.extend(new_points)
+        for listener in list(self.listeners):
+            listener(new_points, start_index)
+
+
+class PointStoreSubscriber(object):
+    """Base class for the components following the points of a PointStore.
+    Subclasses implement :points_added(new_points, start_index):. Until
+    :set_point_store: is called, a component uses a store of its own, created
+    when points are first added to it."""
+    point_store = None
+
+    def set_point_store(self, point_store):
+        """Makes the component follow :point_store:. Meant to be called before
+        any points are added to the component."""
+        if point_store is self.point_store:
+            return
+        if self.point_store is not None:
+            self.point_store.unsubscribe(self.points_added)
+        self.point_store = point_store
+        self.points = point_store.points
+        point_store.subscribe(self.points_added)
+
+    def add_points(self, new_points):
+        if self.point_store is None:
+            self.set_point_store(PointStore())
+        self.point_store.add_points(new_points)
+
+    def points_added(self, new_points, start_index):
+        raise basetypes.AbstractMethodError('PointStoreSubscriber.points_added()')
+
+#
+# point_store.py ends here
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# solution_store.py ---
+#
+# Filename: solution_store.py
+# Created: Mon Oct 19 14:37:52 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""A persistent store of the solutions found by the solver. The solutions
+are filed under a digest of the synth functions (names, signatures and the
+parts of their grammars reachable from the start symbols), and, within it,
+under a digest of the constraints that does not depend on their order.
+Benchmarks differing only in their constraints (e.g., the number of
+examples) share the first key: their solutions are candidates for each
+other, to be checked by the verifier before use."""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from exprs import exprs
+from parsers import parser
+from parsers.sexp import sexp as sexpParser
+
+def _get_reachable_non_terminals(grammar):
+    reachable = set([grammar.start])
+    stack = [grammar.start]
+    while len(stack) > 0:
+        nt = stack.pop()
+        for rewrite in grammar.rules[nt]:
+            for child_nt in rewrite.to_template_expr()[1]:
+                if child_nt not in reachable:
+                    reachable.add(child_nt)
+                    stack.append(child_nt)
+    return reachable
+
+def _grammar_to_string(grammar):
+    if grammar.from_default:
+        # The whole theory, whatever constants were added from the constraints
+        return 'default'
+    reachable = _get_reachable_non_terminals(grammar)
+    lines = [ 'start ' + grammar.start ]
+    for nt in grammar.non_terminals:
+        if nt in reachable:
+            lines.append('%s %s: %s' % (nt, grammar.nt_type[nt],
+                                        ' '.join([ r.str() for r in grammar.rules[nt] ])))
+    return '\n'.join(lines)
+
+def _synth_fun_to_string(synth_fun, grammar):
+    named_vars = [ v.variable_info for v in synth_fun.get_named_vars() ]
+    return '%s (%s) %s\n%s' % (synth_fun.function_name,
+                               ' '.join([ '(%s %s)' % (v.variable_name, v.variable_type)
+                                          for v in named_vars ]),
+                               synth_fun.range_type,
+                               _grammar_to_string(grammar))
+
+def _digest(strings):
+    digest = hashlib.sha256()
+    for s in strings:
+        digest.update(s.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class SolutionStore(object):
+    """A directory with a JSON file of entries per key of synth functions.
+    An entry is the digest of the constraints and the solutions, as the
+    strings of the expressions over the named arguments of the synth
+    functions."""
+    # Entries kept per key of synth functions, the most recent ones
+    max_entries_per_key = 16
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def get_keys(self, theory, synth_funs, grammar_map, constraints, examples=None):
+        """Returns the key of the synth functions and the key of the
+        constraints (or of the PBE examples, see parser.ExampleTable)."""
+        fun_key = _digest([ theory ] + [ _synth_fun_to_string(sf, grammar_map[sf])
+                                         for sf in synth_funs ])
+        constraint_strings = [ exprs.expression_to_string(c) for c in constraints ]
+        if examples is not None:
+            constraint_strings.extend([ repr((args, value)) for args, value in
+                                        examples.get_valuations().items() ])
+        constraints_key = _digest(sorted(constraint_strings))
+        return (fun_key, constraints_key)
+
+    def _get_path(self, fun_key):
+        return os.path.join(self.store_dir, fun_key + '.json')
+
+    def _read_entries(self, fun_key):
+        try:
+            with open(self._get_path(fun_key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def lookup(self, keys):
+        """Returns the solutions stored under the key of the synth functions:
+        those of the same constraints first, then the most recent ones."""
+        (fun_key, constraints_key) = keys
+        entries = self._read_entries(fun_key)
+        entries.sort(key=lambda e: e['constraints'] != constraints_key)
+        retval = []
+        for entry in entries:
+            if entry['solutions'] not in retval:
+                retval.append(entry['solutions'])
+        return retval
+
+    def add(self, keys, solutions):
+        """Stores the solutions (expressions over the named arguments of the
+        synth functions)."""
+        (fun_key, constraints_key) = keys
+        solution_strings = [ exprs.expression_to_string(s) for s in solutions ]
+        entries = [ e for e in self._read_entries(fun_key)
+                    if e['constraints'] != constraints_key or e['solutions'] != solution_strings ]
+        entries.insert(0, { 'constraints' : constraints_key, 'solutions' : solution_strings })
+        del entries[self.max_entries_per_key:]
+
+        (fd, temp_path) = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, self._get_path(fun_key))
+
+def parse_solutions(solution_strings, synth_funs, syn_ctx):
+    """Returns the stored solutions as expressions over the formal parameters
+    of the synth functions, or None if they cannot be built in syn_ctx."""
+    retval = []
+    for synth_fun, solution_string in zip(synth_funs, solution_strings):
+        arg_var_map = { v.variable_info.variable_name : fp
+                        for v, fp in zip(synth_fun.get_named_vars(), synth_fun.formal_parameters) }
+        try:
+            solution_sexp = sexpParser.parseString(solution_string, parseAll=True).asList()[0]
+            solution = parser.sexp_to_expr(solution_sexp, syn_ctx, arg_var_map)
+        except Exception:
+            return None
+        if exprs.get_expression_type(solution) != synth_fun.range_type:
+            return None
+        retval.append(solution)
+    return retval
+
+#
+# solution_store.py ends here
@@ -38,10 +38,16 @@
 
 # Code:
 
+import os
+
 from exprs import evaluation
 from exprs import exprs
+from core.point_store import PointStore
+from utils.metrics import metrics
+from utils.memory_governor import governor
 
-EUSOLVER_MEMORY_LIMIT = (1 << 31)
+# In bytes, enforced by utils.memory_governor
+EUSOLVER_MEMORY_LIMIT = int(os.environ.get('EUSOLVER_MEMORY_LIMIT', 1 << 31))
 
 _expr_to_str = exprs.expression_to_string
 _is_expr = exprs.is_expression
@@ -62,47 +68,87 @@ class Solver(object):
         self.term_solver_time = 0
         self.unifier_time = 0
         self.report_additional_info = False
+        self.anytime = False
 
     def reset(self):
         self.eval_ctx = evaluation.EvaluationContext()
-        self.points = []
-        self.point_set = set()
+        self.point_store = PointStore()
+        self.points = self.point_store.points
 
     def add_points(self, points):
+        new_point_set = set()
         for point in points:
-            if (point in self.point_set):
+            if (point in self.point_store or point in new_point_set):
                 raise DuplicatePointException(point)
-            self.point_set.add(point)
-            self.points.append(point)
-
-    def solve(self, generator_factory, term_solver, unifier, verifier, verify_term_solve=True):
+            new_point_set.add(point)
+        self.point_store.add_points(points)
+        metrics.incr('rounds')
+        metrics.append('points_per_round', len(points))
+
+    def solve(self, generator_factory, term_solver, unifier, verifier, verify_term_solve=True,
+              deadline=None):
+        """Runs the CEGIS loop, yielding the solutions found.
+        Without :anytime: the first verified solution is yielded and the loop
+        stops. With :anytime: each solution tightens the solution size bound
+        of the unifier and the loop continues to resume the same unifier
+        state (and hence the same term and predicate banks), yielding every
+        strictly smaller verified solution. The unifier is only restarted
+        when new points are added.
+        The optional :deadline: (utils.deadline.Deadline) is checked at each
+        round, by the enumerators and by the SMT checks of the verifier;
+        basetypes.DeadlineExceededError is raised when it expires."""
         import time
 
         time_origin = time.process_time()
+        term_solver.set_point_store(self.point_store)
+        unifier.set_point_store(self.point_store)
+        generator_factory.set_point_store(self.point_store)
+        term_solver.set_deadline(deadline)
+        unifier.set_deadline(deadline)
+        generator_factory.set_deadline(deadline)
+        verifier.deadline = deadline
+        unifier_state = None
+        best_solution_size = None
 
         while (True):
             # print('________________')
-            # iterate until we have terms that are "sufficient"
-            success = term_solver.solve()
-            if not success:
-                return None
-            # we now have a sufficient set of terms
-            # print('Term solve complete!')
-            # print([ _expr_to_str(term) for sig,term in term_solver.get_signature_to_term().items()])
-
-            # Check term solver for completeness
-            if verify_term_solve:
-                cexs = verifier.verify_term_solve(list(term_solver.get_signature_to_term().values()))
+            governor.check()
+            if deadline is not None:
+                deadline.check()
+            if unifier_state is None:
+                # iterate until we have terms that are "sufficient"
+                timer = metrics.phase('term_solve')
+                success = timer.run(term_solver.solve)
+                self.term_solver_time += timer.cpu_time
+                if not success:
+                    return None
+                # we now have a sufficient set of terms
+                # print('Term solve complete!')
+                # print([ _expr_to_str(term) for sig,term in term_solver.get_signature_to_term().items()])
+
+                # Check term solver for completeness
+                if verify_term_solve:
+                    cexs = metrics.phase('verify_term_solve').run(verifier.verify_term_solve,
+                            list(term_solver.get_signature_to_term().values()))
+                else:
+                    cexs = None
             else:
                 cexs = None
 
             # print('Term solve checked!')
             if cexs is None:
-                unifier_state = unifier.unify()
-                unification = next(unifier_state)
+                if unifier_state is None:
+                    unifier_state = unifier.unify()
+                timer = metrics.phase('unify')
+                try:
+                    unification = timer.run(next, unifier_state)
+                except StopIteration:
+                    return None
+                finally:
+                    self.unifier_time += timer.cpu_time
                 # print('Unification done!')
                 # print(exprs.expression_to_string(unification[1]))
-                sol_or_cex = verifier.verify(unification)
+                sol_or_cex = metrics.phase('verify').run(verifier.verify, unification)
                 # print('Verification done!')
                 # print(sol_or_cex)
             else:
@@ -110,7 +156,15 @@ class Solver(object):
                 sol_or_cex = cexs
 
             if _is_expr(sol_or_cex):
+                solution_size = exprs.get_expression_size(sol_or_cex)
+                if best_solution_size is not None and solution_size >= best_solution_size:
+                    continue
                 solution_found_at = time.process_time() - time_origin
+                # Size of the decision tree solution, before it is rewritten
+                # back into the formal parameters, as in the anytime output
+                metrics.record('solution_size', solution_size)
+                metrics.record('dt_size', unifier.last_dt_size)
+                metrics.record('num_points', len(self.points))
                 if self.report_additional_info:
                     yield (sol_or_cex,
                             unifier.last_dt_size,
@@ -122,14 +176,17 @@ class Solver(object):
                             solution_found_at)
                 else:
                     yield sol_or_cex
-                return
+                if not self.anytime:
+                    return
+                best_solution_size = solution_size
+                unifier.set_solution_size_bound(solution_size)
+                continue
 
             # for cex in sol_or_cex:
                 # print('ADDING POINT:', [p.value_object for p in cex])
-            term_solver.add_points(sol_or_cex) # Term solver can add all points at once
-            unifier.add_points(sol_or_cex)
+            # The term solver, unifier and generator factory follow the store
             self.add_points(sol_or_cex)
-            generator_factory.add_points(sol_or_cex)
+            unifier_state = None
             # print('________________')
 
 
@@ -143,11 +143,17 @@ class StandardSpec(FormulaSpec):
         return self.canon_clauses
 
 class PBESpec(SpecInterface):
-    def __init__(self, expr_valuations, synth_fun, theory):
+    def __init__(self, expr_valuations, synth_fun, theory, valuations=None):
+        """expr_valuations are pairs of (argument expressions, value expression);
+        already evaluated valuations (argument values -> raw value) can be
+        given instead."""
         self.synth_fun = synth_fun
         self.eval_ctx = evaluation.EvaluationContext()
         
-        self._initialize_valuations(expr_valuations)
+        if valuations is None:
+            self._initialize_valuations(expr_valuations)
+        else:
+            self.valuations = valuations
 
         args = [ exprs.FormalParameterExpression(synth_fun, argtype, i) 
                 for i, argtype in enumerate(synth_fun.domain_types)] 
@@ -60,6 +60,8 @@ class SynthesisContext(object):
         self.unknown_function_map = {}
         self.spec = None
         self.synth_funs = None
+        # (expr, theory) -> (clauses, cnf_expr), see expr_transforms.to_cnf
+        self.cnf_cache = {}
 
     def make_variable(self, var_type, var_name,
                       var_eval_offset = exprs.VariableInfo._undefined_offset):
@@ -180,6 +182,11 @@ class SynthesisContext(object):
         assert self.synth_funs is None
         self.synth_funs = synth_funs
 
+    def clear_synth_funs(self):
+        """Allows the synth functions to be set again, for the next one of
+        the subproblems solved in this context."""
+        self.synth_funs = None
+
     def get_synth_funs(self):
         return self.synth_funs
 
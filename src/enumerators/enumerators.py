@@ -43,6 +43,10 @@ from exprs import evaluation
 from utils import basetypes
 from exprs import exprs
 from exprs import exprtypes
+from core.point_store import PointStoreSubscriber
+from utils.metrics import metrics
+from utils import memory_governor
+from utils.memory_governor import governor
 
 # if __name__ == '__main__':
 #     utils.print_module_misuse_and_exit()
@@ -114,15 +118,27 @@ class LeafGenerator(GeneratorBase):
         return LeafGenerator(self.leaf_objects, self.name)
 
 class NonLeafGenerator(GeneratorBase):
-    """A generator with sub generators."""
+    """A generator with sub generators.
+    The optional :sub_size_bounds: are the (smallest, largest) sizes of the
+    objects of each sub generator (see grammars.Grammar.compute_size_bounds(),
+    None if unbounded): the partitions of the size out of these bounds are
+    skipped."""
 
-    def __init__(self, sub_generators, name=None):
+    def __init__(self, sub_generators, name=None, sub_size_bounds=None):
         super().__init__(name)
         self.sub_generators = [x.clone() for x in sub_generators]
         self.arity = len(sub_generators)
         self.allowed_size = 0
         assert self.arity > 0
         self.good_size_tuple = default_good_size_tuple
+        self.sub_size_bounds = sub_size_bounds
+        if sub_size_bounds is not None:
+            assert len(sub_size_bounds) == self.arity
+            self.min_size = 1 + sum(min_size for (min_size, max_size) in sub_size_bounds)
+            if any(max_size is None for (min_size, max_size) in sub_size_bounds):
+                self.max_size = None
+            else:
+                self.max_size = 1 + sum(max_size for (min_size, max_size) in sub_size_bounds)
 
     def set_size(self, new_size):
         self.allowed_size = new_size
@@ -137,13 +153,26 @@ class NonLeafGenerator(GeneratorBase):
     def _instantiate(self, sub_exprs):
         raise basetypes.AbstractMethodError('NonLeafGenerator._instantiate()')
 
+    def _is_within_size_bounds(self, partition):
+        for size, (min_size, max_size) in zip(partition, self.sub_size_bounds):
+            if size < min_size or (max_size is not None and size > max_size):
+                return False
+        return True
+
     def generate(self):
         if (self.allowed_size - 1 < self.arity):
             return
+        sub_size_bounds = self.sub_size_bounds
+        if sub_size_bounds is not None:
+            if (self.allowed_size < self.min_size or
+                    (self.max_size is not None and self.allowed_size > self.max_size)):
+                return
 
         for partition in utils.partitions(self.allowed_size - 1, self.arity):
             if not self.good_size_tuple(partition):
                 continue
+            if sub_size_bounds is not None and not self._is_within_size_bounds(partition):
+                continue
             self._set_sub_generator_sizes(partition)
             for product_tuple in cartesian_product_of_generators(*self.sub_generators):
                 yield self._instantiate(product_tuple)
@@ -152,8 +181,9 @@ class NonLeafGenerator(GeneratorBase):
 class ExpressionTemplateGenerator(NonLeafGenerator):
     """A generator for expressions with placeholders."""
 
-    def __init__(self, expr_template, place_holder_vars, sub_generators, good_size_tuple, name=None):
-        super().__init__(sub_generators, name)
+    def __init__(self, expr_template, place_holder_vars, sub_generators, good_size_tuple, name=None,
+                 sub_size_bounds=None):
+        super().__init__(sub_generators, name, sub_size_bounds)
         self.expr_template = expr_template
         self.place_holder_vars = place_holder_vars
         assert len(place_holder_vars) == len(sub_generators)
@@ -174,7 +204,8 @@ class ExpressionTemplateGenerator(NonLeafGenerator):
                 self.place_holder_vars,
                 [x.clone() for x in self.sub_generators],
                 self.good_size_tuple,
-                self.name)
+                self.name,
+                self.sub_size_bounds)
 
 class FunctionalGenerator(NonLeafGenerator):
     """A generator for function objects.
@@ -259,19 +290,25 @@ class _RecursiveGeneratorPlaceholder(GeneratorBase):
     def clone(self):
         return _RecursiveGeneratorPlaceholder(self.factory, self.identifier)
 
-class GeneratorFactoryBase(object):
+class GeneratorFactoryBase(PointStoreSubscriber):
     """A factory for creating recursive generators
     (possibly mutually recursive as well). We associate names with
     generator objects, and also allow these names to be used as placeholders.
     In the end, we actually create the generator object, when :set_size(): is called
     on the returned generator objects."""
 
+    deadline = None
+
     def __init__(self):
         self.generator_map = {}
         self.generator_constructors = {}
 
-    def add_points(self, points):
-        raise basetypes.AbstractMethodError('GeneratorFactoryBase.add_points()')
+    def set_deadline(self, deadline):
+        """Sets the utils.deadline.Deadline checked while generating."""
+        self.deadline = deadline
+
+    def points_added(self, new_points, start_index):
+        raise basetypes.AbstractMethodError('GeneratorFactoryBase.points_added()')
 
     def make_placeholder(self, identifier):
         if (identifier in self.generator_map):
@@ -295,14 +332,14 @@ class NullGeneratorFactory(GeneratorFactoryBase):
     def __init__(self):
         super().__init__()
 
-    def add_points(self, points):
+    def points_added(self, new_points, start_index):
         pass
 
 class RecursiveGeneratorFactory(GeneratorFactoryBase):
     def __init__(self):
         super().__init__() 
 
-    def add_points(self, points):
+    def points_added(self, new_points, start_index):
         pass
 
     def _instantiate_placeholder(self, placeholder):
@@ -345,6 +382,10 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
         self.base_generators = {}
         self.finished_generators = {}
         self.eval_ctx = evaluation.EvaluationContext()
+        # Memory pressure modes, see shed_memory()
+        self.digest_signatures = False
+        self.streaming = False
+        governor.register(self)
 
         if spec.is_multipoint:
             assert len(spec.synth_funs) == 1
@@ -365,6 +406,32 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
         self.base_generators = {}
         self.finished_generators = {}
 
+    def shed_memory(self, level):
+        """Sheds memory under memory pressure. At SHED_COMPACT, the
+        signatures are replaced by their hashes (a collision only prunes a
+        distinct expression). At SHED_CACHES, the largest size bucket of
+        each placeholder is dropped, with its signatures: it is generated
+        again if it is needed. At SHED_STREAM, all the caches are dropped
+        and the placeholders instantiated from now on enumerate without
+        point distinctness, like a RecursiveGeneratorFactory."""
+        if level >= memory_governor.SHED_COMPACT and not self.digest_signatures:
+            self.digest_signatures = True
+            for placeholder, signatures in self.signatures.items():
+                self.signatures[placeholder] = { hash(sig) : size for sig, size in signatures.items() }
+        if level >= memory_governor.SHED_STREAM:
+            self.streaming = True
+            self.clear_caches()
+        elif level >= memory_governor.SHED_CACHES:
+            largest_sizes = {}
+            for (placeholder, size) in self.cache:
+                largest_sizes[placeholder] = max(size, largest_sizes.get(placeholder, 0))
+            for placeholder, size in largest_sizes.items():
+                del self.cache[(placeholder, size)]
+                del self.base_generators[(placeholder, size)]
+                del self.finished_generators[(placeholder, size)]
+                signatures = self.signatures[placeholder]
+                self.signatures[placeholder] = { sig : s for sig, s in signatures.items() if s != size }
+
     def print_caches(self):
         # print('++++++++++++')
         for placeholder, size in self.cache:
@@ -374,10 +441,9 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
                 # print(exprs.expression_to_string(term))
         # print('++++++++++++')
 
-    def add_points(self, points):
-        self.points.extend(points)
+    def points_added(self, new_points, start_index):
         if self.applications is not None:
-            for point in points:
+            for point in new_points:
                 self.eval_ctx.set_valuation_map(point)
                 point_profile = []
                 for app in self.applications:
@@ -389,7 +455,8 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
     def _initialize_base_generator(self, placeholder, size):
         self.cache[(placeholder, size)] = []
         if placeholder not in self.signatures:
-            self.signatures[placeholder] = []
+            # signature (or its hash) -> size of the expression
+            self.signatures[placeholder] = {}
         (constructor, arg_tuple) = self.generator_constructors[placeholder]
         generator = constructor(*arg_tuple)
         generator.set_size(size)
@@ -397,15 +464,26 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
         self.finished_generators[(placeholder, size)] = False
 
     def _compute_signature(self, expr):
+        # Signatures are tuples, so that they can be hashed
         if self.applications is None:
             # Single invocation (not multifunction)
+            # Assumes introvars are at the beginning of the point
             points = self.points
+            if len(points) == 0:
+                return ()
+            try:
+                return tuple(evaluation.evaluate_expression_on_columns(
+                    expr, self.point_store.get_columns(), len(points), self.eval_ctx))
+            except (basetypes.UnhandledCaseError, basetypes.PartialFunctionError):
+                # Column-wise evaluation does not short-circuit, evaluate the
+                # points one at a time to find out if expr is really undefined
+                pass
             res = [ None ] * len(points)
             for i in range(len(points)):
-                # Assumes introvars are at the beginning of the point
                 self.eval_ctx.set_valuation_map(points[i])
-                res[i] = evaluation.evaluate_expression_raw(expr, self.eval_ctx)
-            return res
+                res[i] = evaluation.unbox_raw_value(
+                    evaluation.evaluate_expression_raw(expr, self.eval_ctx))
+            return tuple(res)
         else:
             points = self.points
             res = [ None ] * len(points)
@@ -414,50 +492,75 @@ class PointDistinctGeneratorFactory(GeneratorFactoryBase):
                 for profile in self.point_profiles[i]:
                     self.eval_ctx.set_valuation_map(profile)
                     sig.append(evaluation.evaluate_expression_raw(expr, self.eval_ctx))
-                res[i] = sig
-            return res
+                res[i] = tuple(sig)
+            return tuple(res)
 
     def get_from(self, placeholder, size, position):
         placeholder = placeholder.identifier
-
-        # Have not started generation
-        if (placeholder, size) not in self.cache:
-            self._initialize_base_generator(placeholder, size)
-
-        cached_exprs = self.cache[(placeholder, size)]
-        assert position <= len(cached_exprs)
+        key = (placeholder, size)
 
         # Have already generated required expression
-        if position < len(cached_exprs):
+        cached_exprs = self.cache.get(key)
+        if cached_exprs is not None and position < len(cached_exprs):
+            metrics.incr('generator_cache_hits')
             return cached_exprs[position]
+        metrics.incr('generator_cache_misses')
+        # Only notes memory pressure: the caches of this factory are shed
+        # between rounds, never under an enumeration in progress
+        governor.poll()
+
+        # Have not started generation
+        if key not in self.cache:
+            self._initialize_base_generator(placeholder, size)
+        cached_exprs = self.cache[key]
 
-        # Have finished generation
-        if self.finished_generators[(placeholder, size)]:
-            return None
+        # In the middle of generation (a bucket dropped under memory
+        # pressure is generated again up to position)
+        while position >= len(cached_exprs):
+            # Have finished generation
+            if self.finished_generators[key]:
+                return None
+            next_expr = self._generate_distinct(placeholder, size)
+            if next_expr is None:
+                return None
+            cached_exprs.append(next_expr)
+        return cached_exprs[position]
 
-        # In the middle of generation
+    def _generate_distinct(self, placeholder, size):
+        base_generator = self.base_generators[(placeholder, size)]
+        signatures = self.signatures[placeholder]
         while True:
-            next_expr = next(self.base_generators[(placeholder, size)])
+            # Long runs of eliminated expressions never return to the
+            # term solver, which checks the deadline between bunches
+            if self.deadline is not None:
+                self.deadline.check()
+            next_expr = next(base_generator, None)
             if next_expr is None:
                 self.finished_generators[(placeholder, size)] = True
                 return None
             try:
                 signature = self._compute_signature(next_expr)
-                if signature not in self.signatures[placeholder]:
-                    cached_exprs.append(next_expr)
-                    self.signatures[placeholder].append(signature)
-                    # print('Generated', placeholder, size, ':', exprs.expression_to_string(next_expr),
-                    #         'with signature', signature)
-                    return next_expr 
-                else:
-                    pass
-                    # print('Eliminated', placeholder, size, ':', exprs.expression_to_string(next_expr),
-                    #         'with signature', signature)
             except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
                 # print('Undefined', placeholder, size, ':', exprs.expression_to_string(next_expr))
-                pass
+                metrics.incr('point_distinct_undefined')
+                continue
+            if self.streaming:
+                return next_expr
+            if self.digest_signatures:
+                signature = hash(signature)
+            if signature not in signatures:
+                signatures[signature] = size
+                # print('Generated', placeholder, size, ':', exprs.expression_to_string(next_expr),
+                #         'with signature', signature)
+                return next_expr
+            metrics.incr('point_distinct_eliminated')
+            # print('Eliminated', placeholder, size, ':', exprs.expression_to_string(next_expr),
+            #         'with signature', signature)
 
     def _instantiate_placeholder(self, placeholder):
+        if self.streaming:
+            (constructor, arg_tuple) = self.generator_constructors[placeholder.identifier]
+            return constructor(*arg_tuple)
         return PointDistinctGenerator(placeholder, self)
 
 class FilteredGenerator(GeneratorBase):
@@ -488,6 +591,8 @@ class BunchedGenerator(GeneratorBase):
         self.max_size = max_size
         self.generator_state = None
         self.current_object_size = 0
+        # utils.deadline.Deadline checked before each bunch
+        self.deadline = None
 
     def generate(self):
         current_size = 1
@@ -499,6 +604,8 @@ class BunchedGenerator(GeneratorBase):
         finished = False
 
         while(True):
+            if self.deadline is not None:
+                self.deadline.check()
             retval = [None] * bunch_size
             current_index = 0
             while (current_index < bunch_size):
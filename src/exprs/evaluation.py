@@ -39,7 +39,9 @@
 # Code:
 
 from exprs import exprs
+from exprs import exprtypes
 from utils import basetypes
+from utils.bitvectors import BitVector
 
 # if __name__ == '__main__':
 #     utils.print_module_misuse_and_exit()
@@ -48,6 +50,18 @@ _variable_expression = exprs.ExpressionKinds.variable_expression
 _constant_expression = exprs.ExpressionKinds.constant_expression
 _function_expression = exprs.ExpressionKinds.function_expression
 _formal_parameter_expression = exprs.ExpressionKinds.formal_parameter_expression
+_bit_vector_type = exprtypes.TypeCodes.bit_vector_type
+
+# Bitvectors are evaluated as plain ints: the BitVector objects of points and
+# constants are unboxed when they are read, and bitvector results are boxed
+# again by evaluate_expression_raw. Column-wise evaluation works on unboxed
+# values throughout.
+
+def unbox_raw_value(value_object):
+    """Returns the int value of a BitVector, and any other raw value unchanged."""
+    if type(value_object) is BitVector:
+        return value_object.value
+    return value_object
 
 def evaluate_term_raw(expr_object, eval_context):
     return evaluate_expression_raw(expr_object, eval_context)
@@ -63,17 +77,23 @@ def evaluate_expression_on_stack(expr_object, eval_context):
         o = expr_object.variable_info.variable_eval_offset
         if o == exprs.VariableInfo._undefined_offset:
             value = eval_context.lookup_let_variable(expr_object)
-            if value is not None:
-                eval_context.push(value)
-            else:
+            if value is None:
                 raise basetypes.UnboundLetVariableError()
         else:
-            eval_context.push(eval_context.valuation_map[o].value_object)
+            value = eval_context.valuation_map[o].value_object
+        if type(value) is BitVector:
+            value = value.value
+        eval_context.push(value)
     elif (kind == _formal_parameter_expression):
-        o = expr_object.parameter_position
-        eval_context.push(eval_context.valuation_map[o].value_object)
+        value = eval_context.valuation_map[expr_object.parameter_position].value_object
+        if type(value) is BitVector:
+            value = value.value
+        eval_context.push(value)
     elif (kind == _constant_expression):
-        eval_context.push(expr_object.value_object.value_object)
+        value = expr_object.value_object.value_object
+        if type(value) is BitVector:
+            value = value.value
+        eval_context.push(value)
     elif (kind == _function_expression):
         fun_info = expr_object.function_info
         fun_info.evaluate(expr_object, eval_context)
@@ -102,6 +122,10 @@ def evaluate_expression_raw(expr_object, eval_context):
             )
         '''
         ret = retval
+        if type(ret) is int:
+            ret_type = exprs.get_expression_type(expr_object)
+            if ret_type.type_code == _bit_vector_type:
+                ret = BitVector(ret, ret_type.size)
     except:
         # reset the stack
         eval_context.eval_stack_top = 0
@@ -113,6 +137,53 @@ def evaluate_expression(expr_object, eval_context):
     retval = exprs.Value(retval, exprs.get_expression_type(expr_object))
     return retval
 
+def evaluate_expression_on_columns(expr_object, columns, num_rows, eval_context, cache=None):
+    """Evaluates an expression on a table of points stored by columns: the
+    i-th column is the list of (unboxed) raw values of the i-th variable (or
+    formal parameter) over all the rows. Returns the list of unboxed raw
+    values of the expression over the rows. Interpreted functions are applied
+    element-wise to the columns of their children; the interpretations of
+    unknown functions are evaluated on the columns of their arguments. The optional cache maps
+    ids of subexpressions to their columns.
+    Raises basetypes.UnhandledCaseError if the expression cannot be evaluated
+    column-wise (let bindings, uninterpreted functions), and propagates the
+    errors of partial functions."""
+    if cache is not None:
+        retval = cache.get(id(expr_object))
+        if retval is not None:
+            return retval
+
+    kind = expr_object.expr_kind
+    if (kind == _variable_expression):
+        o = expr_object.variable_info.variable_eval_offset
+        if o == exprs.VariableInfo._undefined_offset:
+            raise basetypes.UnhandledCaseError('Let variable in column-wise evaluation')
+        retval = columns[o]
+    elif (kind == _formal_parameter_expression):
+        retval = columns[expr_object.parameter_position]
+    elif (kind == _constant_expression):
+        retval = [unbox_raw_value(expr_object.value_object.value_object)] * num_rows
+    elif (kind == _function_expression):
+        fun_info = expr_object.function_info
+        child_columns = [ evaluate_expression_on_columns(child, columns, num_rows, eval_context, cache)
+                          for child in expr_object.children ]
+        if hasattr(fun_info, 'unknown_function_id'):
+            interpretation = getattr(fun_info, 'interpretation_expression', None)
+            if interpretation is None:
+                interpretation = eval_context.interpretation_map[fun_info.unknown_function_id]
+            retval = evaluate_expression_on_columns(interpretation, child_columns, num_rows, eval_context)
+        elif hasattr(fun_info, 'eval_children'):
+            retval = list(map(fun_info.eval_children, *child_columns))
+        else:
+            raise basetypes.UnhandledCaseError('Column-wise evaluation of %s' %
+                                               fun_info.function_name)
+    else:
+        raise basetypes.UnhandledCaseError('Odd expression kind: %s' % kind)
+
+    if cache is not None:
+        cache[id(expr_object)] = retval
+    return retval
+
 class EvaluationContext(object):
     def __init__(self, eval_stack_size = 131072):
         self.eval_stack = [int(0)] * eval_stack_size
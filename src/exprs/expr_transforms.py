@@ -42,6 +42,7 @@ from utils import basetypes
 from exprs import exprs
 from exprs import exprtypes
 from semantics import semantics_types
+from utils.metrics import metrics
 import itertools
 
 _expr_to_str = exprs.expression_to_string
@@ -61,11 +62,13 @@ class LetFlattener(ExprTransformerBase):
     def __init__(self):
         super().__init__('LetFlattener')
 
-    def _do_transform(expr, syn_ctx):
+    def _do_transform(expr, syn_ctx, deadline=None):
         if not exprs.is_function_expression(expr):
             return expr
+        if deadline is not None:
+            deadline.check()
 
-        new_children = [ LetFlattener._do_transform(child, syn_ctx) 
+        new_children = [ LetFlattener._do_transform(child, syn_ctx, deadline)
                 for child in expr.children ]
         if exprs.is_application_of(expr, 'let'):
             in_expr = new_children[-1]
@@ -74,8 +77,9 @@ class LetFlattener(ExprTransformerBase):
         else:
             return exprs.FunctionExpression(expr.function_info, tuple(new_children))
 
-    def apply(constraints, syn_ctx):
-        return [ LetFlattener._do_transform(constraint, syn_ctx) for constraint in constraints ]
+    def apply(constraints, syn_ctx, deadline=None):
+        return [ LetFlattener._do_transform(constraint, syn_ctx, deadline)
+                for constraint in constraints ]
 
 # Assumes NNF
 class LIAFlattener(ExprTransformerBase):
@@ -139,7 +143,7 @@ class AckermannReduction(ExprTransformerBase):
         super().__init__('AckermannReduction')
 
     # Eliminate the uninterpreted functions by adding more universal variables
-    def apply(constraints, uf_instantiator, syn_ctx):
+    def apply(constraints, uf_instantiator, syn_ctx, deadline=None):
         import random
         conds = []
         all_apps = set()
@@ -150,6 +154,8 @@ class AckermannReduction(ExprTransformerBase):
             all_apps |= uf_apps
 
             while len(uf_apps) > 0:
+                if deadline is not None:
+                    deadline.check()
                 uf_app1 = uf_apps.pop()
                 for uf_app2 in uf_apps:
                     app1_args, app2_args = uf_app1.children, uf_app2.children
@@ -163,6 +169,8 @@ class AckermannReduction(ExprTransformerBase):
             constraints = [ syn_ctx.make_function_expr('or', *conds, constraint)
                     for constraint in constraints ]
         for app in sorted(all_apps, key=exprs.get_expression_size):
+            if deadline is not None:
+                deadline.check()
             var = syn_ctx.make_variable_expr(app.function_info.range_type,
                     'ufcall_' + app.function_info.function_name + '_' + str(random.randint(1, 1000000)))
             constraints = [ exprs.substitute(constraint, app, var)
@@ -170,10 +178,12 @@ class AckermannReduction(ExprTransformerBase):
         return constraints
 
 class RewriteITE(ExprTransformerBase):
-    def apply(constraints, syn_ctx):
+    def apply(constraints, syn_ctx, deadline=None):
         new_constraints = []
         found_one = False
         for constraint in constraints:
+            if deadline is not None:
+                deadline.check()
             ite = exprs.find_application(constraint, 'ite')
             if ite is None:
                 new_constraints.append(constraint)
@@ -186,7 +196,7 @@ class RewriteITE(ExprTransformerBase):
                 new_constraints.append(tc)
                 new_constraints.append(fc)
         if found_one:
-            return RewriteITE.apply(new_constraints, syn_ctx)
+            return RewriteITE.apply(new_constraints, syn_ctx, deadline)
         else:
             return new_constraints
 
@@ -281,8 +291,17 @@ class NNFConverter(ExprTransformerBase):
         return self._do_transform(simple_expr, args[1], True)
 
 class CNFConverter(ExprTransformerBase):
-    def __init__(self):
+    """Converts an expression to CNF by distributing disjunctions over
+    conjunctions. A disjunction whose distribution would produce more than
+    max_distributed_clauses clauses is kept as a single (non-flat) clause:
+    the specifications are universally quantified, so the auxiliary variables
+    of a definitional (Tseitin) encoding cannot be introduced soundly."""
+    max_distributed_clauses = 4096
+
+    def __init__(self, deadline=None):
         super().__init__('CNFConverter')
+        # utils.deadline.Deadline checked while distributing
+        self.deadline = deadline
 
     def _flatten_and_or(self, expr_object, syn_ctx):
         kind = expr_object.expr_kind
@@ -310,6 +329,8 @@ class CNFConverter(ExprTransformerBase):
         elif (not self._matches_expression_any(expr_object, 'and', 'or')):
             return [expr_object]
         else:
+            if self.deadline is not None:
+                self.deadline.check()
             function_info = expr_object.function_info
             num_children = len(expr_object.children)
             if (function_info.function_name == 'and'):
@@ -320,12 +341,20 @@ class CNFConverter(ExprTransformerBase):
                 return clauses
             elif (function_info.function_name == 'or'):
                 transformed_children = []
+                num_product_clauses = 1
                 for i in range(num_children):
                     child = expr_object.children[i]
                     transformed_children.append(self._do_transform(child, syn_ctx))
+                    num_product_clauses *= len(transformed_children[-1])
+
+                if num_product_clauses > self.max_distributed_clauses:
+                    metrics.incr('cnf_undistributed_disjunctions')
+                    return [expr_object]
 
                 clauses = []
                 for prod_tuple in itertools.product(*transformed_children):
+                    if self.deadline is not None:
+                        self.deadline.check()
                     clause = syn_ctx.make_ac_function_expr('or', *prod_tuple)
                     clause = self._flatten_and_or(clause, syn_ctx)
                     clauses.append(clause)
@@ -430,6 +459,61 @@ def gather_synth_functions(expr):
     _gather_synth_functions(expr, fun_set)
     return fun_set
 
+def _get_conjuncts(expr, conjuncts):
+    if (expr.expr_kind == exprs.ExpressionKinds.function_expression and
+        expr.function_info.function_name == 'and'):
+        for child in expr.children:
+            _get_conjuncts(child, conjuncts)
+    else:
+        conjuncts.append(expr)
+
+def get_independent_problems(constraints, synth_funs):
+    """Splits the (top level conjuncts of the) constraints into groups
+    sharing no synth functions. Returns the list of (synth functions,
+    constraints) pairs, in the order of the synth functions. Constraints
+    over no synth function go in every group, and synth functions in no
+    constraint go in the first group."""
+    conjuncts = []
+    for constraint in constraints:
+        _get_conjuncts(constraint, conjuncts)
+
+    # Union-find over the synth functions
+    parent = { sf : sf for sf in synth_funs }
+    def find(sf):
+        while parent[sf] is not sf:
+            parent[sf] = parent[parent[sf]]
+            sf = parent[sf]
+        return sf
+
+    conjunct_funs = []
+    for conjunct in conjuncts:
+        funs = [ sf for sf in gather_synth_functions(conjunct) if sf in parent ]
+        conjunct_funs.append(funs)
+        for sf in funs[1:]:
+            parent[find(sf)] = find(funs[0])
+
+    constrained = set([ find(sf) for funs in conjunct_funs for sf in funs ])
+    roots = []
+    for sf in synth_funs:
+        root = find(sf)
+        if root in constrained and root not in roots:
+            roots.append(root)
+    if len(roots) <= 1:
+        return [ (list(synth_funs), constraints) ]
+
+    group_funs = { root : [] for root in roots }
+    for sf in synth_funs:
+        root = find(sf)
+        group_funs[root if root in constrained else roots[0]].append(sf)
+    group_constraints = { root : [] for root in roots }
+    shared_constraints = []
+    for conjunct, funs in zip(conjuncts, conjunct_funs):
+        if len(funs) == 0:
+            shared_constraints.append(conjunct)
+        else:
+            group_constraints[find(funs[0])].append(conjunct)
+    return [ (group_funs[root], group_constraints[root] + shared_constraints) for root in roots ]
+
 def _intro_new_universal_vars(clauses, syn_ctx, uf_info):
     intro_vars = [syn_ctx.make_variable_expr(uf_info.domain_types[i], '_intro_var_%d' % i)
                   for i in range(len(uf_info.domain_types))]
@@ -467,8 +551,20 @@ def canonicalize_multipoint_specification(expr, syn_ctx):
 
     return (variable_list, expr)
 
-def to_cnf(expr, theory, syn_ctx):
-    cnf_converter = CNFConverter()
+def to_cnf(expr, theory, syn_ctx, deadline=None):
+    """Returns the list of clauses and the conjunction of the clauses of
+    the CNF of expr. The result is cached in the synthesis context, the
+    single-invocation check and the canonicalization of the specification
+    convert the same expression. The optional :deadline: is checked while
+    distributing the disjunctions."""
+    key = (expr, theory)
+    retval = syn_ctx.cnf_cache.get(key)
+    if retval is not None:
+        metrics.incr('cnf_cache_hits')
+        return retval
+    metrics.incr('cnf_cache_misses')
+
+    cnf_converter = CNFConverter(deadline)
     clauses, cnf_expr = cnf_converter.apply(expr, syn_ctx)
 
     if theory == 'LIA': 
@@ -476,11 +572,18 @@ def to_cnf(expr, theory, syn_ctx):
         cnf_expr = lia_flattener.apply(cnf_expr, syn_ctx)
         clauses = [ lia_flattener.apply(c, syn_ctx) for c in clauses ]
 
-    return clauses, cnf_expr
+    metrics.record('cnf_clauses', len(clauses))
+    retval = (clauses, cnf_expr)
+    syn_ctx.cnf_cache[key] = retval
+    return retval
 
-def is_single_invocation(constraints, theory, syn_ctx):
-    expr = syn_ctx.make_function_expr('and', *constraints)
-    clauses, _ = to_cnf(expr, theory, syn_ctx)
+def is_single_invocation(constraints, theory, syn_ctx, deadline=None):
+    # Same expression as the one given to the StandardSpec, to share its CNF
+    if len(constraints) == 1:
+        expr = constraints[0]
+    else:
+        expr = syn_ctx.make_function_expr('and', *constraints)
+    clauses, _ = to_cnf(expr, theory, syn_ctx, deadline)
     return check_single_invocation_property(clauses, syn_ctx) 
 
 def canonicalize_specification(expr, syn_ctx, theory):
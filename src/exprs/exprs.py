@@ -83,6 +83,11 @@ _FunctionExpression = collections.namedtuple('FunctionExpression',
 
 Value = collections.namedtuple('Value', ['value_object', 'value_type'])
 
+# Lets pickle find the classes of the expressions by name
+for _expression_class in [_VariableExpression, _FormalParameterExpression,
+                          _ConstantExpression, _FunctionExpression]:
+    _expression_class.__qualname__ = '_' + _expression_class.__name__
+
 _variable_expression = ExpressionKinds.variable_expression
 _constant_expression = ExpressionKinds.constant_expression
 _function_expression = ExpressionKinds.function_expression
@@ -360,9 +365,9 @@ def _check_equivalence_under_constraint(expr1, expr2, smt_ctx, arg_vars, constra
         constraint_smt = z3.BoolVal(True, ctx=smt_ctx.ctx())
     condition = z3.And(constraint_smt, (expr1_smt != expr2_smt), smt_ctx.ctx())
     if random:
-        return random_sample(condition, smt_ctx.ctx(), arg_vars)
+        return random_sample(condition, smt_ctx, arg_vars)
     else:
-        return _z3_solve(condition, arg_vars)
+        return sample(condition, smt_ctx, arg_vars)
 
 def check_equivalence_under_constraint(expr1, expr2, smt_ctx, arg_vars, constraint, random=False):
     return _check_equivalence_under_constraint(expr1, expr2, smt_ctx, arg_vars, constraint, random)
@@ -370,28 +375,16 @@ def check_equivalence_under_constraint(expr1, expr2, smt_ctx, arg_vars, constrai
 def check_equivalence(expr1, expr2, smt_ctx, arg_vars, random=False):
     return _check_equivalence_under_constraint(expr1, expr2, smt_ctx, arg_vars, None, random)
 
-def _z3_solve(z3_expr, arg_vars):
-    import z3
-    smt_solver = z3.Solver(ctx=z3_expr.ctx)
-    smt_solver.push()
-    smt_solver.add(z3_expr)
-    r = smt_solver.check()
-
-    if r == z3.sat:
-        point = [ smt_solver.model().evaluate(arg_var, True) for arg_var in arg_vars ]
-        smt_solver.pop()
-        return point
-    else:
-        smt_solver.pop()
-        return None
-
-
 def sample(pred_or_pred_smt, smt_ctx, arg_vars):
+    """Returns the values of :arg_vars: in a model of the predicate, None if
+    it is unsatisfiable. Uses the pooled solver of :smt_ctx: (a
+    Z3SMTContext) instead of a fresh one."""
     if is_expression(pred_or_pred_smt):
         pred_smt = semantics_types.expression_to_smt(pred_or_pred_smt, smt_ctx, arg_vars)
     else:
         pred_smt = pred_or_pred_smt
-    return _z3_solve(pred_smt, arg_vars)
+    with smt_ctx.get_sampler().scope(pred_smt) as sampler:
+        return sampler.sample(arg_vars)
 
 # Is not really uniform random
 # The purpose is to make the pattern opaque to human eye
@@ -413,31 +406,34 @@ def random_sample(pred_or_pred_smt, smt_ctx, arg_vars):
     else:
         pred_smt = pred_or_pred_smt
 
-    orig_sample = _z3_solve(pred_smt, arg_vars)
-    if orig_sample is None:
-        return None
+    # The bits fixed so far are added to the scope, each bit is tried
+    # with an assumption
+    with smt_ctx.get_sampler().scope(pred_smt) as sampler:
+        orig_sample = sampler.sample(arg_vars)
+        if orig_sample is None:
+            return None
 
-    zero = z3.BitVecVal(0, bit_vec_size, pred_smt.ctx)
-    for position in positions:
-        mask = z3.BitVecVal((1 << position), bit_vec_size, pred_smt.ctx)
+        zero = z3.BitVecVal(0, bit_vec_size, pred_smt.ctx)
+        for position in positions:
+            mask = z3.BitVecVal((1 << position), bit_vec_size, pred_smt.ctx)
 
-        with_one = z3.And(pred_smt, (arg & mask == mask), pred_smt.ctx)
-        with_zero = z3.And(pred_smt, (arg & mask == zero), pred_smt.ctx)
+            with_one = (arg & mask == mask)
+            with_zero = (arg & mask == zero)
 
-        with_one_sat = _z3_solve(with_one, arg_vars)
-        with_zero_sat = _z3_solve(with_zero, arg_vars)
+            with_one_sat = sampler.sample(arg_vars, [with_one])
+            with_zero_sat = sampler.sample(arg_vars, [with_zero])
 
-        assert with_one_sat is not None or with_zero_sat is not None
+            assert with_one_sat is not None or with_zero_sat is not None
 
-        if with_one_sat == None:
-            pred_smt = with_zero
-        elif with_zero_sat == None:
-            pred_smt = with_one
-        else: # Choose randomly
-            pred_smt = random.choice([with_one, with_zero])
+            if with_one_sat == None:
+                sampler.add(with_zero)
+            elif with_zero_sat == None:
+                sampler.add(with_one)
+            else: # Choose randomly
+                sampler.add(random.choice([with_one, with_zero]))
 
-    result = _z3_solve(pred_smt, arg_vars)
-    assert result is not None
+        result = sampler.sample(arg_vars)
+        assert result is not None
 
     return result
 
@@ -93,6 +93,10 @@ class _BoolType(TypeBase):
     def __hash__(self):
         return hash(TypeCodes.boolean_type)
 
+    def __reduce__(self):
+        # Types are interned: unpickling gives back the shared instance
+        return (BoolType, ())
+
     def get_smt_type(self, smt_context_object):
         return smt_context_object.make_bool_sort()
 
@@ -119,6 +123,10 @@ class _StringType(TypeBase):
     def __hash__(self):
         return hash(TypeCodes.string_type)
 
+    def __reduce__(self):
+        # Types are interned: unpickling gives back the shared instance
+        return (StringType, ())
+
     def get_smt_type(self, smt_context_object):
         return smt_context_object.make_string_sort()
 
@@ -145,6 +153,10 @@ class _IntType(TypeBase):
     def __hash__(self):
         return hash(TypeCodes.integer_type)
 
+    def __reduce__(self):
+        # Types are interned: unpickling gives back the shared instance
+        return (IntType, ())
+
     def get_smt_type(self, smt_context_object):
         return smt_context_object.make_int_sort()
 
@@ -175,6 +187,9 @@ class _BitVectorType(TypeBase):
         return (hash(TypeCodes.bit_vector_type) ^
                 hash(self.size))
 
+    def __reduce__(self):
+        return (BitVectorType, (self.size,))
+
     def get_smt_type(self, smt_context_object):
         return smt_context_object.make_bitvector_sort(self.size)
 
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# benchmark_cache.py ---
+#
+# Filename: benchmark_cache.py
+# Created: Mon Oct 19 11:02:13 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""An on-disk cache of preprocessed benchmarks. An entry holds everything
+that preprocessing builds from a benchmark file (the synthesis context, the
+instantiators, the massaged constraints, the grammars, the table of PBE
+examples and the CNF of the specification), pickled as one object graph.
+Entries are keyed by a hash of the contents of the benchmark file and of the
+sources of the solver, so that editing either invalidates them.
+
+The functions of the theories hold lambdas and cannot be pickled: they are
+stored by name and argument types, and instantiated again on load by fresh
+theory instantiators, which are bound to the loaded synthesis context."""
+
+import hashlib
+import mmap
+import os
+import pickle
+import tempfile
+
+from semantics import semantics_core
+from semantics import semantics_lia
+from semantics import semantics_bv
+from semantics import semantics_slia
+from semantics import semantics_types
+from utils.metrics import metrics
+
+_theory_instantiator_types = {
+        'Core' : semantics_core.CoreInstantiator,
+        'LIA' : semantics_lia.LIAInstantiator,
+        'BV' : semantics_bv.BVInstantiator,
+        'SLIA' : semantics_slia.SLIAInstantiator
+        }
+_theory_instantiator_names = { t : name for name, t in _theory_instantiator_types.items() }
+
+_source_digest = None
+
+def _get_source_digest():
+    """Digest of the python sources of the solver, computed once."""
+    global _source_digest
+    if _source_digest is None:
+        source_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        digest = hashlib.sha256()
+        for dir_path, dir_names, file_names in os.walk(source_root):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if not file_name.endswith('.py'):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                digest.update(os.path.relpath(file_path, source_root).encode())
+                with open(file_path, 'rb') as source_file:
+                    digest.update(source_file.read())
+        _source_digest = digest.hexdigest()
+    return _source_digest
+
+class _BenchmarkPickler(pickle.Pickler):
+    def __init__(self, file, theory_instantiators):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.theory_instantiators = theory_instantiators
+        # function object -> persistent id; the ids are numbered so that the
+        # functions shared in the pickled graph are shared after loading
+        self.function_ids = {}
+
+    def _get_instantiator_name(self, function_info):
+        for instantiator in self.theory_instantiators:
+            try:
+                instance = instantiator.instantiate(function_info.function_name,
+                                                    function_info.domain_types)
+            except (TypeError, ValueError, NotImplementedError, AssertionError):
+                continue
+            if type(instance) is type(function_info):
+                return _theory_instantiator_names[type(instantiator)]
+        return None
+
+    def persistent_id(self, obj):
+        if type(obj) in _theory_instantiator_names:
+            return ('instantiator', _theory_instantiator_names[type(obj)])
+        if not isinstance(obj, semantics_types.InterpretedFunctionBase):
+            return None
+        pid = self.function_ids.get(id(obj))
+        if pid is None:
+            name = self._get_instantiator_name(obj)
+            if name is None:
+                return None
+            pid = ('function', len(self.function_ids), name,
+                   obj.function_name, tuple(obj.domain_types))
+            # Keeps obj alive, its id cannot be reused during the dump
+            self.function_ids[id(obj)] = (pid, obj)
+        else:
+            pid = pid[0]
+        return pid
+
+class _BenchmarkUnpickler(pickle.Unpickler):
+    def __init__(self, file):
+        super().__init__(file)
+        self.theory_instantiators = {}
+        self.functions = {}
+
+    def _get_instantiator(self, name):
+        instantiator = self.theory_instantiators.get(name)
+        if instantiator is None:
+            instantiator = _theory_instantiator_types[name]()
+            self.theory_instantiators[name] = instantiator
+        return instantiator
+
+    def persistent_load(self, pid):
+        if pid[0] == 'instantiator':
+            return self._get_instantiator(pid[1])
+        elif pid[0] == 'function':
+            function_info = self.functions.get(pid[1])
+            if function_info is None:
+                (_, number, name, function_name, domain_types) = pid
+                function_info = self._get_instantiator(name).instantiate(function_name, domain_types)
+                if function_info is None:
+                    raise pickle.UnpicklingError('Could not instantiate %s' % function_name)
+                self.functions[number] = function_info
+            return function_info
+        raise pickle.UnpicklingError('Unknown persistent id: %s' % str(pid))
+
+class BenchmarkCache(object):
+    """A directory of preprocessed benchmarks."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, benchmark_file):
+        digest = hashlib.sha256()
+        digest.update(_get_source_digest().encode())
+        with open(benchmark_file, 'rb') as f:
+            digest.update(f.read())
+        return digest.hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def load(self, key):
+        """Returns the preprocessed benchmark stored under key, or None."""
+        try:
+            with open(self._get_path(key), 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    unpickler = _BenchmarkUnpickler(data)
+                    (syn_ctx, next_unknown_function_id, preprocessed) = unpickler.load()
+        except FileNotFoundError:
+            metrics.incr('benchmark_cache_misses')
+            return None
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # Unreadable (e.g., truncated) entry: preprocess again
+            metrics.incr('benchmark_cache_misses')
+            return None
+
+        # The loaded unknown (synth, macro) functions keep their ids
+        semantics_types.UnknownFunctionBase._unknown_function_id = max(
+                semantics_types.UnknownFunctionBase._unknown_function_id, next_unknown_function_id)
+        for instantiator in unpickler.theory_instantiators.values():
+            for function_info in instantiator.function_object_map.values():
+                function_info.synthesis_ctx = syn_ctx
+        for function_info in unpickler.functions.values():
+            function_info.synthesis_ctx = syn_ctx
+        metrics.incr('benchmark_cache_hits')
+        return preprocessed
+
+    def store(self, key, syn_ctx, preprocessed):
+        """Stores a preprocessed benchmark: any object (graph) built in the
+        synthesis context syn_ctx. Returns False if it could not be pickled."""
+        theory_instantiators = [ i for i in syn_ctx.function_instantiators
+                                 if type(i) in _theory_instantiator_names ]
+        (fd, temp_path) = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _BenchmarkPickler(f, theory_instantiators).dump(
+                        (syn_ctx, semantics_types.UnknownFunctionBase._unknown_function_id, preprocessed))
+            os.replace(temp_path, self._get_path(key))
+        except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+            os.unlink(temp_path)
+            metrics.incr('benchmark_cache_store_failures')
+            return False
+        return True
+
+#
+# benchmark_cache.py ends here
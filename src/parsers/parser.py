@@ -11,11 +11,91 @@ from semantics import semantics_types
 from core import synthesis_context
 from exprs import exprtypes
 from utils.bitvectors import BitVector
+import re
+
+# (constraint (= (f c1 ... cn) c)) on a single line, with literal constants
+_example_literal = r'#x[0-9a-fA-F]+|-?(?:0|[1-9][0-9]*)|"[^"\\\n\r]*"'
+_example_regex = re.compile(r'\s*\(\s*constraint\s+\(\s*=\s+\(\s*([^\s()"#;|]+)((?:\s+(?:%s))*)\s*\)\s+(%s)\s*\)\s*\)\s*$' %
+                            (_example_literal, _example_literal))
+_example_literal_regex = re.compile(_example_literal)
+
+def _example_literal_to_value(literal):
+    # Same values as the ones the sexp parser and sexp_to_value produce
+    if literal[0] == '#':
+        return sexp_to_value((['BitVec', ('Int', 4 * (len(literal) - 2))], int(literal[2:], 16)))
+    elif literal[0] == '"':
+        return sexp_to_value(('String', literal[1:-1]))
+    else:
+        return sexp_to_value(('Int', int(literal)))
+
+class ExampleTable(object):
+    """The input/output examples (constraint (= (f c1 ... cn) c)) of a PBE
+    benchmark. They are read line by line while the comments are stripped
+    and kept as rows of values, out of the s-expression of the benchmark:
+    parsing them, building their expressions and evaluating them again
+    dominates the loading time of benchmarks with many examples."""
+
+    def __init__(self):
+        self.function_name = None
+        self.arg_types = None
+        self.value_type = None
+        self.rows = []
+
+    def add_line(self, line):
+        """Adds the example on the line, returns False if the line is not an
+        example of the same function, with the same types, as the others."""
+        match = _example_regex.match(line)
+        if match is None:
+            return False
+        (function_name, args_text, value_text) = match.groups()
+        args = tuple([ _example_literal_to_value(a) for a in _example_literal_regex.findall(args_text) ])
+        value = _example_literal_to_value(value_text)
+        arg_types = tuple([ a.value_type for a in args ])
+        if self.function_name is None:
+            self.function_name = function_name
+            self.arg_types = arg_types
+            self.value_type = value.value_type
+        elif (function_name != self.function_name or arg_types != self.arg_types or
+              value.value_type != self.value_type):
+            return False
+        self.rows.append((args, value))
+        return True
+
+    def matches(self, synth_fun):
+        return (synth_fun.function_name == self.function_name and
+                tuple(synth_fun.domain_types) == self.arg_types and
+                synth_fun.range_type == self.value_type)
+
+    def get_valuations(self):
+        """Returns the valuations of a PBESpec: argument values -> raw value."""
+        return { args : value.value_object for args, value in self.rows }
+
+    def get_constants(self):
+        constants = set()
+        for args, value in self.rows:
+            constants.update([ exprs.ConstantExpression(a) for a in args ])
+            constants.add(exprs.ConstantExpression(value))
+        return constants
+
+    def to_constraints_data(self):
+        """Returns the examples as the data of constraints of the sexp."""
+        def to_sexp(value):
+            type_code = value.value_type.type_code
+            if type_code == exprtypes.TypeCodes.bit_vector_type:
+                return (['BitVec', ('Int', value.value_type.size)], value.value_object.value)
+            elif type_code == exprtypes.TypeCodes.string_type:
+                return ('String', value.value_object)
+            else:
+                return ('Int', value.value_object)
+        return [ [ [ '=', [ self.function_name ] + [ to_sexp(a) for a in args ], to_sexp(value) ] ]
+                 for args, value in self.rows ]
 
-def stripComments(bmFile):
+def stripComments(bmFile, examples=None):
     noComments = '('
     for line in bmFile:
         line = line.split(';', 1)[0]
+        if examples is not None and examples.add_line(line):
+            continue
         noComments += line
     return noComments + ')'
 
@@ -27,11 +107,21 @@ def sexpFromFile(benchmarkFileName):
         # print('File not found: %s' % benchmarkFileName)
         return None
 
-    bm = stripComments(benchmarkFile)
-    bmExpr = sexpParser.parseString(bm, parseAll=True).asList()[0]
+    bmExpr = sexpFromString(benchmarkFile)
     benchmarkFile.close()
     return bmExpr
 
+def sexpFromString(benchmarkText):
+    """Parses a benchmark given as a string, or as any iterable of lines."""
+    if isinstance(benchmarkText, str):
+        benchmarkText = benchmarkText.splitlines(True)
+    examples = ExampleTable()
+    bm = stripComments(benchmarkText, examples)
+    file_sexp = sexpParser.parseString(bm, parseAll=True).asList()[0]
+    if len(examples.rows) > 0:
+        file_sexp.append(['pbe-examples', examples])
+    return file_sexp
+
 def parse_bitvec(bv_exp):
     if len(bv_exp) != 2:
         return None
@@ -334,8 +424,10 @@ def _process_uninterpreted_funcs(uninterpreted_funcs_data, syn_ctx, uf_instantia
         func = semantics_types.UninterpretedFunction(name, len(arg_types), arg_types, ret_type) 
         uf_instantiator.add_function(name, func)
 
-def make_constant_rules(constraints):
+def make_constant_rules(constraints, examples=None):
     constants = set()
+    if examples is not None:
+        constants |= examples.get_constants()
     for constraint in constraints:
         constants |= exprs.get_all_constants(constraint)
 
@@ -411,10 +503,25 @@ def extract_benchmark(file_sexp):
     inv_constraints = process_inv_constraints(inv_constraints_data, synth_instantiator, syn_ctx, forall_vars_map)
     constraints.extend(inv_constraints)
 
+    # Examples read out of the sexp: they are given to the PBESpec as they are
+    # when they are the whole specification, and turned into constraints
+    # otherwise
+    examples_data, file_sexp = filter_sexp_for('pbe-examples', file_sexp)
+    examples = None
+    if len(examples_data) > 0:
+        [[ example_table ]] = examples_data
+        synth_funs = list(synth_instantiator.get_functions().values())
+        if (len(constraints) == 0 and len(synth_funs) == 1 and
+                example_table.matches(synth_funs[0])):
+            examples = example_table
+        else:
+            constraints.extend(process_constraints(example_table.to_constraints_data(),
+                                                   syn_ctx, forall_vars_map))
+
     for sf in grammar_map.keys():
         if grammar_map[sf] == 'Default grammar':
             grammar_map[sf] = grammars.make_default_grammar(syn_ctx, theory, sf.range_type, sf.formal_parameters)
-        grammar_map[sf].add_constant_rules(make_constant_rules(constraints))
+        grammar_map[sf].add_constant_rules(make_constant_rules(constraints, examples))
 
     check_sats, file_sexp = filter_sexp_for('check-synth', file_sexp)
 
@@ -423,7 +530,7 @@ def extract_benchmark(file_sexp):
     assert check_sats == [[]]
     assert file_sexp == []
 
-    return theories, syn_ctx, synth_instantiator, macro_instantiator, uf_instantiator, constraints, grammar_map, forall_vars_map
+    return theories, syn_ctx, synth_instantiator, macro_instantiator, uf_instantiator, constraints, grammar_map, forall_vars_map, examples
 
 def get_theory_instantiator(theory):
     if theory == "LIA":
@@ -48,6 +48,16 @@ from semantics.semantics_types import InterpretedFunctionBase
 if __name__ == '__main__':
     utils.print_module_misuse_and_exit()
 
+# Bitvectors are evaluated as plain (unsigned) ints, see evaluation.py.
+# The evaluation functions below are specialized to the width of the
+# bitvectors by closing over the masks for that width.
+
+def _masks(bv_size):
+    return ((1 << bv_size) - 1, 1 << (bv_size - 1))
+
+def _to_signed(a, sign_mask):
+    return a - (sign_mask << 1) if a & sign_mask else a
+
 '''
 All functions and semantics should match the file at 
 http://smtlib.cs.uiowa.edu/Logics/QF_BV.smt2 downloaded on
@@ -98,7 +108,8 @@ class BVNot(InterpretedFunctionBase):
         super().__init__('bvnot', 1, (exprtypes.BitVectorType(bv_size),),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a : ~a
-        self.eval_children = lambda a : ~a
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a : a ^ mask
 
 class BVAnd(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -125,7 +136,8 @@ class BVNeg(InterpretedFunctionBase):
         super().__init__('bvneg', 1, (exprtypes.BitVectorType(bv_size),),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a: -a
-        self.eval_children = lambda a: a.negate()
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a: (-a) & mask
 
 class BVAdd(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -133,7 +145,8 @@ class BVAdd(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b: a + b
-        self.eval_children = lambda a,b: a + b
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a,b: (a + b) & mask
         self.commutative = True
         self.associative = True
 
@@ -143,7 +156,8 @@ class BVMul(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b: a * b
-        self.eval_children = lambda a,b: a * b
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a,b: (a * b) & mask
         self.commutative = True
         self.associative = True
 
@@ -153,7 +167,8 @@ class BVSub(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b: a - b
-        self.eval_children = lambda a,b: a - b
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a,b: (a - b) & mask
 
 class BVUDiv(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -162,9 +177,9 @@ class BVUDiv(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = z3.UDiv
         def eval_c(a, b):
-            if b.value == 0:
+            if b == 0:
                 raise basetypes.PartialFunctionError()
-            return a.udiv(b)
+            return a // b
         self.eval_children = eval_c
 
 class BVSDiv(InterpretedFunctionBase):
@@ -173,10 +188,16 @@ class BVSDiv(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a,b : a / b
+        mask, sign_mask = _masks(bv_size)
         def eval_c(a, b):
-            if b.value == 0:
+            if b == 0:
                 raise basetypes.PartialFunctionError()
-            return a.sdiv(b)
+            a = _to_signed(a, sign_mask)
+            b = _to_signed(b, sign_mask)
+            val = abs(a) // abs(b)
+            if (a < 0) != (b < 0):
+                return (-val) & mask
+            return val
         self.eval_children = eval_c
 
 class BVSRem(InterpretedFunctionBase):
@@ -185,10 +206,15 @@ class BVSRem(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = z3.SRem
+        mask, sign_mask = _masks(bv_size)
         def eval_c(a, b):
-            if b.value == 0:
+            if b == 0:
                 raise basetypes.PartialFunctionError()
-            return a.srem(b)
+            a = _to_signed(a, sign_mask)
+            val = abs(a) % abs(_to_signed(b, sign_mask))
+            if a < 0:
+                return (-val) & mask
+            return val
         self.eval_children = eval_c
 
 
@@ -200,9 +226,9 @@ class BVURem(InterpretedFunctionBase):
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = z3.URem
         def eval_c(a, b):
-            if b.value == 0:
+            if b == 0:
                 raise basetypes.PartialFunctionError()
-            return a.urem(b)
+            return a % b
         self.eval_children = eval_c
 
 class BVShl(InterpretedFunctionBase):
@@ -211,7 +237,8 @@ class BVShl(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : a << b
-        self.eval_children = lambda a, b : a << b
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a, b : ((a << b) & mask) if b < bv_size else 0
 
 class BVLShR(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -219,7 +246,7 @@ class BVLShR(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = z3.LShR
-        self.eval_children = lambda a, b : a.lshr(b)
+        self.eval_children = lambda a, b : (a >> b) if b < bv_size else 0
 
 class BVAShR(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -227,7 +254,13 @@ class BVAShR(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b: a >> b
-        self.eval_children = lambda a, b : a.ashr(b)
+        mask, sign_mask = _masks(bv_size)
+        def eval_c(a, b):
+            a = _to_signed(a, sign_mask)
+            if b >= bv_size:
+                return 0 if a >= 0 else mask
+            return (a >> b) & mask
+        self.eval_children = eval_c
 
 class BVUlt(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -235,7 +268,7 @@ class BVUlt(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BoolType())
         self.smt_function = z3.ULT
-        self.eval_children = lambda a, b : a.ult(b)
+        self.eval_children = lambda a, b : a < b
 
 class BVUle(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -243,7 +276,7 @@ class BVUle(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BoolType())
         self.smt_function = z3.ULE
-        self.eval_children = lambda a, b : a.ule(b)
+        self.eval_children = lambda a, b : a <= b
 
 class BVUge(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -251,7 +284,7 @@ class BVUge(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BoolType())
         self.smt_function = z3.UGE
-        self.eval_children = lambda a, b : a.uge(b)
+        self.eval_children = lambda a, b : a >= b
 
 class BVUgt(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -259,7 +292,7 @@ class BVUgt(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BoolType())
         self.smt_function = z3.UGT
-        self.eval_children = lambda a, b : a.ugt(b)
+        self.eval_children = lambda a, b : a > b
 
 class BVSle(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -267,7 +300,9 @@ class BVSle(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BoolType())
         self.smt_function = lambda a, b : a <= b
-        self.eval_children = lambda a, b : a.sle(b)
+        _, sign_mask = _masks(bv_size)
+        # Flipping the sign bits maps the signed order to the unsigned one
+        self.eval_children = lambda a, b : (a ^ sign_mask) <= (b ^ sign_mask)
 
 class BVSlt(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -275,7 +310,8 @@ class BVSlt(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BoolType())
         self.smt_function = lambda a, b : a < b
-        self.eval_children = lambda a, b : a.slt(b)
+        _, sign_mask = _masks(bv_size)
+        self.eval_children = lambda a, b : (a ^ sign_mask) < (b ^ sign_mask)
 
 class BVSge(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -283,7 +319,8 @@ class BVSge(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BoolType())
         self.smt_function = lambda a, b : a >= b
-        self.eval_children = lambda a, b : a.sge(b)
+        _, sign_mask = _masks(bv_size)
+        self.eval_children = lambda a, b : (a ^ sign_mask) >= (b ^ sign_mask)
 
 class BVSgt(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -291,7 +328,8 @@ class BVSgt(InterpretedFunctionBase):
                                      exprtypes.BitVectorType(bv_size)),
                          exprtypes.BoolType())
         self.smt_function = lambda a, b : a > b
-        self.eval_children = lambda a, b : a.sgt(b)
+        _, sign_mask = _masks(bv_size)
+        self.eval_children = lambda a, b : (a ^ sign_mask) > (b ^ sign_mask)
 
 class BVXor(InterpretedFunctionBase):
     def __init__(self, bv_size):
@@ -309,7 +347,8 @@ class BVXNor(InterpretedFunctionBase):
                                     exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : ~(a ^ b)
-        self.eval_children = lambda a, b : ~(a ^ b)
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a, b : (a ^ b) ^ mask
         self.commutative = True
         self.associative = True
 
@@ -319,7 +358,8 @@ class BVNand(InterpretedFunctionBase):
                                     exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : ~(a & b)
-        self.eval_children = lambda a, b : ~(a & b)
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a, b : (a & b) ^ mask
         self.commutative = True
         self.associative = True
 
@@ -329,7 +369,8 @@ class BVNor(InterpretedFunctionBase):
                                     exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(bv_size))
         self.smt_function = lambda a, b : ~(a | b)
-        self.eval_children = lambda a, b : ~(a | b)
+        mask, _ = _masks(bv_size)
+        self.eval_children = lambda a, b : (a | b) ^ mask
         self.commutative = True
         self.associative = True
 
@@ -339,7 +380,7 @@ class BVComp(InterpretedFunctionBase):
                                     exprtypes.BitVectorType(bv_size)),
                          exprtypes.BitVectorType(1))
         self.smt_function = lambda a, b : z3.If(a == b, z3.BitVecVal(1, 1), z3.BitVecVal(0, 1))
-        self.eval_children = lambda a, b : a.bvcomp(b)
+        self.eval_children = lambda a, b : 1 if a == b else 0
         self.commutative = True
         self.associative = True
 
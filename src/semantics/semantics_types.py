@@ -43,6 +43,7 @@ various function symbols."""
 
 from utils import basetypes
 from utils import utils
+from utils.metrics import metrics
 from exprs import exprtypes
 from exprs import exprs
 import z3
@@ -106,6 +107,41 @@ def expression_to_smt(expr_object, smt_context_object, var_subst_map = None):
     return ret
 
 
+def expression_to_smt_cached(expr_object, smt_context_object, var_subst_map = None):
+    """Memoized version of expression_to_smt. The translation depends on the
+    expression, the var_subst_map and the current interpretations of the
+    synth functions applied in the expression, so the cache is keyed on the
+    identities of all three: expressions are namedtuples, whose hashes are
+    not cached, and hashing them would cost as much as translating them.
+    The entries hold on to the objects of their keys, so that the ids are
+    not reused while the entries exist."""
+    synth_fun_ids_cache = smt_context_object.synth_fun_ids_cache
+    cached = synth_fun_ids_cache.get(id(expr_object))
+    if cached is None:
+        synth_fun_ids = tuple(set([ app.function_info.unknown_function_id
+            for app in exprs.find_all_synth_fun_apps(expr_object) ]))
+        synth_fun_ids_cache[id(expr_object)] = (expr_object, synth_fun_ids)
+    else:
+        synth_fun_ids = cached[1]
+
+    interpretation_map = smt_context_object.interpretation_map
+    interpretations = tuple([ interpretation_map.get(fid) for fid in synth_fun_ids ])
+    key = (id(expr_object), id(var_subst_map)) + tuple([ id(i) for i in interpretations ])
+    translation_cache = smt_context_object.translation_cache
+    cached = translation_cache.get(key)
+    if cached is not None:
+        metrics.incr('smt_translation_cache_hits')
+        return cached[3]
+    metrics.incr('smt_translation_cache_misses')
+
+    ret = expression_to_smt(expr_object, smt_context_object, var_subst_map)
+    if len(translation_cache) >= smt_context_object.max_translation_cache_size:
+        smt_context_object.clear_translation_cache()
+        translation_cache = smt_context_object.translation_cache
+    translation_cache[key] = (expr_object, var_subst_map, interpretations, ret)
+    return ret
+
+
 class FunctionBase(object):
     """A base class for functions.
     Manages the following aspects of a function:
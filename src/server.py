@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# server.py ---
+#
+# Filename: server.py
+# Created: Wed Oct 21 10:05:12 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+
+"""A long running solver service. Starting the interpreter and importing Z3
+and libeusolver takes longer than solving many benchmarks, so the service
+keeps a pool of warm worker processes (forked after the imports) and feeds
+them problems.
+
+Requests are read as lines of JSON from stdin, or from the clients of a Unix
+socket with --socket:
+    {"id": 1, "file": "path/to/problem.sl", "time_limit": 10}
+    {"id": 2, "problem": "(set-logic LIA) ...", "anytime": true}
+The optional fields are time_limit (seconds), anytime, cex_per_round and
+verifier_workers, with the same meaning as the options of benchmarks.py.
+
+The output of the solver is streamed back line by line as
+    {"id": 1, "event": "output", "text": "(define-fun ...)\\n"}
+followed by a single
+    {"id": 1, "event": "done", "status": "solved", "output": "...",
+     "time": 0.42, "metrics": {...}}
+where status is one of solved, fail, timeout or error. Requests are solved
+concurrently, so the replies to different requests can be interleaved.
+
+The time limit of a request is enforced cooperatively by the solver; a
+worker which does not give up within --kill-grace seconds of it is killed
+and replaced. Workers are also replaced after --max-requests requests, so
+that the memory held by the caches of the solver does not grow unbounded."""
+
+import collections
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+import benchmarks
+from core import solvers
+from parsers import parser
+from utils.deadline import Deadline
+from utils.memory_governor import governor
+from utils.metrics import metrics
+
+class _OutputStream(io.TextIOBase):
+    """Stands for stdout in a worker: sends what the solver prints to the
+    server, a line at a time."""
+
+    def __init__(self, connection, request_id):
+        self.connection = connection
+        self.request_id = request_id
+        self.chunks = []
+        self.buffered = []
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.chunks.append(text)
+        self.buffered.append(text)
+        if text.endswith('\n'):
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if len(self.buffered) > 0:
+            self.connection.send(('output', self.request_id, ''.join(self.buffered)))
+            self.buffered = []
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+def read_problem(request):
+    if 'problem' in request:
+        return parser.sexpFromString(request['problem'])
+    elif 'file' in request:
+        file_sexp = parser.sexpFromFile(request['file'])
+        if file_sexp is None:
+            raise IOError('Unable to read %s' % request['file'])
+        return file_sexp
+    raise ValueError('Request has neither a file nor a problem')
+
+def solve_request(request, output):
+    """Solves the problem of :request:, printing to :output:. Returns the
+    done reply of the request."""
+    metrics.reset()
+    reply = { 'id': request.get('id'), 'event': 'done' }
+    try:
+        file_sexp = read_problem(request)
+        deadline = Deadline(request.get('time_limit'))
+        with contextlib.redirect_stdout(output):
+            benchmarks.make_solver(file_sexp,
+                    anytime=request.get('anytime', False),
+                    cex_per_round=request.get('cex_per_round', 1),
+                    verifier_workers=request.get('verifier_workers', 0),
+                    deadline=deadline)
+        if metrics.values.get('deadline_exceeded', False):
+            reply['status'] = 'timeout'
+        elif metrics.values.get('solved', False):
+            reply['status'] = 'solved'
+        else:
+            reply['status'] = 'fail'
+    except Exception as exception:
+        reply['status'] = 'error'
+        reply['error'] = '%s: %s' % (type(exception).__name__, exception)
+        reply['traceback'] = traceback.format_exc()
+    output.flush()
+    reply['output'] = output.getvalue()
+    metrics_dict = metrics.to_dict()
+    reply['time'] = metrics_dict['wall_time']
+    reply['metrics'] = metrics_dict
+    return reply
+
+def _worker_main(connection, warmup_file):
+    # ^C and termination are handled by the server
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if warmup_file is not None:
+        # Fills the caches of Z3 and libeusolver, the output is dropped
+        solve_request({ 'file': warmup_file }, io.StringIO())
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        reply = solve_request(request, _OutputStream(connection, request.get('id')))
+        connection.send(('done', request.get('id'), reply))
+        # Free the solver state now, not while solving the next request
+        gc.collect()
+
+class _Worker(object):
+    def __init__(self, context, warmup_file):
+        (self.connection, child_connection) = context.Pipe()
+        # Not a daemon: a worker may start processes of its own
+        # (verifier_workers)
+        self.process = context.Process(target=_worker_main, args=(child_connection, warmup_file))
+        self.process.start()
+        child_connection.close()
+        self.num_requests = 0
+        self.request = None
+        self.reply = None
+        self.output = None
+        self.kill_time = None
+
+    def is_busy(self):
+        return self.request is not None
+
+    def assign(self, request, reply, time_limit, kill_grace):
+        self.request = request
+        self.reply = reply
+        self.output = []
+        self.kill_time = None
+        if time_limit is not None:
+            self.kill_time = time.monotonic() + time_limit + kill_grace
+        self.connection.send(request)
+
+    def finish(self):
+        self.num_requests += 1
+        self.request = None
+        self.reply = None
+        self.output = None
+        self.kill_time = None
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            # Other workers hold copies of the connection, so closing it
+            # does not give the worker an EOF
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.connection.close()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+class SolverService(object):
+    def __init__(self, num_workers, max_requests_per_worker=None, time_limit=None,
+                 kill_grace=10.0, warmup_file=None):
+        self.num_workers = num_workers
+        self.max_requests_per_worker = max_requests_per_worker
+        self.time_limit = time_limit
+        self.kill_grace = kill_grace
+        self.warmup_file = warmup_file
+        # Workers are forked so that they inherit the imported modules
+        self.context = multiprocessing.get_context('fork')
+        self.workers = []
+        self.pending = collections.deque()
+        self.incoming = queue.Queue()
+        self.closing = False
+        # Wakes up the service loop when a request is submitted
+        (self.wakeup_reader, self.wakeup_writer) = multiprocessing.Pipe(duplex=False)
+        self.wakeup_lock = threading.Lock()
+
+    def submit(self, request, reply):
+        """Queues :request: (a dict), :reply: is called with each reply to
+        it, from the thread running the service. Can be called from any
+        thread."""
+        self.incoming.put((request, reply))
+        with self.wakeup_lock:
+            self.wakeup_writer.send_bytes(b'')
+
+    def close(self):
+        """Stops the service once the requests submitted so far are done."""
+        self.submit(None, None)
+
+    def run(self):
+        self.workers = [ _Worker(self.context, self.warmup_file) for i in range(self.num_workers) ]
+        try:
+            while not self.closing or len(self.pending) > 0 or self._num_busy() > 0:
+                self._dispatch()
+                self._wait()
+                self._kill_overdue_workers()
+        finally:
+            for worker in self.workers:
+                worker.stop(kill=worker.is_busy())
+
+    def _num_busy(self):
+        return sum(1 for worker in self.workers if worker.is_busy())
+
+    def _receive_requests(self):
+        while True:
+            try:
+                (request, reply) = self.incoming.get_nowait()
+            except queue.Empty:
+                return
+            if request is None:
+                self.closing = True
+            else:
+                self.pending.append((request, reply))
+
+    def _dispatch(self):
+        self._receive_requests()
+        for worker in self.workers:
+            if len(self.pending) == 0:
+                break
+            if not worker.is_busy():
+                (request, reply) = self.pending.popleft()
+                time_limit = request.get('time_limit', self.time_limit)
+                if time_limit is not None:
+                    request = dict(request, time_limit=time_limit)
+                worker.assign(request, reply, time_limit, self.kill_grace)
+
+    def _wait(self):
+        busy = { worker.connection: worker for worker in self.workers if worker.is_busy() }
+        timeout = None
+        kill_times = [ worker.kill_time for worker in busy.values() if worker.kill_time is not None ]
+        if len(kill_times) > 0:
+            timeout = max(0.0, min(kill_times) - time.monotonic())
+        ready = multiprocessing.connection.wait(list(busy) + [self.wakeup_reader], timeout)
+        for connection in ready:
+            if connection is self.wakeup_reader:
+                while self.wakeup_reader.poll():
+                    self.wakeup_reader.recv_bytes()
+            else:
+                self._receive_reply(busy[connection])
+
+    def _receive_reply(self, worker):
+        try:
+            (kind, request_id, payload) = worker.connection.recv()
+        except EOFError:
+            # Killed, e.g. by the memory limit
+            worker.process.join()
+            self._abort_request(worker, 'error',
+                    'Worker exited with code %s' % worker.process.exitcode)
+            return
+        if kind == 'output':
+            worker.output.append(payload)
+            worker.reply({ 'id': request_id, 'event': 'output', 'text': payload })
+            return
+        worker.reply(payload)
+        worker.finish()
+        if (self.max_requests_per_worker is not None and
+                worker.num_requests >= self.max_requests_per_worker):
+            self._replace_worker(worker)
+
+    def _kill_overdue_workers(self):
+        now = time.monotonic()
+        for worker in list(self.workers):
+            if worker.kill_time is not None and now >= worker.kill_time:
+                self._abort_request(worker, 'timeout',
+                        'Worker did not stop at the time limit, killed')
+
+    def _abort_request(self, worker, status, error):
+        reply = {
+                'id': worker.request.get('id'),
+                'event': 'done',
+                'status': status,
+                'error': error,
+                'output': ''.join(worker.output)
+                }
+        worker.reply(reply)
+        self._replace_worker(worker, kill=True)
+
+    def _replace_worker(self, worker, kill=False):
+        worker.stop(kill)
+        index = self.workers.index(worker)
+        self.workers[index] = _Worker(self.context, self.warmup_file)
+
+def _make_writer(write):
+    lock = threading.Lock()
+    def reply(message):
+        line = json.dumps(message, default=str) + '\n'
+        with lock:
+            try:
+                write(line)
+            except OSError:
+                # The client went away
+                pass
+    return reply
+
+def _read_requests(lines, service, reply):
+    for line in lines:
+        if line.strip() == '':
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Request is not a JSON object')
+        except ValueError as exception:
+            reply({ 'id': None, 'event': 'done', 'status': 'error',
+                    'error': 'Malformed request: %s' % exception })
+            continue
+        service.submit(request, reply)
+
+def serve_stdio(service):
+    def write(line):
+        sys.stdout.write(line)
+        sys.stdout.flush()
+    def read():
+        # Not through sys.stdin: a worker forked while this thread holds
+        # the lock of sys.stdin would deadlock closing it
+        with open(sys.stdin.fileno(), 'r', closefd=False) as lines:
+            _read_requests(lines, service, _make_writer(write))
+        service.close()
+    threading.Thread(target=read, daemon=True).start()
+    service.run()
+
+def serve_socket(service, socket_path):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_socket.bind(socket_path)
+    server_socket.listen()
+
+    def handle_client(client_socket):
+        with client_socket, client_socket.makefile('r') as lines:
+            _read_requests(lines, service, _make_writer(
+                lambda line: client_socket.sendall(line.encode())))
+
+    def accept():
+        while True:
+            (client_socket, address) = server_socket.accept()
+            threading.Thread(target=handle_client, args=(client_socket,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    try:
+        service.run()
+    finally:
+        server_socket.close()
+        os.unlink(socket_path)
+
+if __name__ == '__main__':
+    import argparse
+    argparser = argparse.ArgumentParser(description='EUSolver service')
+    argparser.add_argument('--socket', default=None,
+            help='Serve the clients of this Unix socket instead of stdin')
+    argparser.add_argument('--workers', type=int, default=1,
+            help='Number of worker processes')
+    argparser.add_argument('--max-requests', type=int, default=None,
+            help='Replace a worker after it has solved this many requests')
+    argparser.add_argument('--time-limit', type=float, default=None,
+            help='Time limit of the requests which do not give one, in seconds')
+    argparser.add_argument('--kill-grace', type=float, default=10.0,
+            help='Seconds past its time limit after which a worker is killed')
+    argparser.add_argument('--warmup', default=None,
+            help='Benchmark file each worker solves when it starts')
+    args = argparser.parse_args()
+    governor.configure(solvers.EUSOLVER_MEMORY_LIMIT)
+    service = SolverService(args.workers, args.max_requests, args.time_limit,
+                            args.kill_grace, args.warmup)
+    # Stop the workers on termination
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if args.socket is None:
+            serve_stdio(service)
+        else:
+            serve_socket(service, args.socket)
+    except KeyboardInterrupt:
+        pass
+
+#
+# server.py ends here
@@ -43,6 +43,8 @@ from eusolver import BitSet
 from enumerators import enumerators
 from exprs import exprs
 from utils import basetypes
+from core.point_store import PointStoreSubscriber
+from utils.metrics import metrics
 from enum import Enum
 
 _expr_to_str = exprs.expression_to_string
@@ -64,25 +66,37 @@ class StoppingCondition(Enum):
 #             return True
 #     return False
 
-class TermSolverInterface(object):
+class TermSolverInterface(PointStoreSubscriber):
+    deadline = None
+
     def __init__(self):
         self.points = []
         self.current_largest_term_size = 0
         self.signature_to_term = {}
+        self.seed_terms = []
 
     def get_signature_to_term(self):
         return self.signature_to_term
 
+    def add_seed_terms(self, terms):
+        """Adds terms (e.g., the leaves of a solution of a similar problem)
+        to be put in the signature to term map, ahead of the enumerated
+        ones, whenever points are added."""
+        self.seed_terms.extend(terms)
+
+    def set_deadline(self, deadline):
+        """Sets the utils.deadline.Deadline checked between bunches of
+        enumerated terms."""
+        self.deadline = deadline
+
     def get_num_distinct_terms(self):
         return len(self.signature_to_term)
 
     def get_largest_term_size_enumerated(self):
         return 0
 
-    def add_points(self, new_points):
-        points = self.points
-        points.extend(new_points)
-        self.signature_factory = BitSet.make_factory(len(points))
+    def points_added(self, new_points, start_index):
+        self.signature_factory = BitSet.make_factory(len(self.points))
         self.one_full_signature = False
         self._do_complete_sig_to_term()
 
@@ -106,6 +120,15 @@ class TermSolverInterface(object):
             if new_sig.is_full():
                 self.one_full_signature = True
 
+        for term in self.seed_terms:
+            new_sig = self._compute_term_signature(term)
+            if new_sig.is_empty() or new_sig in new_sig_to_term:
+                continue
+            new_sig_to_term[new_sig] = term
+            self.full_signature |= new_sig
+            if new_sig.is_full():
+                self.one_full_signature = True
+
         # for sig, term in new_sig_to_term.items():
         #     print("NEW SIG TO TERM:", str(sig), _expr_to_str(term))
 
@@ -138,6 +161,9 @@ class TermSolverInterface(object):
         raise basetypes.AbstractMethodError('TermSolverInterface.generate_more_terms()')
 
 class EnumerativeTermSolverBase(TermSolverInterface):
+    # prefix of the names of the metrics recorded by the solver
+    metrics_name = 'term'
+
     def __init__(self, term_signature):
         super().__init__()
         self.term_signature = term_signature
@@ -179,6 +205,7 @@ class EnumerativeTermSolverBase(TermSolverInterface):
         self.bunch_generator = enumerators.BunchedGenerator(self.term_generator,
                                                             # self.max_term_size, len(self.points) * 2)
                                                             self.max_term_size, 1)
+        self.bunch_generator.deadline = self.deadline
         self.bunch_generator_state = self.bunch_generator.generate()
 
 
@@ -203,27 +230,35 @@ class EnumerativeTermSolverBase(TermSolverInterface):
         return True
 
     def _default_generate_more_terms(self, transform_term=None):
-        signature_to_term = self.signature_to_term
         bunch_generator_state = self.bunch_generator_state
+        metrics_name = self.metrics_name
         try:
-            bunch = next(bunch_generator_state)
+            bunch = metrics.phase(metrics_name + '_enumerate').run(next, bunch_generator_state)
         except StopIteration:
             return False
 
+        metrics.phase(metrics_name + '_signature').run(self._add_term_signatures,
+                                                       bunch, transform_term)
+        return True
 
+    def _add_term_signatures(self, bunch, transform_term):
+        signature_to_term = self.signature_to_term
+        metrics_name = self.metrics_name
         for term in bunch:
             if transform_term is not None:
                 term = transform_term(term)
+            metrics.incr_keyed(metrics_name + 's_enumerated_by_size',
+                               exprs.get_expression_size(term))
             sig = self._compute_term_signature(term)
             if (sig in signature_to_term or sig.is_empty()):
+                metrics.incr(metrics_name + '_signature_hits')
                 continue
+            metrics.incr(metrics_name + '_signature_misses')
             signature_to_term[sig] = term
             self.full_signature = self.full_signature | sig
             if sig.is_full():
                 self.one_full_signature = True
 
-        return True
-
 
 
 class PointlessTermSolver(EnumerativeTermSolverBase):
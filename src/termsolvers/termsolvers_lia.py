@@ -78,15 +78,23 @@ class SpecAwareLIATermSolver(TermSolverInterface):
             LIAInequality.from_expr(exprs.substitute_all(disjunct, list(zip(self.canon_apps, self.outvars))))
             for disjunct in clause  ]
             for clause in spec.get_canon_clauses() ]
+        self.clause_table = lia_utils.LIAClauseTable(self.lia_clauses, self.all_vars, self.outvars)
         self.rewritten_spec = exprs.substitute_all(
                 self.spec.get_canonical_specification(),
                 list(zip(self.canon_apps, self.outvars)))
+        # Has the rewritten spec asserted, the points are assumed
+        self.spec_sampler = None
+        # term -> signature on the points seen so far, extended as points
+        # are added instead of being recomputed on every point every round
+        self.term_signatures = {}
 
     def generate_more_terms(self):
         pass
 
     def _compute_term_signature(self, term):
-        return self._default_compute_term_signature(term)
+        signature = self._default_compute_term_signature(term, self.term_signatures.get(term))
+        self.term_signatures[term] = signature
+        return signature
 
     def _trivial_solve(self):
         ret = exprs.ConstantExpression(exprs.Value(0, exprtypes.IntType()))
@@ -103,18 +111,17 @@ class SpecAwareLIATermSolver(TermSolverInterface):
         eval_ctx = self.eval_ctx
         spec = self.rewritten_spec
 
+        if self.spec_sampler is None:
+            self.spec_sampler = smt_ctx.get_sampler(_expr_to_smt(spec, smt_ctx, self.all_vars_z3))
+
         # Find one value of output
-        eq_constrs = []
-        for var, value in zip(self.point_var_exprs, point):
-            c = self.syn_ctx.make_function_expr('eq', 
-                    exprs.ConstantExpression(value), var)
-            eq_constrs.append(c)
-        full_constr = self.syn_ctx.make_function_expr('and',
-                spec, *eq_constrs)
-
-        raw_z3_model = exprs.sample(full_constr, smt_ctx, self.all_vars_z3)
+        eq_constrs = [ _expr_to_smt(exprs.ConstantExpression(value), smt_ctx) == var_z3
+                       for var_z3, value in zip(self.all_vars_z3, point) ]
+
+        raw_z3_model = self.spec_sampler.sample(self.all_vars_z3, eq_constrs)
         # print("B1:", raw_z3_model)
-        model = dict(zip(self.all_vars, [ z3_value.as_long() for z3_value in raw_z3_model ]))
+        values = [ z3_value.as_long() for z3_value in raw_z3_model ]
+        model = dict(zip(self.all_vars, values))
         # print("B2:")
         # for var, val in model.items():
             # print("\t", exprs.expression_to_string(var), "--->", val)
@@ -127,15 +134,7 @@ class SpecAwareLIATermSolver(TermSolverInterface):
             # for disj in clause:
                 # print(str(disj), end=" , ")
             # print()
-        ineqs = []
-        outvar_set = set(self.outvars)
-        for clause in self.lia_clauses:
-            for disjunct in clause:
-                # print(str(disjunct) + " --> " + str(disjunct.eval(model)))
-                # print(str(disjunct) + " --> " + str(len(outvar_set & disjunct.get_variables())))
-                if disjunct.eval(model) and len(outvar_set & disjunct.get_variables()) > 0:
-                    ineqs.append(disjunct)
-                    break
+        ineqs = self.clause_table.first_satisfied_disjuncts(values)
         # print("B3:")
         # for ineq in ineqs:
             # print("\t", str(ineq))
@@ -144,7 +143,7 @@ class SpecAwareLIATermSolver(TermSolverInterface):
     def _single_solve(self, ivs, points):
         s = self.signature_factory()
         for point in points:
-            pt_index = self.points.index(point)
+            pt_index = self.point_store.index(point)
             s.add(pt_index)
 
         for sig, term in self.signature_to_term.items():
@@ -200,7 +199,6 @@ class SpecAwareLIATermSolver(TermSolverInterface):
             terms = new_terms
             # print([ _expr_to_str(t) for t in terms ])
 
-            sig = self.signature_factory()
             if len(self.synth_funs) > 1:
                 domain_types = tuple([exprtypes.IntType()] * len(self.synth_funs))
                 single_term = exprs.FunctionExpression(semantics_core.CommaFunction(domain_types),
@@ -208,9 +206,7 @@ class SpecAwareLIATermSolver(TermSolverInterface):
             else:
                 single_term = terms[0]
 
-            for i, t in enumerate(self.term_signature(single_term, self.points)):
-                if t:
-                    sig.add(i)
+            sig = self._compute_term_signature(single_term)
             self.signature_to_term[sig] = single_term
         # print("-----------------")
 
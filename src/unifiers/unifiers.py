@@ -46,6 +46,8 @@ from exprs import exprtypes
 from exprs import evaluation
 import eusolver
 from utils import basetypes
+from core.point_store import PointStoreSubscriber
+from utils.metrics import metrics
 
 _expr_to_str = exprs.expression_to_string
 _is_expr = exprs.is_expression
@@ -58,20 +60,44 @@ def get_decision_tree_size(dt):
         return (1 + get_decision_tree_size(dt.get_positive_child()) +
                 get_decision_tree_size(dt.get_negative_child()))
 
-class UnifierInterface(object):
-    def add_points(self):
-        raise basetypes.AbstractMethodError('UnifierInterface.add_points()')
+def get_decision_tree_expr_size_bound(dt, pred_sizes, term_sizes):
+    """Returns a lower bound on the size of the expression obtained from
+    the decision tree: the leaves contribute the size of their smallest
+    label term, as the verifier may pick any of them."""
+    if (dt.is_leaf()):
+        return min([ term_sizes[x] for x in dt.get_all_label_ids() ])
+    else:
+        return (1 + pred_sizes[dt.get_split_attribute_id()] +
+                get_decision_tree_expr_size_bound(dt.get_positive_child(), pred_sizes, term_sizes) +
+                get_decision_tree_expr_size_bound(dt.get_negative_child(), pred_sizes, term_sizes))
+
+class UnifierInterface(PointStoreSubscriber):
+    solution_size_bound = None
+    deadline = None
 
     def unify(self):
         raise basetypes.AbstractMethodError('UnifierInterface.solve()')
 
+    def set_solution_size_bound(self, bound):
+        """Anytime mode: only unifications strictly smaller than
+        :bound: are produced from here on."""
+        self.solution_size_bound = bound
+
+    def set_deadline(self, deadline):
+        """Sets the utils.deadline.Deadline checked while unifying."""
+        self.deadline = deadline
+
+    def _is_within_size_bound(self, size):
+        return self.solution_size_bound is None or size < self.solution_size_bound
+
     def _try_trivial_unification(self):
         # we can trivially unify if there exists a term
         # which satisfies the spec at all points
         trivial_term = None
         for (sig, term) in self.term_solver.get_signature_to_term().items():
             if (sig is None or sig.is_full()):
-                trivial_term = term
+                if self._is_within_size_bound(exprs.get_expression_size(term)):
+                    trivial_term = term
                 break
         return trivial_term
 
@@ -83,9 +109,19 @@ class EnumerativeDTUnifierBase(UnifierInterface):
         self.pred_solver = None
         self.syn_ctx = syn_ctx
 
-    def add_points(self, new_points):
-        self.points.extend(new_points)
-        self.pred_solver.add_points(new_points)
+    def set_point_store(self, point_store):
+        super().set_point_store(point_store)
+        if self.pred_solver is not None:
+            self.pred_solver.set_point_store(point_store)
+
+    def set_deadline(self, deadline):
+        super().set_deadline(deadline)
+        if self.pred_solver is not None:
+            self.pred_solver.set_deadline(deadline)
+
+    def points_added(self, new_points, start_index):
+        # The predicate solver follows the store on its own
+        pass
 
     def get_largest_pred_size_enumerated(self):
         if self.pred_solver is not None:
@@ -113,16 +149,42 @@ class EnumerativeDTUnifierBase(UnifierInterface):
         # print('pred_list: %s' % [_expr_to_str(x) for x in pred_list], flush=True)
         # print('term_list: %s' % [_expr_to_str(x) for x in term_list], flush=True)
         # print('points   :\n%s' % _point_list_to_str(self.points), flush=True)
-        dt = eusolver.eus_learn_decision_tree_for_ml_data(pred_sig_list,
-                                                          term_sig_list)
+        dt = metrics.phase('dt_learn').run(eusolver.eus_learn_decision_tree_for_ml_data,
+                                           pred_sig_list, term_sig_list)
         # print('Done!', flush=True)
         # print(dt, flush=True)
         # print('Obtained decision tree:\n%s' % str(dt))
         if (dt == None):
             return None
-        else:
+        if self.solution_size_bound is not None:
+            return self._try_bounded_decision_tree_learning(term_list, term_sig_list,
+                    pred_list, pred_sig_list, dt)
+        return (term_list, term_sig_list, pred_list, pred_sig_list, dt)
+
+    def _try_bounded_decision_tree_learning(self, term_list, term_sig_list,
+            pred_list, pred_sig_list, dt):
+        # Anytime mode: the learner knows nothing about expression sizes, so
+        # if the tree over all the predicates is not small enough, we re-learn
+        # over the predicates no larger than a threshold, growing the
+        # threshold through the distinct predicate sizes.
+        term_sizes = [ exprs.get_expression_size(t) for t in term_list ]
+        pred_sizes = [ exprs.get_expression_size(p) for p in pred_list ]
+        if self._is_within_size_bound(get_decision_tree_expr_size_bound(dt, pred_sizes, term_sizes)):
             return (term_list, term_sig_list, pred_list, pred_sig_list, dt)
 
+        for threshold in sorted(set(pred_sizes))[:-1]:
+            indices = [ i for i in range(len(pred_list)) if pred_sizes[i] <= threshold ]
+            sub_pred_list = [ pred_list[i] for i in indices ]
+            sub_pred_sig_list = [ pred_sig_list[i] for i in indices ]
+            sub_dt = metrics.phase('dt_learn').run(eusolver.eus_learn_decision_tree_for_ml_data,
+                                                   sub_pred_sig_list, term_sig_list)
+            if sub_dt is None:
+                continue
+            sub_pred_sizes = [ pred_sizes[i] for i in indices ]
+            if self._is_within_size_bound(get_decision_tree_expr_size_bound(sub_dt, sub_pred_sizes, term_sizes)):
+                return (term_list, term_sig_list, sub_pred_list, sub_pred_sig_list, sub_dt)
+        return None
+
     def get_num_distinct_preds(self):
         return len(self.pred_solver.signature_to_term)
 
@@ -137,7 +199,11 @@ class EnumerativeDTUnifierBase(UnifierInterface):
             triv = self._try_trivial_unification()
             if triv is not None:
                 yield ("TERM", triv)
-                return
+                # Anytime mode: the bound now excludes this term, so keep
+                # looking for a smaller decision tree
+                if self.solution_size_bound is None:
+                    return
+                continue
 
             old_pred_num = len(pred_solver.signature_to_term)
             self.pred_solver.generate_more_terms()
@@ -189,6 +255,7 @@ class PointlessEnumDTUnifier(EnumerativeDTUnifierBase):
         self.pred_solver = termsolvers.PointlessTermSolver(
                 compute_indicator,
                 pred_generator)
+        self.pred_solver.metrics_name = 'pred'
 
 class PointDistinctDTUnifier(EnumerativeDTUnifierBase):
     def __init__(self, pred_generator, term_solver, synth_fun, syn_ctx):
@@ -198,6 +265,7 @@ class PointDistinctDTUnifier(EnumerativeDTUnifierBase):
         self.pred_solver = termsolvers.PointDistinctTermSolver(
                 compute_indicator,
                 pred_generator)
+        self.pred_solver.metrics_name = 'pred'
 
 
 class NullUnifier(UnifierInterface):
@@ -211,7 +279,7 @@ class NullUnifier(UnifierInterface):
     def get_largest_pred_size_enumerated(self):
         return 0
 
-    def add_points(self, points):
+    def points_added(self, new_points, start_index):
         pass
 
     def unify(self):
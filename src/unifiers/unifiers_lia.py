@@ -109,8 +109,8 @@ class SpecAwareLIAUnifier(UnifierInterface):
         self.clauses = spec.get_canon_clauses()
         self.intro_vars = spec.get_intro_vars()
 
-    def add_points(self, points):
-        self.points.extend(points)
+    def points_added(self, new_points, start_index):
+        pass
 
     def _eliminate_forall_vars(self, clauses):
         only_intro_var_clauses = _filter_to_intro_vars(clauses, self.intro_vars)
@@ -94,5 +94,12 @@ class UnboundLetVariableError(Exception):
     def __init__(self):
         pass
 
+class DeadlineExceededError(Exception):
+    def __init__(self):
+        pass
+
+    def __str__(self):
+        return 'Deadline exceeded'
+
 #
 # basetypes.py ends here
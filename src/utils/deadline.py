@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# deadline.py ---
+#
+# Filename: deadline.py
+# Created: Tue Oct 20 09:12:46 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""Deadlines and cancellation, without process global signals. A Deadline
+is passed down to the parts of the solver that run for long (the CEGIS loop,
+the enumerators, the verifiers), which check it cooperatively at safe points
+(e.g. bunch boundaries) and raise basetypes.DeadlineExceededError. Calls
+that cannot check it (Z3 checks) register an interrupt callback with
+on_expiry(), which is run from the watchdog thread of the deadline when
+it expires, or when the deadline is cancelled from another thread. A
+deadline starts its watchdog thread the first time a callback is
+registered (in each process), and the thread ends when the deadline
+expires or is cancelled."""
+
+import contextlib
+import threading
+import time
+
+from utils import basetypes
+
+class Deadline(object):
+    def __init__(self, seconds=None, parent=None):
+        """A deadline expiring :seconds: from now (never if None), and no
+        later than :parent:. Cancelling the parent cancels the deadline."""
+        expires_at = None if seconds is None else time.monotonic() + seconds
+        if parent is not None and parent.expires_at is not None:
+            if expires_at is None or parent.expires_at < expires_at:
+                expires_at = parent.expires_at
+        self.expires_at = expires_at
+        self.parent = parent
+        self.cancelled = False
+        self.lock = threading.Lock()
+        # notified on cancellation, to wake the watchdog thread up
+        self.condition = threading.Condition(self.lock)
+        self.expiry_callbacks = []
+        self.watchdog = None
+
+    def child(self, seconds=None):
+        return Deadline(seconds, self)
+
+    def remaining(self):
+        """Returns the number of seconds left, None if there is no limit."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        deadline = self
+        while deadline is not None:
+            if deadline.cancelled:
+                return True
+            deadline = deadline.parent
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self):
+        if self.expired():
+            raise basetypes.DeadlineExceededError()
+
+    def cancel(self):
+        """Cancels the deadline (and its children). Can be called from any
+        thread."""
+        with self.lock:
+            self.cancelled = True
+            callbacks = list(self.expiry_callbacks)
+            self.condition.notify_all()
+        for callback in callbacks:
+            callback()
+
+    def _watch(self):
+        # Body of the watchdog thread: runs the callbacks registered when
+        # the deadline expires (cancel() runs them itself)
+        with self.lock:
+            while not self.cancelled:
+                remaining = self.expires_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            if self.cancelled:
+                return
+            callbacks = list(self.expiry_callbacks)
+        for callback in callbacks:
+            callback()
+
+    @contextlib.contextmanager
+    def on_expiry(self, callback):
+        """Runs :callback: (from another thread) if the deadline expires or
+        is cancelled while the body of the with statement runs. The body
+        should still check the deadline when it returns."""
+        chain = []
+        deadline = self
+        while deadline is not None:
+            with deadline.lock:
+                deadline.expiry_callbacks.append(callback)
+            chain.append(deadline)
+            deadline = deadline.parent
+
+        # No parent expires before self, the watchdog of self is enough. A
+        # forked process inherits the deadline, but not its watchdog thread
+        if self.expires_at is not None and not self.expired():
+            with self.lock:
+                if self.watchdog is None or not self.watchdog.is_alive():
+                    self.watchdog = threading.Thread(target=self._watch, daemon=True)
+                    self.watchdog.start()
+        try:
+            # The watchdog may have run the callbacks before this one was
+            # registered
+            if self.expired():
+                callback()
+            yield
+        finally:
+            for deadline in chain:
+                with deadline.lock:
+                    deadline.expiry_callbacks.remove(callback)
+
+#
+# deadline.py ends here
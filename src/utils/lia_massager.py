@@ -38,6 +38,7 @@
 
 # Code:
 
+import z3
 from exprs import exprs
 from verifiers import verifiers
 import eusolver
@@ -46,6 +47,7 @@ from exprs import exprtypes
 from utils.lia_utils import LIAExpression, LIAInequality
 from utils import utils
 from utils import z3smt
+from utils.metrics import metrics
 import semantics
 from eusolver import BitSet
 
@@ -382,7 +384,7 @@ def rewrite_arbitrary_arity_and_or(syn_ctx, sol):
 
         
 
-def massage_full_lia_solution(syn_ctx, synth_funs, final_solution, massaging):
+def massage_full_lia_solution(syn_ctx, synth_funs, final_solution, massaging, deadline=None):
     # for sf in final_solution:
     #   print(exprs.expression_to_string(sf))
     try:
@@ -421,7 +423,7 @@ def massage_full_lia_solution(syn_ctx, synth_funs, final_solution, massaging):
             if not boolean_combs:
                 # print(exprs.expression_to_string(sol))
                 # sol = rewrite_boolean_combs(syn_ctx, sol)
-                sol = dt_rewrite_boolean_combs(syn_ctx, sol, sf)
+                sol = dt_rewrite_boolean_combs(syn_ctx, sol, sf, deadline)
             else:
                 sol = rewrite_arbitrary_arity_and_or(syn_ctx, sol)
 
@@ -437,7 +439,7 @@ def massage_full_lia_solution(syn_ctx, synth_funs, final_solution, massaging):
         # return None
 
 # Assumes boolean functions are in terms of formal parameters
-def dt_rewrite_boolean_combs(syn_ctx, sol, synth_fun):
+def dt_rewrite_boolean_combs(syn_ctx, sol, synth_fun, deadline=None):
     orig_sol = sol
     smt_ctx = z3smt.Z3SMTContext()
     vs = exprs.get_all_variables(sol)
@@ -474,18 +476,41 @@ def dt_rewrite_boolean_combs(syn_ctx, sol, synth_fun):
     pred_sig_list = [ BitSet(0) for p in preds ]
     term_sig_list = [ BitSet(0) for t in terms ]
 
-    expr = terms[0]
-    fsol = None
+    # The atomic predicates, the terms and the solution are translated once,
+    # the candidate trees are built from their translations and checked on
+    # the pooled solver of the context
+    expression_to_smt = semantics.semantics_types.expression_to_smt
+    pred_smts = [ expression_to_smt(pred, smt_ctx, argvars) for pred in preds ]
+    term_smts = [ expression_to_smt(term, smt_ctx, argvars) for term in terms ]
+    sol_smt = expression_to_smt(sol, smt_ctx, argvars)
+    sampler = smt_ctx.get_sampler()
+
+    def dt_to_smt(dt):
+        if dt.is_leaf():
+            for tid in dt.get_all_label_ids():
+                return term_smts[tid]
+        return z3.If(pred_smts[dt.get_split_attribute_id()],
+                dt_to_smt(dt.get_positive_child()),
+                dt_to_smt(dt.get_negative_child()))
+
+    dt = None
+    expr_smt = term_smts[0]
     while True:
-        z3point = exprs.sample(syn_ctx.make_function_expr('ne', expr, sol), smt_ctx, argvars)
+        if deadline is not None:
+            deadline.check()
+        with sampler.scope(expr_smt != sol_smt):
+            z3point = sampler.sample(argvars, deadline=deadline)
         if z3point is None:
-            fsol = expr
             break
-        else:
-            point = list(map(lambda v, d: z3smt.z3value_to_value(v, d.variable_info), z3point, dummy_vars))
-            (pred_sig_list, term_sig_list) = add_point(point, pred_sig_list, term_sig_list)
-            dt = eusolver.eus_learn_decision_tree_for_ml_data(pred_sig_list, term_sig_list)
-            expr = verifiers.naive_dt_to_expr(syn_ctx, dt, preds, terms)
+        point = list(map(lambda v, d: z3smt.z3value_to_value(v, d.variable_info), z3point, dummy_vars))
+        (pred_sig_list, term_sig_list) = add_point(point, pred_sig_list, term_sig_list)
+        dt = metrics.phase('dt_learn').run(eusolver.eus_learn_decision_tree_for_ml_data,
+                                           pred_sig_list, term_sig_list)
+        expr_smt = dt_to_smt(dt)
+    if dt is None:
+        fsol = terms[0]
+    else:
+        fsol = verifiers.naive_dt_to_expr(syn_ctx, dt, preds, terms)
     sol = exprs.substitute_all(fsol, list(zip(dummy_vars, vs)))
     return sol
 
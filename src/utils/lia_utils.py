@@ -200,6 +200,8 @@ class LIAInequality(object):
         self.op_func = _op_funcs[op]
         assert type(self.left) == LIAExpression
         assert type(self.right) == LIAExpression
+        # var -> result of get_bounds(var), the inequality is not modified
+        self.bounds_cache = {}
 
     def __str__(self):
         ret = str(self.left) + " " + self.op + " " + str(self.right)
@@ -257,6 +259,14 @@ class LIAInequality(object):
     def get_bounds(self, var):
         # Returns (coeff, (Lower, Equality, Upper)) -- All three may be none
         # The meaning is coeff * var (>= Lower, = Eq, <= Upper)
+        # The returned expressions are shared, and must not be modified
+        bounds = self.bounds_cache.get(var)
+        if bounds is None:
+            bounds = self._compute_bounds(var)
+            self.bounds_cache[var] = bounds
+        return bounds
+
+    def _compute_bounds(self, var):
         normalized = self.right - self.left
         op = self.op
         c = - normalized.get_coefficient(var)
@@ -285,6 +295,51 @@ class LIAInequality(object):
         else:
             raise NotImplementedError
 
+class LIAClauseTable(object):
+    """A CNF of LIAInequality's compiled against a fixed ordering of
+    :variables:. Each disjunct l op r is stored as a row of integer
+    coefficients of l - r (one per variable), a constant and the comparison
+    with 0, so that it is evaluated on a model given as the list of the
+    values of the variables without hashing any expression."""
+
+    def __init__(self, clauses, variables, selected_variables=()):
+        """The disjuncts which mention none of :selected_variables: are
+        skipped by first_satisfied_disjuncts."""
+        self.variables = list(variables)
+        indices = { var:i for i, var in enumerate(self.variables) }
+        selected_variables = set(selected_variables)
+        self.clauses = []
+        for clause in clauses:
+            rows = []
+            for disjunct in clause:
+                normalized = disjunct.left - disjunct.right
+                coeffs = [0] * len(self.variables)
+                for var, coeff in normalized.get_var_coeff_pairs():
+                    coeffs[indices[var]] += coeff
+                is_selected = len(selected_variables & disjunct.get_variables()) > 0
+                rows.append((tuple(coeffs), normalized.get_const(), disjunct.op_func,
+                             is_selected, disjunct))
+            self.clauses.append(rows)
+
+    def evaluate(self, values):
+        """Returns, for each clause, the list of the truth values of its
+        disjuncts on the model :values: (in the order of the variables)."""
+        return [ [ op_func(sum(map(operator.mul, coeffs, values)) + const, 0)
+                   for (coeffs, const, op_func, _, _) in rows ]
+                 for rows in self.clauses ]
+
+    def first_satisfied_disjuncts(self, values):
+        """Returns, for each clause, the first of its disjuncts that
+        mentions a selected variable and is true on the model :values:.
+        Clauses without such a disjunct are left out."""
+        retval = []
+        for rows in self.clauses:
+            for (coeffs, const, op_func, is_selected, disjunct) in rows:
+                if is_selected and op_func(sum(map(operator.mul, coeffs, values)) + const, 0):
+                    retval.append(disjunct)
+                    break
+        return retval
+
 def solve_inequalities(model, outvars, inequalities, syn_ctx):
     # print("===================")
     # for var, val in model.items():
@@ -357,7 +412,7 @@ def solve_inequalities_one_outvar(model, outvar, inequalities, syn_ctx):
     if len(ubs) > 0:
         tightest_ub = min(ubs, key=lambda a: a[1].eval(model) / a[0])
         if tightest_ub is not None:
-            coeff = tighest_ub[0]
+            coeff = tightest_ub[0]
             rhs = tightest_ub[1].to_expr(syn_ctx)
             if coeff == 1:
                 return [ rhs ]
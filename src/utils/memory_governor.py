@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# memory_governor.py ---
+#
+# Filename: memory_governor.py
+# Created: Mon Oct 19 18:04:33 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""Enforcement of the memory limit of the solver. The limit is applied as
+RLIMIT_AS, and the resident set size is polled from the hot paths that
+allocate (enumeration caches). As the RSS approaches the limit, the
+registered objects are asked to shed memory at increasing levels:
+
+  level 1 (SHED_COMPACT):  keep compact forms of caches (e.g. digests of
+                           signatures instead of signatures)
+  level 2 (SHED_CACHES):   drop the most expensive caches (e.g. the largest
+                           size buckets of enumerated expressions)
+  level 3 (SHED_STREAM):   stop caching altogether and stream
+
+An object registers with :governor.register(obj): and implements
+shed_memory(level). It is called at each check where the RSS is above the
+threshold of the level, so repeated calls must shed more memory.
+
+Polling only notes the level reached: the hot paths poll from inside
+(possibly nested) enumerations, which must not see their caches dropped
+under them. Memory is shed by check(), called between the rounds of the
+CEGIS loop."""
+
+import gc
+import os
+import resource
+import weakref
+
+from utils.metrics import metrics
+
+SHED_NONE = 0
+SHED_COMPACT = 1
+SHED_CACHES = 2
+SHED_STREAM = 3
+
+_page_size = resource.getpagesize()
+
+def get_rss():
+    """Returns the current resident set size in bytes."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _page_size
+    except (OSError, IndexError, ValueError):
+        # Peak RSS, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class MemoryGovernor(object):
+    # fractions of the limit at which levels 1, 2, 3 are shed
+    shed_thresholds = (0.6, 0.75, 0.9)
+    # number of calls to poll() between two checks of the RSS
+    poll_interval = 1024
+    # growth of the RSS (fraction of the limit) after which a level is shed again
+    shed_again_growth = 0.05
+
+    def __init__(self):
+        self.memory_limit = None
+        self.sheddables = weakref.WeakSet()
+        self.poll_countdown = self.poll_interval
+        self.max_level = SHED_NONE
+        # highest level seen by poll() since the last check()
+        self.pending_level = SHED_NONE
+        self.last_shed_level = SHED_NONE
+        self.last_shed_rss = 0
+
+    def configure(self, memory_limit, apply_rlimit=True):
+        """Sets the memory limit (in bytes), and applies it as RLIMIT_AS
+        unless a lower limit is in place already."""
+        self.memory_limit = memory_limit
+        if not apply_rlimit or memory_limit is None:
+            return
+        (soft, hard) = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY and hard < memory_limit:
+            memory_limit = hard
+        if soft == resource.RLIM_INFINITY or soft > memory_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+
+    def register(self, sheddable):
+        self.sheddables.add(sheddable)
+
+    def unregister(self, sheddable):
+        self.sheddables.discard(sheddable)
+
+    def poll(self):
+        """Cheap enough to be called on hot paths: checks the RSS once every
+        :poll_interval: calls, and returns the level to be shed by the next
+        check(). Never sheds memory itself."""
+        self.poll_countdown -= 1
+        if self.poll_countdown > 0 or self.memory_limit is None:
+            return SHED_NONE
+        self.poll_countdown = self.poll_interval
+        level = self.get_level(get_rss())
+        if level > self.pending_level:
+            self.pending_level = level
+        return level
+
+    def get_level(self, rss):
+        level = SHED_NONE
+        for threshold in self.shed_thresholds:
+            if rss >= threshold * self.memory_limit:
+                level += 1
+        return level
+
+    def check(self):
+        """Sheds memory if the RSS is above a threshold, and returns the
+        level shed. Memory freed by shedding is usually reused rather than
+        returned to the OS, so the same level is shed again only once the
+        RSS has grown noticeably since the last shedding. A level noted by
+        poll() is shed even if the RSS has dropped below its threshold since.
+        Must not be called while an enumeration is in progress."""
+        if self.memory_limit is None:
+            return SHED_NONE
+        rss = get_rss()
+        level = max(self.get_level(rss), self.pending_level)
+        self.pending_level = SHED_NONE
+        if level == SHED_NONE:
+            return level
+        if (level <= self.last_shed_level and
+            rss <= self.last_shed_rss + self.shed_again_growth * self.memory_limit):
+            return SHED_NONE
+        self.last_shed_level = level
+        self.last_shed_rss = rss
+        for sheddable in list(self.sheddables):
+            sheddable.shed_memory(level)
+        gc.collect()
+        metrics.incr('memory_shed_level_%d' % level)
+        if level > self.max_level:
+            self.max_level = level
+            metrics.record('memory_shed_max_level', level)
+        return level
+
+governor = MemoryGovernor()
+
+#
+# memory_governor.py ends here
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# metrics.py ---
+#
+# Filename: metrics.py
+# Created: Mon Oct 19 11:02:17 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""Instrumentation of the solver: per phase wall clock and CPU times,
+counters, per key counters (e.g. terms enumerated per size) and series
+(e.g. points added per round). The solver components record into the
+module level :metrics: object, which can be dumped as JSON."""
+
+import json
+import signal
+import sys
+import time
+
+def _call_phase_body(function, args):
+    return function(*args)
+
+# phase name -> copy of _call_phase_body named _phase_<name>
+_phase_functions = {}
+# code object of a _phase_<name> function -> phase name
+phase_names_by_code = {}
+
+def _get_phase_function(name):
+    # Profilers name frames after their code objects: a copy of the code
+    # per phase makes the body of each phase a frame of its own, in the
+    # output of cProfile as well
+    function = _phase_functions.get(name)
+    if function is None:
+        code = _call_phase_body.__code__
+        function_name = '_phase_' + name
+        code = code.replace(co_name=function_name)
+        if hasattr(code, 'co_qualname'):
+            code = code.replace(co_qualname=function_name)
+        function = type(_call_phase_body)(code, _call_phase_body.__globals__, function_name)
+        _phase_functions[name] = function
+        phase_names_by_code[code] = name
+    return function
+
+class _PhaseTimer(object):
+    __slots__ = ['metrics', 'name', 'wall_start', 'cpu_start', 'wall_time', 'cpu_time']
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        # The sampling profiler shows the phase as a frame below its caller
+        self.metrics.active_phases.append((sys._getframe(1), self.name))
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time = time.perf_counter() - self.wall_start
+        self.cpu_time = time.process_time() - self.cpu_start
+        self.metrics.active_phases.pop()
+        self.metrics.add_phase_time(self.name, self.wall_time, self.cpu_time)
+        return False
+
+    def run(self, function, *args):
+        """Times function(*args) as the phase and returns its result. The
+        call goes through a function named _phase_<name>, which profilers
+        show as a frame of its own."""
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        try:
+            return _get_phase_function(self.name)(function, args)
+        finally:
+            self.wall_time = time.perf_counter() - self.wall_start
+            self.cpu_time = time.process_time() - self.cpu_start
+            self.metrics.add_phase_time(self.name, self.wall_time, self.cpu_time)
+
+class Metrics(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+        # name -> [count, wall time, cpu time]
+        self.phases = {}
+        self.counters = {}
+        self.keyed_counters = {}
+        self.series = {}
+        self.values = {}
+        # (calling frame, name) of the phases being timed, outermost first
+        self.active_phases = []
+
+    def phase(self, name):
+        """Returns a timer for the phase :name:. Its run(function, *args)
+        times a call, which shows up as a _phase_<name> frame in profiles.
+        It is also a context manager timing its body, which only the
+        sampling profiler can tell apart from the enclosing function. Nested
+        phases are timed independently (times are inclusive). The times are
+        available as wall_time and cpu_time on the timer."""
+        return _PhaseTimer(self, name)
+
+    def add_phase_time(self, name, wall_time, cpu_time):
+        entry = self.phases.get(name)
+        if entry is None:
+            entry = [0, 0.0, 0.0]
+            self.phases[name] = entry
+        entry[0] += 1
+        entry[1] += wall_time
+        entry[2] += cpu_time
+
+    def get_phase_cpu_time(self, name):
+        entry = self.phases.get(name)
+        return 0.0 if entry is None else entry[2]
+
+    def incr(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def incr_keyed(self, name, key, amount=1):
+        counter = self.keyed_counters.get(name)
+        if counter is None:
+            counter = {}
+            self.keyed_counters[name] = counter
+        counter[key] = counter.get(key, 0) + amount
+
+    def append(self, name, value):
+        self.series.setdefault(name, []).append(value)
+
+    def record(self, name, value):
+        """Sets the value :name: (e.g. the size of the solution), replacing
+        any previous value."""
+        self.values[name] = value
+
+    def _hit_rates(self):
+        # Every pair of counters <name>_hits, <name>_misses gives a hit rate
+        retval = {}
+        for name, hits in self.counters.items():
+            if not name.endswith('_hits'):
+                continue
+            prefix = name[:-len('_hits')]
+            total = hits + self.counters.get(prefix + '_misses', 0)
+            if total > 0:
+                retval[prefix] = hits / total
+        return retval
+
+    def to_dict(self):
+        return {
+                'wall_time': time.perf_counter() - self.start_wall_time,
+                'cpu_time': time.process_time() - self.start_cpu_time,
+                'phases': { name: { 'count': c, 'wall_time': w, 'cpu_time': t }
+                            for name, (c, w, t) in self.phases.items() },
+                'counters': dict(self.counters),
+                'hit_rates': self._hit_rates(),
+                'keyed_counters': { name: { str(k): v for k, v in sorted(counter.items()) }
+                                    for name, counter in self.keyed_counters.items() },
+                'series': { name: list(values) for name, values in self.series.items() },
+                'values': dict(self.values)
+                }
+
+    def dump(self, file_name):
+        """Writes the metrics as JSON to :file_name: ('-' is stderr)."""
+        text = json.dumps(self.to_dict(), indent=2, sort_keys=True)
+        if file_name == '-':
+            print(text, file=sys.stderr, flush=True)
+        else:
+            with open(file_name, 'w') as f:
+                f.write(text + '\n')
+
+    def install_signal_handler(self, file_name, signum=getattr(signal, 'SIGUSR1', None)):
+        """Dumps the metrics to :file_name: whenever :signum: is received."""
+        if signum is None:
+            return
+        signal.signal(signum, lambda s, frame: self.dump(file_name))
+
+metrics = Metrics()
+
+#
+# metrics.py ends here
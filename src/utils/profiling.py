@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# profiling.py ---
+#
+# Filename: profiling.py
+# Created: Mon Oct 19 15:40:52 2026 (-0400)
+#
+#
+# Copyright (c) 2015, Abhishek Udupa, University of Pennsylvania
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. All advertising materials mentioning features or use of this software
+#    must display the following acknowledgement:
+#    This product includes software developed by The University of Pennsylvania
+# 4. Neither the name of the University of Pennsylvania nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDER ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+
+# Code:
+
+"""Profiling of solver runs. Two modes are supported: 'cprofile' runs the
+deterministic profiler and writes pstats output, 'sample' periodically
+samples the Python stack on a CPU time timer and writes collapsed stacks
+(one 'frame;frame;...;frame count' line per distinct stack), the input
+format of flamegraph.pl and speedscope. The phases timed through
+utils.metrics (enumeration, signatures, DT learning, SMT checks, ...) run
+under functions named _phase_<phase>, which cProfile lists like any other
+function, and which appear in sampled stacks as '[phase]' frames."""
+
+import os
+import signal
+import sys
+
+from utils import metrics as metrics_module
+from utils.metrics import metrics
+
+profile_modes = ['cprofile', 'sample']
+
+def _frame_label(code):
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename),
+                           code.co_firstlineno)
+
+class StackSampler(object):
+    """Samples the stack of the main thread every :interval: seconds of CPU
+    time (ITIMER_PROF), and counts the distinct collapsed stacks. Native
+    code (Z3, the DT learner) is charged to the Python frame calling it."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stack_counts = {}
+        self.num_samples = 0
+        self.label_cache = {}
+        self.old_handler = None
+
+    def _label(self, code):
+        label = self.label_cache.get(code)
+        if label is None:
+            phase_name = metrics_module.phase_names_by_code.get(code)
+            if phase_name is not None:
+                label = '[%s]' % phase_name
+            else:
+                label = _frame_label(code)
+            self.label_cache[code] = label
+        return label
+
+    def _sample(self, signum, frame):
+        phases_by_frame = {}
+        for (phase_frame, name) in metrics.active_phases:
+            phases_by_frame.setdefault(id(phase_frame), []).append('[%s]' % name)
+
+        stack = []
+        while frame is not None:
+            names = phases_by_frame.get(id(frame))
+            if names is not None:
+                stack.extend(reversed(names))
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+
+        key = ';'.join(stack)
+        self.stack_counts[key] = self.stack_counts.get(key, 0) + 1
+        self.num_samples += 1
+
+    def start(self):
+        self.old_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.old_handler or signal.SIG_DFL)
+
+    def write_collapsed(self, out):
+        for key, count in sorted(self.stack_counts.items()):
+            out.write('%s %d\n' % (key, count))
+
+class Profiler(object):
+    """Profiles the code run between start() and stop() in the given mode,
+    and writes the profile to :output_file: (stderr if None)."""
+
+    def __init__(self, mode, output_file=None, sample_interval=0.005):
+        if mode not in profile_modes:
+            raise ValueError('Unknown profile mode: %s' % mode)
+        self.mode = mode
+        self.output_file = output_file
+        self.sample_interval = sample_interval
+        self.profiler = None
+        self.running = False
+
+    def start(self):
+        if self.mode == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(self.sample_interval)
+            self.profiler.start()
+        self.running = True
+
+    def stop(self):
+        """Stops profiling and writes the profile. Does nothing if the
+        profiler is not running, so that it can be registered with atexit."""
+        if not self.running:
+            return
+        self.running = False
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+            self._write_cprofile()
+        else:
+            self.profiler.stop()
+            if self.output_file is None:
+                self.profiler.write_collapsed(sys.stderr)
+                sys.stderr.flush()
+            else:
+                with open(self.output_file, 'w') as f:
+                    self.profiler.write_collapsed(f)
+
+    def _write_cprofile(self):
+        import pstats
+        if self.output_file is None:
+            stats = pstats.Stats(self.profiler, stream=sys.stderr)
+            stats.sort_stats('cumulative').print_stats(40)
+        else:
+            # Binary pstats output, for pstats, snakeviz, gprof2dot, ...
+            self.profiler.dump_stats(self.output_file)
+
+#
+# profiling.py ends here
@@ -38,8 +38,11 @@
 
 # Code:
 
+import collections
+import contextlib
 import z3
 from utils import utils
+from utils.metrics import metrics
 from exprs import exprtypes,exprs
 from utils.bitvectors import BitVector
 
@@ -47,11 +50,24 @@ if __name__ == '__main__':
     utils.print_module_misuse_and_exit()
 
 class Z3SMTContext(object):
-    """A simple wrapper around the z3.Context class."""
+    """A simple wrapper around the z3.Context class.
+    Also holds the cache used by semantics_types.expression_to_smt_cached,
+    and the pool of samplers."""
+    max_translation_cache_size = (1 << 14)
+    max_samplers = 16
+
     def __init__(self, *args, **kwargs):
         self.context_obj = z3.Context(*args, **kwargs)
         self.interpretation_map = {}
         self.solvers = []
+        self.translation_cache = {}
+        self.synth_fun_ids_cache = {}
+        # id of the fixed formula -> Sampler, least recently used first
+        self.samplers = collections.OrderedDict()
+
+    def clear_translation_cache(self):
+        self.translation_cache = {}
+        self.synth_fun_ids_cache = {}
 
     def ctx(self):
         return self.context_obj
@@ -64,6 +80,22 @@ class Z3SMTContext(object):
         self.solvers.append(ret)
         return ret
 
+    def get_sampler(self, fixed=None):
+        """Returns the pooled Sampler with :fixed: (a z3 formula, or None)
+        asserted, so that queries sharing a fixed part assert it once."""
+        key = None if fixed is None else fixed.get_id()
+        sampler = self.samplers.get(key)
+        if sampler is not None:
+            metrics.incr('sampler_hits')
+            self.samplers.move_to_end(key)
+            return sampler
+        metrics.incr('sampler_misses')
+        sampler = Sampler(self, fixed)
+        self.samplers[key] = sampler
+        if len(self.samplers) > self.max_samplers:
+            self.samplers.popitem(last=False)
+        return sampler
+
     def interrupt(self):
         self.context_obj.interrupt()
 
@@ -86,6 +118,56 @@ class Z3SMTContext(object):
             unknown_function_id = unknown_function_or_unknown_function_id
         self.interpretation_map[unknown_function_id] = interpretation
 
+class Sampler(object):
+    """Finds models on a solver which is kept across queries: the :fixed:
+    formula is asserted once, and each query only pushes (or assumes) its
+    own constraints. Holds on to :fixed:, which keeps its id unique while
+    the sampler is pooled by Z3SMTContext.get_sampler()."""
+
+    def __init__(self, smt_ctx, fixed=None):
+        self.fixed = fixed
+        self.solver = z3.Solver(ctx=smt_ctx.ctx())
+        if fixed is not None:
+            self.solver.add(fixed)
+
+    @contextlib.contextmanager
+    def scope(self, *constraints):
+        """Asserts :constraints: (and whatever is added with add()) for the
+        body of the with statement."""
+        self.solver.push()
+        try:
+            self.solver.add(*constraints)
+            yield self
+        finally:
+            self.solver.pop()
+
+    def add(self, *constraints):
+        """Asserts :constraints: until the end of the enclosing scope()."""
+        self.solver.add(*constraints)
+
+    def sample(self, arg_vars, assumptions=(), deadline=None):
+        """Returns the values of the z3 terms :arg_vars: in a model of the
+        asserted formulas and :assumptions:, None if there is no such model."""
+        if check(self.solver, deadline, assumptions) != z3.sat:
+            return None
+        model = self.solver.model()
+        return [ model.evaluate(arg_var, True) for arg_var in arg_vars ]
+
+def check(smt_solver, deadline=None, assumptions=()):
+    """Returns smt_solver.check(*assumptions), timed as the smt_check phase.
+    With a :deadline: (utils.deadline), the check is interrupted when the
+    deadline expires, and basetypes.DeadlineExceededError is raised."""
+    return metrics.phase('smt_check').run(_check, smt_solver, deadline, assumptions)
+
+def _check(smt_solver, deadline, assumptions):
+    if deadline is None:
+        return smt_solver.check(*assumptions)
+    deadline.check()
+    with deadline.on_expiry(smt_solver.ctx.interrupt):
+        retval = smt_solver.check(*assumptions)
+    if retval == z3.unknown:
+        deadline.check()
+    return retval
 
 def z3value_to_value(value, var_info):
     if (var_info.variable_type == exprtypes.BoolType()):
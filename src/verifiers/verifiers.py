@@ -44,9 +44,12 @@ from semantics import semantics_types
 from utils import basetypes
 from exprs import evaluation
 from utils.bitvectors import BitVector
+import random
+import multiprocessing
 
 _expr_to_str = exprs.expression_to_string
 _expr_to_smt = semantics_types.expression_to_smt
+_expr_to_smt_cached = semantics_types.expression_to_smt_cached
 _is_expr = exprs.is_expression
 _get_expr_with_id = exprs.get_expr_with_id
 
@@ -58,6 +61,30 @@ def model_to_point(model, var_smt_expr_list, var_info_list):
         point[i] = z3smt.z3value_to_value(eval_value, var_info_list[i])
     return tuple(point)
 
+def get_cex_points(smt_solver, var_smt_expr_list, var_info_list, max_points,
+                   blocking_smt_expr_list=None, deadline=None):
+    """Returns up to :max_points: counterexample points from the (satisfiable)
+    solver, pairwise distinct on the values of :blocking_smt_expr_list:
+    (all the point variables by default). Each further point is obtained by
+    blocking the models found so far in a pushed scope, so the solver state
+    is unchanged on return."""
+    if blocking_smt_expr_list is None:
+        blocking_smt_expr_list = var_smt_expr_list
+    model = smt_solver.model()
+    points = [model_to_point(model, var_smt_expr_list, var_info_list)]
+    if max_points <= 1 or len(blocking_smt_expr_list) == 0:
+        return points
+
+    smt_solver.push()
+    while len(points) < max_points:
+        smt_solver.add(z3.Or([ v != model.evaluate(v, True) for v in blocking_smt_expr_list ]))
+        if z3smt.check(smt_solver, deadline) != z3.sat:
+            break
+        model = smt_solver.model()
+        points.append(model_to_point(model, var_smt_expr_list, var_info_list))
+    smt_solver.pop()
+    return points
+
 def _decision_tree_to_guard_term_list_internal(decision_tree, pred_list, term_list,
                                                syn_ctx, retval, guard_stack):
     if (decision_tree.is_leaf()):
@@ -112,6 +139,9 @@ def naive_dt_to_expr(syn_ctx, dt, preds, terms):
 
 
 class VerifierBase(object):
+    # utils.deadline.Deadline checked by the SMT checks, set by Solver.solve()
+    deadline = None
+
     def __init__(self):
         pass
 
@@ -136,6 +166,9 @@ class VerifierBase(object):
         return sol_or_cexs
 
 class MultiPointVerifier(VerifierBase):
+    # Maximum number of counterexamples returned by a failed verification
+    max_cex_per_round = 1
+
     def __init__(self, syn_ctx, spec):
         self.syn_ctx = syn_ctx
         self.spec = spec
@@ -163,18 +196,20 @@ class MultiPointVerifier(VerifierBase):
             for f, t in zip(self.synth_funs, term.children):
                 smt_ctx.set_interpretation(f, t)
         # print(_expr_to_str(self.neg_canon_spec))
-        full_constraint = _expr_to_smt(self.neg_canon_spec, smt_ctx)
+        full_constraint = _expr_to_smt_cached(self.neg_canon_spec, smt_ctx)
 
         smt_solver.push()
         smt_solver.add(full_constraint)
-        r = smt_solver.check()
+        r = z3smt.check(smt_solver, self.deadline)
 
         if (r == z3.sat):
-            cex_point = model_to_point(smt_solver.model(),
-                                       self.var_smt_expr_list,
-                                       self.var_info_list)
+            cex_points = get_cex_points(smt_solver,
+                                        self.var_smt_expr_list,
+                                        self.var_info_list,
+                                        self.max_cex_per_round,
+                                        deadline=self.deadline)
             smt_solver.pop()
-            return [cex_point]
+            return cex_points
         else:
             smt_solver.pop()
             return term
@@ -187,7 +222,91 @@ class MultiPointVerifier(VerifierBase):
             raise Exception('Unexpected unification type: %s', type)
         return sol_or_cexs
 
+def _random_value(value_type, rand):
+    if (value_type.type_code == exprtypes.TypeCodes.boolean_type):
+        return exprs.Value(rand.random() < 0.5, value_type)
+    elif (value_type.type_code == exprtypes.TypeCodes.integer_type):
+        return exprs.Value(rand.randint(-StdVerifier.random_int_range,
+                                        StdVerifier.random_int_range), value_type)
+    elif (value_type.type_code == exprtypes.TypeCodes.bit_vector_type):
+        return exprs.Value(BitVector(rand.getrandbits(value_type.size), value_type.size),
+                           value_type)
+    else:
+        raise basetypes.UnhandledCaseError('Cannot sample values of type %s' % value_type)
+
+def _smt_exprs_to_smt2(smt_ctx, smt_exprs):
+    # One SMT-LIB2 benchmark asserting the (non-empty list of) constraints
+    # in order, with the symbols they share declared once
+    num_assumptions = len(smt_exprs) - 1
+    assumptions = (z3.Ast * num_assumptions)(*[ e.as_ast() for e in smt_exprs[:-1] ])
+    return z3.Z3_benchmark_to_smtlib_string(smt_ctx.ctx().ref(), '', '', 'unknown', '',
+                                            num_assumptions, assumptions,
+                                            smt_exprs[-1].as_ast())
+
+class _BranchVerificationWorker(object):
+    """State of a worker process verifying decision tree branches: a private
+    Z3 context with its own copy of the frozen spec constraint. The verifier
+    is inherited on fork, and each branch is received as one SMT-LIB2
+    string asserting its guard, then the constraints of its terms."""
+    def __init__(self, verifier):
+        self.smt_ctx = z3smt.Z3SMTContext()
+        self.smt_solver = self.smt_ctx.make_solver()
+        self.var_info_list = verifier.var_info_list
+        var_expr_list = [exprs.VariableExpression(x) for x in self.var_info_list]
+        self.var_smt_expr_list = [_expr_to_smt(x, self.smt_ctx) for x in var_expr_list]
+        self.smt_solver.add(_expr_to_smt(verifier.neg_canon_spec_with_outvar, self.smt_ctx))
+
+    def verify_branch(self, branch_smt2):
+        """Returns the index of the first term that is correct under the guard
+        (None if there is no such term) and the counterexamples to the terms
+        before it."""
+        smt_solver = self.smt_solver
+        branch_cnstrs = z3.parse_smt2_string(branch_smt2, ctx=self.smt_ctx.ctx())
+        cex_points = []
+        selected_index = None
+        smt_solver.push()
+        smt_solver.add(branch_cnstrs[0])
+        for i in range(len(branch_cnstrs) - 1):
+            smt_solver.push()
+            smt_solver.add(branch_cnstrs[i + 1])
+            r = z3smt.check(smt_solver)
+            if (r == z3.sat):
+                cex_points.append(model_to_point(smt_solver.model(),
+                                                 self.var_smt_expr_list,
+                                                 self.var_info_list))
+                smt_solver.pop()
+            else:
+                smt_solver.pop()
+                selected_index = i
+                break
+        smt_solver.pop()
+        return selected_index, cex_points
+
+_branch_worker = None
+
+def _init_branch_worker(verifier):
+    global _branch_worker
+    _branch_worker = _BranchVerificationWorker(verifier)
+
+def _verify_branch_in_worker(branch_smt2):
+    return _branch_worker.verify_branch(branch_smt2)
+
 class StdVerifier(VerifierBase):
+    """Verifies candidates against a standard (single invocation) spec.
+    Before calling the SMT solver, candidates are evaluated against a pool of
+    points made of the last few counterexamples found and a set of random
+    samples. A failing point from the pool is returned as the counterexample
+    without any SMT check."""
+    # Sizes of the pre-verification pools: 0 disables the corresponding pool
+    num_random_points = 32
+    num_known_points = 16
+    random_int_range = 1024
+    # Maximum number of counterexamples returned by a failed verification
+    max_cex_per_round = 1
+    # Number of worker processes verifying the branches of a decision tree in
+    # parallel: 0 or 1 verifies them sequentially in this process
+    num_branch_workers = 0
+
     def __init__(self, syn_ctx, spec):
         self.syn_ctx = syn_ctx
         self.spec = spec
@@ -210,51 +329,247 @@ class StdVerifier(VerifierBase):
             syn_ctx.make_function_expr('eq', v, a) for (v, a) in zip(fun_app_subst_vars, fun_apps) ])
         self.canon_spec = spec.get_canonical_specification()
         canon_spec_with_outvar = exprs.substitute_all(self.canon_spec, list(zip(fun_apps, fun_app_subst_vars)))
-        neg_canon_spec_with_outvar = syn_ctx.make_function_expr('not', canon_spec_with_outvar)
-        self.frozen_smt_cnstr = _expr_to_smt(neg_canon_spec_with_outvar, self.smt_ctx)
+        self.neg_canon_spec_with_outvar = syn_ctx.make_function_expr('not', canon_spec_with_outvar)
+        self.frozen_smt_cnstr = _expr_to_smt(self.neg_canon_spec_with_outvar, self.smt_ctx)
         self.smt_solver.push()
         self.smt_solver.add(self.frozen_smt_cnstr)
 
+        # Used to evaluate the spec on pool points with the synth functions
+        # evaluated only once per point
+        self.fun_apps = fun_apps
+        self.fun_app_subst_vars = fun_app_subst_vars
+        self.canon_spec_with_outvar = canon_spec_with_outvar
+
+        self.eval_ctx = evaluation.EvaluationContext()
+        self.known_points = []
+        self.random_points = self._make_random_points(random.Random(0))
+        self.branch_worker_pool = None
+
+    def _make_random_points(self, rand):
+        # Random points are only useful if the intro vars take the values of
+        # the arguments of the synth function invocation: otherwise the
+        # canonical spec holds vacuously. So, we sample the original variables
+        # and evaluate the (unique) invocation arguments to get the intro vars.
+        arg_tuples = set()
+        for sf in self.synth_funs:
+            for app in exprs.find_all_applications(self.spec.spec_expr, sf.function_name):
+                arg_tuples.add(app.children)
+        if len(arg_tuples) != 1:
+            return []
+        args = arg_tuples.pop()
+        num_intro_vars = len(self.intro_vars)
+        eval_ctx = self.eval_ctx
+
+        retval = []
+        try:
+            for i in range(self.num_random_points):
+                point = [ _random_value(v.variable_type, rand) for v in self.var_info_list ]
+                eval_ctx.set_valuation_map(point)
+                for j in range(num_intro_vars):
+                    point[j] = evaluation.evaluate_expression(args[j], eval_ctx)
+                retval.append(tuple(point))
+        except (basetypes.UnhandledCaseError, basetypes.PartialFunctionError,
+                basetypes.UnboundLetVariableError):
+            return []
+        return retval
+
+    def _add_known_points(self, points):
+        self.known_points.extend(points)
+        excess = len(self.known_points) - self.num_known_points
+        if excess > 0:
+            del self.known_points[:excess]
+
+    def _get_pool_points(self):
+        return self.known_points + self.random_points
+
+    def _set_eval_interpretation(self, term):
+        if len(self.synth_funs) == 1:
+            self.eval_ctx.set_interpretation(self.synth_funs[0], term)
+        else:
+            assert exprs.is_application_of(term, ',')
+            for f, t in zip(self.synth_funs, term.children):
+                self.eval_ctx.set_interpretation(f, t)
+
+    def _set_smt_interpretation(self, term):
+        if len(self.synth_funs) == 1:
+            self.smt_ctx.set_interpretation(self.synth_funs[0], term)
+        else:
+            assert exprs.is_application_of(term, ',')
+            for f, t in zip(self.synth_funs, term.children):
+                self.smt_ctx.set_interpretation(f, t)
+
+    def _satisfies_spec_on_point(self, point):
+        # Points where the evaluation is undefined are not counterexamples:
+        # the SMT semantics of partial functions are total.
+        eval_ctx = self.eval_ctx
+        eval_ctx.set_valuation_map(point)
+        try:
+            outputs = [ evaluation.evaluate_expression_raw(a, eval_ctx) for a in self.fun_apps ]
+        except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+            return True
+        eval_ctx.push_let_variables(dict(zip(self.fun_app_subst_vars, outputs)))
+        try:
+            return evaluation.evaluate_expression_raw(self.canon_spec_with_outvar, eval_ctx)
+        except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+            return True
+        finally:
+            eval_ctx.pop_let_variables()
+
+    def _find_failing_point(self, term, points):
+        self._set_eval_interpretation(term)
+        for point in points:
+            if not self._satisfies_spec_on_point(point):
+                return point
+        return None
+
+    def _filter_points_by_guard(self, guard, points):
+        # The guard is over the formal parameters, which are evaluated against
+        # the intro vars at the beginning of the point
+        eval_ctx = self.eval_ctx
+        retval = []
+        for point in points:
+            eval_ctx.set_valuation_map(point)
+            try:
+                if evaluation.evaluate_expression_raw(guard, eval_ctx):
+                    retval.append(point)
+            except (basetypes.PartialFunctionError, basetypes.UnboundLetVariableError):
+                pass
+        return retval
+
     def _verify_expr(self, term):
         smt_ctx = self.smt_ctx
         smt_solver = self.smt_solver
         # print('Verifying: %s' % exprs.expression_to_string(term))
 
+        failing_point = self._find_failing_point(term, self._get_pool_points())
+        if failing_point is not None:
+            return [failing_point]
+
         if len(self.synth_funs) == 1:
             smt_ctx.set_interpretation(self.synth_funs[0], term)
         else:
             assert exprs.is_application_of(term, ',')
             for f, t in zip(self.synth_funs, term.children):
                 smt_ctx.set_interpretation(f, t)
-        eq_cnstr = _expr_to_smt(self.outvar_cnstr, smt_ctx)
+        eq_cnstr = _expr_to_smt_cached(self.outvar_cnstr, smt_ctx)
         smt_solver.push()
         smt_solver.add(eq_cnstr)
         # print("1:", exprs.expression_to_string(self.canon_spec))
         # print("2:", smt_solver)
-        r = smt_solver.check()
+        r = z3smt.check(smt_solver, self.deadline)
         # print("3:", smt_solver.model())
 
         if (r == z3.sat):
-            cex_point = model_to_point(smt_solver.model(),
-                                       self.var_smt_expr_list,
-                                       self.var_info_list)
+            # Points distinct on the intro vars, i.e., on the synth function inputs
+            cex_points = get_cex_points(smt_solver,
+                                        self.var_smt_expr_list,
+                                        self.var_info_list,
+                                        self.max_cex_per_round,
+                                        self.smt_intro_vars,
+                                        deadline=self.deadline)
             smt_solver.pop()
-            return [cex_point]
+            self._add_known_points(cex_points)
+            return cex_points
         else:
             smt_solver.pop()
             return term
 
+    def _get_branch_worker_pool(self):
+        if self.branch_worker_pool is None:
+            try:
+                mp_ctx = multiprocessing.get_context('fork')
+            except ValueError:
+                return None
+            self.branch_worker_pool = mp_ctx.Pool(self.num_branch_workers,
+                                                  _init_branch_worker, (self,))
+        return self.branch_worker_pool
+
+    def close_branch_workers(self):
+        if self.branch_worker_pool is not None:
+            self.branch_worker_pool.terminate()
+            self.branch_worker_pool.join()
+            self.branch_worker_pool = None
+
+    def _guard_term_list_result(self, cex_points, selected_leaf_terms,
+                                at_least_one_branch_failed, dt_tuple):
+        if (at_least_one_branch_failed):
+            retval = list(set(cex_points))
+            retval.sort()
+            return retval
+        else:
+            (term_list, term_sig_list, pred_list, pred_sig_list, dt) = dt_tuple
+            e = decision_tree_to_expr(dt, pred_list, self.syn_ctx, selected_leaf_terms)
+            return e
+
+    def _verify_guard_term_list_parallel(self, guard_term_list, dt_tuple, worker_pool):
+        # Terms refuted on the pool points are dropped here; the remaining ones
+        # are checked by the workers, one task per branch
+        smt_ctx = self.smt_ctx
+        intro_vars = self.smt_intro_vars
+        cex_points = []
+        pool_points = self._get_pool_points()
+
+        tasks = []
+        branch_terms = []
+        for (pred, term_list) in guard_term_list:
+            branch_points = self._filter_points_by_guard(pred, pool_points)
+            candidate_terms = []
+            branch_cnstrs = [ _expr_to_smt_cached(pred, smt_ctx, intro_vars) ]
+            for term in term_list:
+                failing_point = self._find_failing_point(term, branch_points)
+                if failing_point is not None:
+                    cex_points.append(failing_point)
+                    continue
+                self._set_smt_interpretation(term)
+                eq_cnstr = _expr_to_smt_cached(self.outvar_cnstr, smt_ctx)
+                candidate_terms.append(term)
+                branch_cnstrs.append(eq_cnstr)
+            tasks.append(_smt_exprs_to_smt2(smt_ctx, branch_cnstrs))
+            branch_terms.append(candidate_terms)
+
+        async_results = worker_pool.map_async(_verify_branch_in_worker, tasks, chunksize=1)
+        try:
+            results = async_results.get(None if self.deadline is None else self.deadline.remaining())
+        except multiprocessing.TimeoutError:
+            # The checks in the workers cannot be interrupted from here
+            self.close_branch_workers()
+            raise basetypes.DeadlineExceededError()
+
+        selected_leaf_terms = []
+        at_least_one_branch_failed = False
+        for candidate_terms, (selected_index, branch_cex_points) in zip(branch_terms, results):
+            cex_points.extend(branch_cex_points)
+            self._add_known_points(branch_cex_points)
+            if selected_index is None:
+                at_least_one_branch_failed = True
+            else:
+                selected_leaf_terms.append(candidate_terms[selected_index])
+
+        return self._guard_term_list_result(cex_points, selected_leaf_terms,
+                                            at_least_one_branch_failed, dt_tuple)
+
     def _verify_guard_term_list(self, guard_term_list, dt_tuple):
+        if self.num_branch_workers > 1 and len(guard_term_list) > 1:
+            worker_pool = self._get_branch_worker_pool()
+            if worker_pool is not None:
+                return self._verify_guard_term_list_parallel(guard_term_list, dt_tuple,
+                                                             worker_pool)
+
         smt_ctx = self.smt_ctx
         smt_solver = self.smt_solver
         intro_vars = self.smt_intro_vars
         cex_points = []
         selected_leaf_terms = []
+        pool_points = self._get_pool_points()
 
         at_least_one_branch_failed = False
         for (pred, term_list) in guard_term_list:
+            # Counterexamples found for earlier terms in the same branch are
+            # likely to rule out the later ones as well
+            branch_points = self._filter_points_by_guard(pred, pool_points)
+            branch_cex_points = []
             smt_solver.push()
-            smt_pred = _expr_to_smt(pred, smt_ctx, intro_vars)
+            smt_pred = _expr_to_smt_cached(pred, smt_ctx, intro_vars)
             # print('SMT guard')
             # print(smt_pred)
             smt_solver.add(smt_pred)
@@ -264,41 +579,38 @@ class StdVerifier(VerifierBase):
                 # print(_expr_to_str(term))
                 # print('with guard')
                 # print(_expr_to_str(pred))
-                if len(self.synth_funs) == 1:
-                    smt_ctx.set_interpretation(self.synth_funs[0], term)
-                else:
-                    assert exprs.is_application_of(term, ',')
-                    for f, t in zip(self.synth_funs, term.children):
-                        smt_ctx.set_interpretation(f, t)
-                eq_cnstr = _expr_to_smt(self.outvar_cnstr, smt_ctx);
+                failing_point = self._find_failing_point(term, branch_cex_points + branch_points)
+                if failing_point is not None:
+                    if failing_point not in branch_cex_points:
+                        branch_cex_points.append(failing_point)
+                    continue
+                self._set_smt_interpretation(term)
+                eq_cnstr = _expr_to_smt_cached(self.outvar_cnstr, smt_ctx)
                 # print('SMT constraint')
                 # print(eq_cnstr)
                 smt_solver.push()
                 smt_solver.add(eq_cnstr)
-                r = smt_solver.check()
+                r = z3smt.check(smt_solver, self.deadline)
                 if (r == z3.sat):
-                    cex_points.append(model_to_point(smt_solver.model(),
-                                                     self.var_smt_expr_list,
-                                                     self.var_info_list))
+                    cex_point = model_to_point(smt_solver.model(),
+                                               self.var_smt_expr_list,
+                                               self.var_info_list)
+                    branch_cex_points.append(cex_point)
+                    self._add_known_points([cex_point])
                     smt_solver.pop()
                 else:
                     all_terms_failed = False
                     selected_leaf_terms.append(term)
                     smt_solver.pop()
                     break
+            cex_points.extend(branch_cex_points)
 
             if (all_terms_failed):
                 at_least_one_branch_failed = True
             smt_solver.pop()
 
-        if (at_least_one_branch_failed):
-            retval = list(set(cex_points))
-            retval.sort()
-            return retval
-        else:
-            (term_list, term_sig_list, pred_list, pred_sig_list, dt) = dt_tuple
-            e = decision_tree_to_expr(dt, pred_list, self.syn_ctx, selected_leaf_terms)
-            return e
+        return self._guard_term_list_result(cex_points, selected_leaf_terms,
+                                            at_least_one_branch_failed, dt_tuple)
 
     def verify(self, unification):
         return self._default_verify(unification)
@@ -306,6 +618,19 @@ class StdVerifier(VerifierBase):
     def verify_term_solve(self, terms):
         smt_ctx = self.smt_ctx
         smt_solver = self.smt_solver
+
+        # Pool points not yet satisfied by any term, in order: each term is
+        # set as the interpretation once, and only evaluated on those
+        unsatisfied = self._get_pool_points()
+        for term in terms:
+            if len(unsatisfied) == 0:
+                break
+            self._set_eval_interpretation(term)
+            unsatisfied = [ point for point in unsatisfied
+                            if not self._satisfies_spec_on_point(point) ]
+        if len(unsatisfied) > 0:
+            return [unsatisfied[0]]
+
         smt_solver.pop()
 
         eq_cnstrs = []
@@ -316,7 +641,7 @@ class StdVerifier(VerifierBase):
                 assert exprs.is_application_of(term, ',')
                 for f, t in zip(self.synth_funs, term.children):
                     smt_ctx.set_interpretation(f, t)
-            eq_cnstrs.append(_expr_to_smt(self.canon_spec, smt_ctx))
+            eq_cnstrs.append(_expr_to_smt_cached(self.canon_spec, smt_ctx))
         eq_cnstr = z3.And(*[ z3.Not(ec) for ec in eq_cnstrs ], eq_cnstrs[0].ctx)
 
         # print("----------")
@@ -324,12 +649,13 @@ class StdVerifier(VerifierBase):
 
         smt_solver.push()
         smt_solver.add(eq_cnstr)
-        r = smt_solver.check()
+        r = z3smt.check(smt_solver, self.deadline)
 
         if (r == z3.sat):
             cex_point = model_to_point(smt_solver.model(),
                                        self.var_smt_expr_list,
                                        self.var_info_list)
+            self._add_known_points([cex_point])
             result = [cex_point]
         else:
             result = None
@@ -346,51 +672,80 @@ class StdVerifier(VerifierBase):
 
 
 class PBEVerifier(VerifierBase):
+    """Verifies candidates against a programming-by-example spec.
+    The examples are held as a table of columns, one per argument of the
+    synth function, and each candidate is evaluated on the whole table in a
+    single pass (see evaluation.evaluate_expression_on_columns)."""
     def __init__(self, syn_ctx, spec):
         self.spec = spec
         self.valuations = self.spec.valuations
         self.syn_ctx = syn_ctx
         self.eval_ctx = self.spec.eval_ctx
 
+        self.points = list(self.valuations.keys())
+        unbox = evaluation.unbox_raw_value
+        self.expected_values = [ unbox(self.valuations[p]) for p in self.points ]
+        self.num_points = len(self.points)
+        num_args = len(self.points[0]) if self.num_points > 0 else 0
+        self.columns = [ [ unbox(p[i].value_object) for p in self.points ] for i in range(num_args) ]
+
+    def _evaluate_on_examples(self, expr, cache):
+        try:
+            return evaluation.evaluate_expression_on_columns(expr, self.columns,
+                                                             self.num_points,
+                                                             self.eval_ctx, cache)
+        except (basetypes.UnhandledCaseError, basetypes.PartialFunctionError):
+            # Fall back to evaluating the points one at a time
+            eval_ctx = self.eval_ctx
+            retval = []
+            for point in self.points:
+                eval_ctx.set_valuation_map(point)
+                retval.append(evaluation.unbox_raw_value(
+                    evaluation.evaluate_expression_raw(expr, eval_ctx)))
+            return retval
+
+    def _first_failing_index(self, column, indices=None):
+        """Returns the first example index (among :indices:, all by default)
+        where the column differs from the expected output, or None."""
+        expected_values = self.expected_values
+        if indices is None:
+            indices = range(self.num_points)
+        for i in indices:
+            if column[i] != expected_values[i]:
+                return i
+        return None
+
     def _verify_expr(self, term):
-        eval_ctx = self.eval_ctx
-        for point, value in self.valuations.items():
-            eval_ctx.set_valuation_map(point)
-            result = evaluation.evaluate_expression_raw(term, eval_ctx)
-            if result != value:
-                return [point]
+        column = self._evaluate_on_examples(term, {})
+        index = self._first_failing_index(column)
+        if index is not None:
+            return [self.points[index]]
         return term
 
     def _verify_guard_term_list(self, guard_term_list, dt_tuple):
-        eval_ctx = self.eval_ctx
+        cache = {}
         cex_points = []
         selected_leaf_terms = []
 
         at_least_one_branch_failed = False
 
         for (pred, term_list) in guard_term_list:
-            good_terms = term_list.copy()
+            pred_column = self._evaluate_on_examples(pred, cache)
+            indices = [ i for i in range(self.num_points) if pred_column[i] ]
 
-            for point, value in self.spec.valuations.items():
-                eval_ctx.set_valuation_map(point)
-                if not evaluation.evaluate_expression_raw(pred, eval_ctx):
-                    continue
-
-                next_good_terms = []
-                for term in good_terms:
-                    curr_value = evaluation.evaluate_expression_raw(term, eval_ctx)
-                    if curr_value == value:
-                        next_good_terms.append(term)
-                good_terms = next_good_terms
-
-                if len(good_terms) == 0:
-                    at_least_one_branch_failed = True
-                    cex_points.append(point)
+            # The selected term is the first one correct on all the examples
+            # satisfying the guard. If there is none, the counterexample is the
+            # example on which the last surviving term fails.
+            last_failing_index = -1
+            for term in term_list:
+                index = self._first_failing_index(self._evaluate_on_examples(term, cache), indices)
+                if index is None:
+                    selected_leaf_terms.append(term)
                     break
-
-            if len(good_terms) > 0:
-                selected_leaf_terms.append(good_terms[0])
-
+                last_failing_index = max(last_failing_index, index)
+            else:
+                at_least_one_branch_failed = True
+                cex_points.append(self.points[last_failing_index])
 
         if at_least_one_branch_failed:
             retval = list(set(cex_points))
@@ -405,14 +760,16 @@ class PBEVerifier(VerifierBase):
         return self._default_verify(unification)
 
     def verify_term_solve(self, terms):
-        eval_ctx = self.eval_ctx
-        for point, value in self.valuations.items():
-            eval_ctx.set_valuation_map(point)
-            found_one = False
-            for term in terms:
-                result = evaluation.evaluate_expression_raw(term, eval_ctx)
-                if result == value:
-                    found_one = True
-            if not found_one:
-                return [point]
+        # Examples not yet covered by any term, in order; once every example is
+        # covered, the remaining terms are not evaluated
+        expected_values = self.expected_values
+        uncovered = list(range(self.num_points))
+        cache = {}
+        for term in terms:
+            if len(uncovered) == 0:
+                break
+            column = self._evaluate_on_examples(term, cache)
+            uncovered = [ i for i in uncovered if column[i] != expected_values[i] ]
+        if len(uncovered) > 0:
+            return [self.points[uncovered[0]]]
         return None